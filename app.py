@@ -1,19 +1,22 @@
 
-import streamlit as st
-from PIL import Image
-from chains.assistant_router import AssistantRouter
 import time
-from chains.models.whisper_asr import WhisperASR
+script_start = time.perf_counter()
+
+import streamlit as st
+from chains.registry import registry
+from utils import metrics
 from datetime import datetime
+import os
 import uuid
 
-# Initialize the AssistantRouter
-router = AssistantRouter()
+# The router and its assistants are built once per process and shared across sessions and reruns
+router = registry.get('router')
 
-st.set_page_config(page_title="Agent-Nesh 🤖", layout="wide")
+# Per-stage latency histograms for Prometheus; the server is started once per process
+if os.getenv("METRICS_PORT"):
+    metrics.start_http_server(int(os.getenv("METRICS_PORT")))
 
-# Initialize the WhisperASR
-whisper_asr = WhisperASR(model_name="base")
+st.set_page_config(page_title="Agent-Nesh 🤖", layout="wide")
 
 st.title("Ask me anything!")
 
@@ -44,18 +47,26 @@ with st.sidebar:
     uploaded_file = st.file_uploader("Upload File", type=["png", "jpg", "jpeg"], label_visibility="collapsed")
 
     if uploaded_file:
-        image = Image.open(uploaded_file)
-        image_path = f"uploaded_image_{st.session_state.session_id}.png"
-        image.save(image_path)
+        # Kept in memory and handed to the router as bytes; nothing is written to disk
+        image_bytes = uploaded_file.getvalue()
 
         st.image(uploaded_file, caption="Uploaded Image", use_column_width=True)
     st.markdown("---")
 
+    # Spoken replies start after the first sentence while the rest is still being generated
+    speak_replies = st.checkbox("Speak replies", value=False)
+
     # ASR button section
     if st.button("Record and Transcribe Audio"):
         with st.spinner("Recording..."):
             try:
-                transcription = whisper_asr.run()
+                # Whisper is only loaded the first time someone records
+                partial_placeholder = st.empty()
+                transcription = ""
+                # Partial transcripts are shown while the user is still speaking
+                for transcription in registry.get('whisper_asr').run_stream():
+                    partial_placeholder.caption(transcription + "▌")
+                partial_placeholder.empty()
                 st.session_state.transcription = transcription
             except Exception as e:
                 st.error(f"Error during transcription: {e}")
@@ -73,6 +84,29 @@ for message in sorted(st.session_state.messages, key=lambda x: x['timestamp']):
         if message["role"] == "assistant":
             st.markdown(f"*Model Used: {message['assistant_name']}*")
 
+
+def stream_response(user_input, image=None):
+    """
+    Stream the routed response into an assistant chat message as tokens arrive.
+
+    :param user_input: str, The input text from the user.
+    :param image: bytes, The uploaded image contents if provided.
+    :return: tuple, The full response text and the assistant name.
+    """
+    with st.chat_message("assistant"):
+        response_placeholder = st.empty()
+        full_response = ""
+        tokens, assistant_name = router.route_stream(user_input, image, st.session_state.session_id)
+        if speak_replies:
+            tokens = registry.get('tts').pipe(tokens)
+        for token in tokens:
+            full_response += token
+            response_placeholder.markdown(full_response + "▌")
+        response_placeholder.markdown(full_response)
+        st.markdown(f"*Model Used: {assistant_name}*")
+    return full_response, assistant_name
+
+
 # Handle ASR transcription after processing
 if "transcription" in st.session_state:
     transcription = st.session_state.pop("transcription")
@@ -82,37 +116,10 @@ if "transcription" in st.session_state:
         st.markdown(transcription)
 
     # Check if there is an uploaded image
-    try:
-        if uploaded_file:
-            combined_input = transcription
-            response, assistant_name = router.route_input(combined_input, image_path)
-        else:
-            response, assistant_name = router.route_input(transcription)
-    except Exception as e:
-        st.error(f"Error during processing: {e}")
-        response = {"content": "Sorry, an error occurred while processing your request.", "assistant_name": "Error"}
-
-    # Display assistant response in chat message container
-    with st.chat_message("assistant"):
-        response_placeholder = st.empty()
-        full_response = ""
-        response_content = response if isinstance(response, str) else response.get("content", "")
-        if "```" in response_content:
-            parts = response_content.split("```")
-            for i, part in enumerate(parts):
-                if i % 2 == 0:
-                    full_response += part + " "
-                    response_placeholder.markdown(full_response)
-                else:
-                    language, code = part.strip().split("\n", 1)
-                    st.code(code, language=language.strip())
-                time.sleep(0.05)
-        else:
-            for word in response_content.split():
-                full_response += word + " "
-                response_placeholder.markdown(full_response)
-                time.sleep(0.05)
-        st.markdown(f"*Model Used: {assistant_name}*")
+    if uploaded_file:
+        response_content, assistant_name = stream_response(transcription, image_bytes)
+    else:
+        response_content, assistant_name = stream_response(transcription)
 
     # Add assistant response to chat history
     st.session_state.messages.append({"role": "user", "content": transcription, "timestamp": datetime.now().isoformat()})
@@ -126,47 +133,17 @@ text_input = st.chat_input("Enter your message:")
 if uploaded_file and text_input:
     combined_input = text_input
 
-    # Process input with image
-    try:
-        response, assistant_name = router.route_input(combined_input, image_path)
-    except Exception as e:
-        st.error(f"Error during processing: {e}")
-        response = {"content": "Sorry, an error occurred while processing your request.", "assistant_name": "Error"}
-
-    # Display user image and assistant response
+    # Display user input and stream the assistant response
     with st.chat_message("user"):
         st.markdown(combined_input)
 
-    with st.chat_message("assistant"):
-        response_placeholder = st.empty()
-        full_response = ""
-        response_content = response if isinstance(response, str) else response.get("content", "")
-        if "```" in response_content:
-            parts = response_content.split("```")
-            for i, part in enumerate(parts):
-                if i % 2 == 0:
-                    full_response += part + " "
-                    response_placeholder.markdown(full_response)
-                else:
-                    language, code = part.strip().split("\n", 1)
-                    st.code(code, language=language.strip())
-                time.sleep(0.05)
-        else:
-            for word in response_content.split():
-                full_response += word + " "
-                response_placeholder.markdown(full_response)
-                time.sleep(0.05)
-        st.markdown(f"*Model Used: {assistant_name}*")
+    response_content, assistant_name = stream_response(combined_input, image_bytes)
 
     # Add assistant response to chat history
     st.session_state.messages.append({"role": "user", "content": combined_input, "timestamp": datetime.now().isoformat()})
     st.session_state.messages.append(
         {"role": "assistant", "content": response_content, "assistant_name": assistant_name, "timestamp": datetime.now().isoformat()})
 
-    # Manually update the conversation memory for VisionAssistant
-    if assistant_name == "VisionAssistant":
-        router.vision_assistant.add_to_memory(combined_input, response_content)
-
 # Handle text input without image
 elif text_input:
     # Add user message to chat history
@@ -176,37 +153,11 @@ elif text_input:
     with st.chat_message("user"):
         st.markdown(text_input)
 
-    # Process input without image
-    try:
-        response, assistant_name = router.route_input(text_input)
-    except Exception as e:
-        st.error(f"Error during processing: {e}")
-        response = {"content": "Sorry, an error occurred while processing your request.", "assistant_name": "Error"}
-
-    # Display assistant response in chat message container
-    with st.chat_message("assistant"):
-        response_placeholder = st.empty()
-        full_response = ""
-        response_content = response if isinstance(response, str) else response.get("content", "")
-
-        # Check if the response contains code blocks
-        if "```" in response_content:
-            parts = response_content.split("```")
-            for i, part in enumerate(parts):
-                if i % 2 == 0:
-                    full_response += part + " "
-                    response_placeholder.markdown(full_response)
-                else:
-                    language, code = part.strip().split("\n", 1)
-                    st.code(code, language=language.strip())
-                time.sleep(0.05)
-        else:
-            for word in response_content.split():
-                full_response += word + " "
-                response_placeholder.markdown(full_response)
-                time.sleep(0.05)
-        st.markdown(f"*Model Used: {assistant_name}*")
+    # Stream the assistant response in chat message container
+    response_content, assistant_name = stream_response(text_input)
 
     # Add assistant response to chat history
     st.session_state.messages.append(
         {"role": "assistant", "content": response_content, "assistant_name": assistant_name, "timestamp": datetime.now().isoformat()})
+
+registry.record_script_run(time.perf_counter() - script_start)
@@ -0,0 +1,90 @@
+"""
+Micro-benchmark of the per-frame overhead of VAD-gated audio capture.
+
+Compares the original deque loop, which recounted the whole padding window and kept Python
+bytes for every frame, with VADCapture's preallocated ring buffer. Both read the same
+synthetic utterance from memory and use the energy VAD, so no microphone is needed.
+
+    python -m benchmarks.bench_capture
+"""
+import argparse
+import collections
+import time
+import numpy as np
+from chains.models.audio_capture import ArraySource, EnergyVAD, VADCapture
+
+
+def synthetic_utterance(samplerate, lead_s, speech_s, tail_s, seed=0):
+    """Silence, a noisy tone standing in for speech, then silence again."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(speech_s * samplerate)) / samplerate
+    speech = 8000 * np.sin(2 * np.pi * 220 * t) + rng.normal(0, 1000, len(t))
+    silence = lambda seconds: rng.normal(0, 50, int(seconds * samplerate))
+    return np.concatenate([silence(lead_s), speech, silence(tail_s)]).astype(np.int16)
+
+
+def legacy_capture(source, vad, padding_duration_ms=2000, chunk_duration_ms=30):
+    chunk_size = int(source.samplerate * chunk_duration_ms / 1000)
+    ring_buffer = collections.deque(maxlen=int(padding_duration_ms / chunk_duration_ms))
+    triggered = False
+    voiced_frames = []
+    with source:
+        while True:
+            audio_chunk = source.read(chunk_size)
+            if len(audio_chunk) < chunk_size:
+                break
+            audio_chunk = audio_chunk.tobytes()
+            is_speech = vad.is_speech(audio_chunk, source.samplerate)
+            if not triggered:
+                ring_buffer.append((audio_chunk, is_speech))
+                num_voiced = len([f for f, speech in ring_buffer if speech])
+                if num_voiced > 0.9 * ring_buffer.maxlen:
+                    triggered = True
+                    voiced_frames.extend([f for f, s in ring_buffer])
+                    ring_buffer.clear()
+            else:
+                voiced_frames.append(audio_chunk)
+                ring_buffer.append((audio_chunk, is_speech))
+                num_unvoiced = len([f for f, speech in ring_buffer if not speech])
+                if num_unvoiced > 0.9 * ring_buffer.maxlen:
+                    break
+    return np.frombuffer(b''.join(voiced_frames), dtype=np.int16)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samplerate", type=int, default=16000)
+    parser.add_argument("--speech-seconds", type=float, default=60.0)
+    parser.add_argument("--padding-ms", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    audio = synthetic_utterance(args.samplerate, 3.0, args.speech_seconds, 5.0)
+    chunk_size = int(args.samplerate * 30 / 1000)
+    vad = EnergyVAD()
+    # VAD cost alone, so the capture overhead can be reported separately
+    frames = [audio[i:i + chunk_size].tobytes() for i in range(0, len(audio) - chunk_size + 1, chunk_size)]
+    start = time.perf_counter()
+    for frame in frames:
+        vad.is_speech(frame, args.samplerate)
+    vad_seconds = (time.perf_counter() - start) / len(frames)
+
+    candidates = {
+        'legacy deque': lambda: legacy_capture(ArraySource(audio, args.samplerate), vad, args.padding_ms),
+        'VADCapture': lambda: VADCapture(ArraySource(audio, args.samplerate), vad, args.padding_ms).record(),
+    }
+    results = {name: capture() for name, capture in candidates.items()}
+    same = np.array_equal(results['legacy deque'], results['VADCapture'])
+    print(f"{len(frames)} frames of 30 ms, {args.padding_ms} ms padding, VAD alone {vad_seconds * 1e6:.1f} us/frame, "
+          f"identical output: {same}")
+    print(f"{'capture':<14}{'us/frame':>10}{'overhead':>10}")
+    for name, capture in candidates.items():
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            capture()
+        seconds = (time.perf_counter() - start) / (args.repeat * len(frames))
+        print(f"{name:<14}{seconds * 1e6:>10.1f}{(seconds - vad_seconds) * 1e6:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
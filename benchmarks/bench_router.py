@@ -0,0 +1,85 @@
+"""
+Micro-benchmark of query routing cost and accuracy.
+
+Compares the original keyword regex, which was rebuilt on every call, with the precompiled
+QueryRouter keyword stage. Runs offline: the semantic fallback is disabled.
+
+    python -m benchmarks.bench_router
+"""
+import argparse
+import re
+import time
+from chains.query_router import CODE_ROUTE, LANGUAGE_ROUTE, QueryRouter
+
+LEGACY_KEYWORDS = [
+    'function', 'class', 'def', 'import', 'print', 'variable',
+    'loop', 'array', 'list', 'dictionary', 'exception', 'error', 'bug',
+    'code', 'compile', 'execute', 'algorithm', 'data structure', 'java', 'python', 'javascript', 'c++',
+    'c#', 'ruby', 'php', 'html', 'css', 'sql', 'swift', 'kotlin', 'go', 'rust', 'typescript', 'r', 'perl',
+    'scala', 'shell', 'bash', 'powershell', 'objective-c', 'matlab', 'groovy', 'lua', 'dart', 'cobol',
+    'fortran', 'haskell', 'lisp', 'pascal', 'prolog', 'scheme', 'smalltalk', 'verilog', 'vhdl',
+    'assembly', 'coffeescript', 'f#', 'julia', 'racket', 'scratch', 'solidity', 'vba', 'abap', 'apex',
+    'awk', 'clojure', 'd', 'elixir', 'erlang', 'forth', 'hack', 'idris', 'j', 'julia', 'kdb+', 'labview',
+    'logtalk', 'lolcode', 'mumps', 'nim', 'ocaml', 'pl/i', 'postscript', 'powershell', 'rpg', 'sas', 'sml',
+    'tcl', 'turing', 'unicon', 'x10', 'xquery', 'zsh'
+]
+
+# (query, expected route)
+LABELED_QUERIES = [
+    ("What is the capital of France?", LANGUAGE_ROUTE),
+    ("Can you give me a list of things to pack for a beach trip?", LANGUAGE_ROUTE),
+    ("I'd like to go to Rome next summer, any tips?", LANGUAGE_ROUTE),
+    ("Tell me about the D-Day landings.", LANGUAGE_ROUTE),
+    ("What class of ships did the Royal Navy use in 1805?", LANGUAGE_ROUTE),
+    ("Write a short poem about autumn leaves.", LANGUAGE_ROUTE),
+    ("Plan a 3 day itinerary for Tokyo, I'm a huge J-pop fan.", LANGUAGE_ROUTE),
+    ("Is it safe to eat raw cookie dough?", LANGUAGE_ROUTE),
+    ("Explain the plot of Hamlet in a few sentences.", LANGUAGE_ROUTE),
+    ("What does the letter r stand for in the formula for a circle's area?", LANGUAGE_ROUTE),
+    ("How do I reverse a linked list in Python?", CODE_ROUTE),
+    ("Fix this: TypeError: 'NoneType' object is not subscriptable", CODE_ROUTE),
+    ("Write a SQL query that returns the top 5 customers by revenue.", CODE_ROUTE),
+    ("What's the difference between a list and a tuple in python?", CODE_ROUTE),
+    ("def add(a, b):\n    return a + b\nwhy does this fail?", CODE_ROUTE),
+    ("How can I make an HTTP request in Go code?", CODE_ROUTE),
+    ("Explain the quicksort algorithm.", CODE_ROUTE),
+    ("Why does my JavaScript promise never resolve?", CODE_ROUTE),
+    ("How do I plot a histogram in R?", CODE_ROUTE),
+    ("Refactor this function to use a dictionary lookup instead of if/else.", CODE_ROUTE),
+]
+
+
+def legacy_is_code_related(text):
+    pattern = re.compile(r'\b(?:' + '|'.join(re.escape(word) for word in LEGACY_KEYWORDS) + r')\b', re.IGNORECASE)
+    return bool(pattern.search(text))
+
+
+def time_per_query(fn, queries, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            fn(query)
+    return (time.perf_counter() - start) / (repeat * len(queries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200, help="Passes over the labeled queries.")
+    args = parser.parse_args()
+
+    router = QueryRouter()
+    queries = [query for query, _ in LABELED_QUERIES]
+    candidates = {
+        'legacy regex': lambda q: CODE_ROUTE if legacy_is_code_related(q) else LANGUAGE_ROUTE,
+        'QueryRouter': lambda q: router.classify(q).route,
+    }
+    print(f"{'router':<14}{'us/query':>10}{'misrouted':>11}{'prose->code':>13}")
+    for name, route in candidates.items():
+        seconds = time_per_query(route, queries, args.repeat)
+        misrouted = [(q, expected) for q, expected in LABELED_QUERIES if route(q) != expected]
+        prose_to_code = sum(1 for _, expected in misrouted if expected == LANGUAGE_ROUTE)
+        print(f"{name:<14}{seconds * 1e6:>10.1f}{len(misrouted):>8}/{len(queries):<2}{prose_to_code:>13}")
+
+
+if __name__ == '__main__':
+    main()
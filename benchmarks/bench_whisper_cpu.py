@@ -0,0 +1,70 @@
+"""
+Side-by-side CPU latency and word error rate of the Whisper inference modes.
+
+Each mode loads its own copy of the model and transcribes the same file a few times. WER is
+measured against --reference if given, otherwise against the fp32 transcript, which then shows
+how much quantization and greedy decoding change the output.
+
+    python -m benchmarks.bench_whisper_cpu --audio recorded_audio.wav --threads 4
+"""
+import argparse
+import re
+import statistics
+import time
+from chains.models.whisper_asr import WhisperASR
+
+MODES = {
+    'fp32': {'device': 'cpu'},
+    'fp32+greedy': {'device': 'cpu', 'greedy': True},
+    'int8': {'device': 'cpu', 'quantize': True},
+    'int8+greedy': {'device': 'cpu', 'quantize': True, 'greedy': True},
+}
+
+
+def normalize_words(text):
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance divided by the number of reference words."""
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / max(len(ref), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--audio", default="recorded_audio.wav")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--threads", type=int, help="torch intra-op threads.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--reference", help="Reference transcript for WER.")
+    args = parser.parse_args()
+
+    results = {}
+    for mode, options in MODES.items():
+        asr = WhisperASR(model_name=args.model, threads=args.threads, **options)
+        asr.transcribe_audio(args.audio)  # warm-up
+        latencies = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            text = asr.transcribe_audio(args.audio)
+            latencies.append(time.perf_counter() - start)
+        results[mode] = (statistics.median(latencies), text.strip())
+        del asr
+
+    reference = args.reference or results['fp32'][1]
+    print(f"reference: {reference!r}{'' if args.reference else ' (fp32 mode)'}")
+    print(f"{'mode':<14}{'median s':>10}{'speedup':>9}{'WER':>7}")
+    baseline = results['fp32'][0]
+    for mode, (latency, text) in results.items():
+        print(f"{mode:<14}{latency:>10.2f}{baseline / latency:>8.2f}x{word_error_rate(reference, text):>7.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Local stand-in for the NVIDIA NIM endpoints, for load tests that must not hit the real API.
+
+Serves the OpenAI-compatible routes the app uses: `/v1/models`, `/v1/chat/completions` (streamed
+as server-sent events or in one response) and `/v1/embeddings`. Replies are filler text delivered
+at a configurable time to first token and token rate, with random jitter and injected errors.
+Embeddings are deterministic per input, so caches and vector stores behave as with a real model.
+
+    python -m benchmarks.fake_nim --port 8000 --ttft 0.3 --tokens-per-second 40 --error-rate 0.01
+    NVIDIA_BASE_URL=http://localhost:8000/v1 streamlit run app.py
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+import numpy as np
+from aiohttp import web
+
+# The models the app asks for; ChatNVIDIA checks a self-hosted endpoint's /v1/models list
+DEFAULT_MODELS = [
+    "meta/llama3-70b-instruct",
+    "ibm/granite-34b-code-instruct",
+    "microsoft/phi-3-vision-128k-instruct",
+    "ai-embed-qa-4",
+    "NV-Embed-QA",
+]
+FILLER = ("The quick answer depends on the details. In most cases the simplest approach works well, "
+          "and it is easy to change later. Start with a small example, measure it, and then adjust "
+          "the parts that matter. ").split(" ")
+
+
+class FakeNIM:
+    """
+    Configurable fake of an OpenAI-compatible chat and embeddings server.
+
+    Every delay is scaled by a random factor in [1 - jitter, 1 + jitter]. Counters of served
+    requests and injected errors are kept for the load-test report.
+    """
+
+    def __init__(self, ttft=0.25, tokens_per_second=50.0, reply_tokens=120, error_rate=0.0, jitter=0.2,
+                 embedding_latency=0.02, embedding_dim=1024, models=None, seed=None):
+        """
+        :param ttft: float, Seconds before the first token of a reply.
+        :param tokens_per_second: float, Rate of the following tokens.
+        :param reply_tokens: int, Tokens per reply, unless the request's max_tokens is lower.
+        :param error_rate: float, Share of requests answered with HTTP 500.
+        :param jitter: float, Relative random variation of every delay.
+        :param embedding_latency: float, Seconds per embeddings request.
+        :param embedding_dim: int, Size of the returned embeddings.
+        :param models: list, Model ids listed by /v1/models; DEFAULT_MODELS if None.
+        :param seed: int, Seed for jitter and error injection.
+        """
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.embedding_latency = embedding_latency
+        self.embedding_dim = embedding_dim
+        self.models = list(models or DEFAULT_MODELS)
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+
+    def app(self):
+        """Build the aiohttp application."""
+        app = web.Application(client_max_size=64 * 1024 * 1024)  # base64 images are large
+        app.router.add_get("/v1/models", self.list_models)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/v1/embeddings", self.embeddings)
+        return app
+
+    def _delay(self, seconds):
+        return max(0.0, seconds * self.random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def _fail(self):
+        self.requests += 1
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({"error": {"message": "Injected failure", "type": "server_error"}}, status=500)
+        return None
+
+    async def list_models(self, request):
+        return web.json_response({"object": "list", "data": [
+            {"id": model, "object": "model", "created": 0, "owned_by": "fake-nim"} for model in self.models
+        ]})
+
+    async def chat_completions(self, request):
+        body = await request.json()
+        failure = self._fail()
+        if failure is not None:
+            await asyncio.sleep(self._delay(self.ttft))
+            return failure
+        model = body.get("model", self.models[0])
+        count = min(self.reply_tokens, body.get("max_tokens") or self.reply_tokens)
+        tokens = [FILLER[i % len(FILLER)] + " " for i in range(count)]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        usage = {"prompt_tokens": len(json.dumps(body.get("messages", []))) // 4,
+                 "completion_tokens": count}
+        usage["total_tokens"] = usage["prompt_tokens"] + count
+
+        if not body.get("stream"):
+            await asyncio.sleep(self._delay(self.ttft + count / self.tokens_per_second))
+            return web.json_response({
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        async def send(delta, finish_reason=None, **extra):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                     **extra}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+
+        await asyncio.sleep(self._delay(self.ttft))
+        await send({"role": "assistant", "content": tokens[0]})
+        for token in tokens[1:]:
+            await asyncio.sleep(self._delay(1.0 / self.tokens_per_second))
+            await send({"content": token})
+        await send({}, "stop", usage=usage)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def embeddings(self, request):
+        body = await request.json()
+        failure = self._fail()
+        await asyncio.sleep(self._delay(self.embedding_latency))
+        if failure is not None:
+            return failure
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        return web.json_response({
+            "object": "list", "model": body.get("model"),
+            "data": [{"object": "embedding", "index": i, "embedding": self.embed(text)} for i, text in enumerate(inputs)],
+            "usage": {"prompt_tokens": sum(len(text) // 4 for text in inputs),
+                      "total_tokens": sum(len(text) // 4 for text in inputs)},
+        })
+
+    def embed(self, text):
+        """A unit vector derived from the text, so equal inputs get equal embeddings."""
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.embedding_dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+def serve_in_thread(fake, host="127.0.0.1", port=0):
+    """
+    Run a FakeNIM on a background thread with its own event loop.
+
+    :param fake: FakeNIM, The server to run.
+    :param port: int, Port to listen on; 0 picks a free one.
+    :return: tuple, The base URL (ending in /v1) and a function that stops the server.
+    """
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    state = {}
+
+    async def start():
+        runner = web.AppRunner(fake.app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        state["runner"] = runner
+        state["port"] = site._server.sockets[0].getsockname()[1]
+        started.set()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(start())
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, name="fake-nim", daemon=True)
+    thread.start()
+    started.wait()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(state["runner"].cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+    return f"http://{host}:{state['port']}/v1", stop
+
+
+def add_arguments(parser):
+    """Add the FakeNIM settings to an argument parser."""
+    parser.add_argument("--ttft", type=float, default=0.25, help="Seconds to the first token.")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--reply-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests that fail with HTTP 500.")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative random variation of every delay.")
+    parser.add_argument("--embedding-latency", type=float, default=0.02)
+    parser.add_argument("--embedding-dim", type=int, default=1024)
+    parser.add_argument("--seed", type=int)
+
+
+def from_arguments(args):
+    """Build a FakeNIM from the settings added by `add_arguments`."""
+    return FakeNIM(ttft=args.ttft, tokens_per_second=args.tokens_per_second, reply_tokens=args.reply_tokens,
+                   error_rate=args.error_rate, jitter=args.jitter, embedding_latency=args.embedding_latency,
+                   embedding_dim=args.embedding_dim, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    add_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(from_arguments(args).app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
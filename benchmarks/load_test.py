@@ -0,0 +1,229 @@
+"""
+End-to-end load test of AssistantRouter against a local stand-in for the NVIDIA endpoints.
+
+Replays a JSONL script of conversations through `AssistantRouter.aroute_stream` at increasing
+concurrency and reports p50/p95/p99 time to first token, total latency and throughput per
+conversation kind. Each script line is one conversation:
+
+    {"kind": "code", "turns": ["first question", "follow-up"]}
+    {"kind": "image", "turns": ["What is this?"], "image": "photo.jpg"}
+    {"kind": "rag", "turns": ["question"], "documents": ["text to index", "..."]}
+
+Image conversations without an "image" get a synthetic one. The "documents" of all lines are
+embedded into a temporary vector store for retrieval, unless --vectorstore is given. The fake
+server runs in this process by default; for high concurrency run `python -m benchmarks.fake_nim`
+separately and pass --base-url, so the server does not compete with the driver for the GIL.
+
+    python -m benchmarks.load_test --concurrency 1 4 16 64 --ttft 0.3 --tokens-per-second 40
+    python -m benchmarks.load_test --base-url http://localhost:8000/v1 --output load.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from PIL import Image
+
+from benchmarks import fake_nim
+
+DEFAULT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "load_script.jsonl")
+DOCUMENT_EMBEDDING_MODEL = "NV-Embed-QA"
+
+
+def load_script(path):
+    """Read the conversations, attaching image bytes to image conversations."""
+    conversations = []
+    with open(path) as f:
+        for line_number, line in enumerate(f):
+            if not line.strip():
+                continue
+            conversation = json.loads(line)
+            if conversation.get("image"):
+                with open(conversation["image"], "rb") as image_file:
+                    conversation["image_bytes"] = image_file.read()
+            elif conversation.get("kind") == "image":
+                conversation["image_bytes"] = synthetic_image(line_number)
+            conversations.append(conversation)
+    return conversations
+
+
+def synthetic_image(seed, size=(1280, 960)):
+    """A photo-sized JPEG of smooth noise."""
+    pixels = np.random.default_rng(seed).integers(0, 255, (size[1] // 16, size[0] // 16, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).resize(size, Image.BILINEAR).save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def build_vectorstore(documents, directory):
+    """Embed the script's documents through the configured endpoint and save them as a store."""
+    from langchain_community.vectorstores import FAISS
+    from langchain_nvidia_ai_endpoints import NVIDIAEmbeddings
+    from chains import http_pool
+    from chains.vectorstore_io import save_vectorstore
+
+    embedder = NVIDIAEmbeddings(model=DOCUMENT_EMBEDDING_MODEL, model_type="passage", **http_pool.client_options())
+    save_vectorstore(FAISS.from_texts(documents, embedder), directory, embedding_model=DOCUMENT_EMBEDDING_MODEL)
+
+
+async def run_conversation(router, conversation, session_id, samples):
+    """Send every turn of a conversation in order and record one sample per turn."""
+    image = conversation.get("image_bytes")
+    for turn in conversation["turns"]:
+        start = time.perf_counter()
+        first_token = None
+        tokens = 0
+        failed = False
+        try:
+            stream, assistant_name = await router.aroute_stream(turn, image, session_id)
+            async for token in stream:
+                if not token:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                if token.lstrip().startswith("Error:"):
+                    failed = True
+                tokens += 1
+        except Exception:
+            assistant_name, failed = "Error", True
+        samples.append({
+            "kind": conversation.get("kind", "text"),
+            "assistant": assistant_name,
+            "ttft_s": first_token,
+            "latency_s": time.perf_counter() - start,
+            "tokens": tokens,
+            "error": failed or assistant_name == "Error",
+        })
+
+
+async def run_level(router, conversations, concurrency, count):
+    """
+    Replay `count` conversations, cycling through the script, with at most `concurrency` at a time.
+
+    :return: tuple, The per-turn samples and the wall time of the level.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def user(index):
+        async with semaphore:
+            # A new session per replay, so conversation memory does not grow across replays
+            session_id = f"load-{concurrency}-{index}"
+            await run_conversation(router, conversations[index % len(conversations)], session_id, samples)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(count)))
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, wall_time):
+    """Percentiles and throughput per conversation kind, plus an 'all' row."""
+    rows = {}
+    for kind in sorted({s["kind"] for s in samples}) + ["all"]:
+        selected = [s for s in samples if kind == "all" or s["kind"] == kind]
+        ok = [s for s in selected if not s["error"]]
+        ttft = [s["ttft_s"] for s in ok if s["ttft_s"] is not None]
+        latency = [s["latency_s"] for s in ok]
+        rows[kind] = {
+            "turns": len(selected),
+            "errors": len(selected) - len(ok),
+            "ttft_s": percentiles(ttft),
+            "latency_s": percentiles(latency),
+            "turns_per_s": len(ok) / wall_time,
+            "tokens_per_s": sum(s["tokens"] for s in ok) / wall_time,
+        }
+    return rows
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def print_report(concurrency, rows, wall_time):
+    def ms(value):
+        return f"{value * 1000:.0f}" if value is not None else "-"
+
+    print(f"\nconcurrency {concurrency}, {wall_time:.1f}s")
+    print(f"{'kind':<8}{'turns':>7}{'errors':>7}{'ttft p50/p95/p99 ms':>24}{'latency p50/p95/p99 ms':>27}"
+          f"{'turns/s':>9}{'tok/s':>9}")
+    for kind, row in rows.items():
+        ttft = "/".join(ms(row["ttft_s"][p]) for p in ("p50", "p95", "p99"))
+        latency = "/".join(ms(row["latency_s"][p]) for p in ("p50", "p95", "p99"))
+        print(f"{kind:<8}{row['turns']:>7}{row['errors']:>7}{ttft:>24}{latency:>27}"
+              f"{row['turns_per_s']:>9.2f}{row['tokens_per_s']:>9.0f}")
+
+
+async def run(args, conversations):
+    from chains import http_pool
+    from chains.registry import registry
+    from chains.response_cache import ResponseCache
+
+    router = registry.get('router')
+    if not args.cache:
+        # Replays repeat the same prompts, which the cache would otherwise answer without the model
+        router.response_cache = ResponseCache(max_entries=0, similarity_threshold=None)
+    report = []
+    try:
+        for concurrency in args.concurrency:
+            count = args.conversations or max(len(conversations), 2 * concurrency)
+            samples, wall_time = await run_level(router, conversations, concurrency, count)
+            rows = summarize(samples, wall_time)
+            print_report(concurrency, rows, wall_time)
+            report.append({"concurrency": concurrency, "conversations": count, "wall_s": wall_time, "routes": rows})
+    finally:
+        await http_pool.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--script", default=DEFAULT_SCRIPT, help="JSONL file of conversations.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--conversations", type=int,
+                        help="Conversations per level (default: the script size or twice the concurrency).")
+    parser.add_argument("--base-url", help="Endpoint to test against instead of an in-process fake server.")
+    parser.add_argument("--vectorstore", help="Existing vector store for retrieval instead of the script's documents.")
+    parser.add_argument("--cache", action="store_true", help="Keep the response cache on.")
+    parser.add_argument("--output", help="Write the report as JSON to this file.")
+    fake_nim.add_arguments(parser)
+    args = parser.parse_args()
+
+    stop = None
+    if args.base_url:
+        base_url = args.base_url
+    else:
+        base_url, stop = fake_nim.serve_in_thread(fake_nim.from_arguments(args))
+    # Read by the model factories, so this must be set before the registry builds anything
+    os.environ["NVIDIA_BASE_URL"] = base_url
+
+    conversations = load_script(args.script)
+    with tempfile.TemporaryDirectory(prefix="load-test-store-") as store_dir:
+        documents = [doc for conversation in conversations for doc in conversation.get("documents", [])]
+        if args.vectorstore:
+            os.environ["VECTORSTORE_DIR"] = args.vectorstore
+        elif documents:
+            build_vectorstore(documents, store_dir)
+            os.environ["VECTORSTORE_DIR"] = store_dir
+        else:
+            os.environ["VECTORSTORE_DIR"] = os.path.join(store_dir, "none")
+        print(f"Replaying {len(conversations)} conversations against {base_url}", file=sys.stderr)
+        try:
+            report = asyncio.run(run(args, conversations))
+        finally:
+            if stop is not None:
+                stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"base_url": base_url, "script": args.script, "levels": report}, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
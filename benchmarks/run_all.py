@@ -0,0 +1,225 @@
+"""
+Offline micro-benchmark suite for the local hot paths, with machine-readable results.
+
+Covers query routing, image preprocessing, embedding search from 1k to 1M vectors, the VAD
+capture loop fed from a WAV file and the NeMo post-processing. Nothing here touches the
+network or loads a model: objects whose constructors create API clients or load weights are
+built without them, since the measured methods do not use those parts.
+
+    python -m benchmarks.run_all --output bench.json
+    python -m benchmarks.run_all --quick --baseline bench.json   # flag regressions against a saved run
+"""
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import wave
+from datetime import datetime, timezone
+import numpy as np
+from PIL import Image
+
+from benchmarks.bench_capture import synthetic_utterance
+from benchmarks.bench_router import LABELED_QUERIES
+from chains.assistant_router import AssistantRouter
+from chains.embedding_index import EmbeddingIndex
+from chains.embedding_models import EmbeddingModels
+from chains.models.audio_capture import EnergyVAD, WavFileSource
+from chains.models.nemo_asr import NeMoASR
+from chains.models.whisper_asr import WhisperASR
+from chains.query_router import QueryRouter
+from chains.registry import ModelRegistry
+from chains.vision_assistant import VisionAssistant
+from utils import image_processor
+from utils.image_processor import resize_image_to_base64
+
+IMAGE_SIZES = [(640, 480), (1920, 1080), (4032, 3024)]
+INDEX_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+QUICK_INDEX_SIZES = [1_000, 10_000, 100_000]
+
+# Inputs that exercise every routing path: plain prose, keyword hits, pasted code and long text
+EXTRA_QUERIES = [
+    "hi",
+    "Traceback (most recent call last):\n  File \"app.py\", line 3\nValueError: bad value",
+    "const total = items.reduce((a, b) => a + b, 0);",
+    "Tell me a long story about a dragon who learns to bake bread. " * 20,
+]
+
+
+def offline_instance(cls, **attributes):
+    """Create `cls` without running its constructor, setting only the attributes a benchmark needs."""
+    instance = cls.__new__(cls)
+    instance.__dict__.update(attributes)
+    return instance
+
+
+def measure(fn, min_time=0.2, max_repeat=1000):
+    """
+    Time repeated calls of `fn` until `min_time` has passed.
+
+    :return: dict, Call count and timing statistics in seconds.
+    """
+    fn()  # warm-up
+    times = []
+    deadline = time.perf_counter() + min_time
+    while len(times) < max_repeat and (len(times) < 3 or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {
+        "calls": len(times),
+        "mean_s": statistics.fmean(times),
+        "median_s": statistics.median(times),
+        "min_s": times[0],
+        "p95_s": times[min(len(times) - 1, int(len(times) * 0.95))],
+    }
+
+
+def bench_routing(results, args, workdir):
+    router = AssistantRouter(registry=ModelRegistry())
+    # The semantic fallback embeds the query upstream; only the local keyword stage is measured
+    router.query_router = QueryRouter(semantic=None)
+    queries = [query for query, _ in LABELED_QUERIES] + EXTRA_QUERIES
+    for label, batch in [("short", queries[:-1]), ("long", queries[-1:])]:
+        stats = measure(lambda: [router.is_code_related(q) for q in batch], args.min_time)
+        per_query = {key: value / len(batch) for key, value in stats.items() if key.endswith("_s")}
+        results.append({"name": "AssistantRouter.is_code_related", "params": {"inputs": label, "queries": len(batch)},
+                        "calls": stats["calls"], **per_query})
+
+
+def bench_images(results, args, workdir):
+    vision = offline_instance(VisionAssistant, image_format="JPEG", image_quality=85)
+    rng = np.random.default_rng(0)
+    for width, height in IMAGE_SIZES:
+        pixels = rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8)
+        # Upscaled noise compresses like a photo rather than like pure noise
+        image = Image.fromarray(pixels).resize((width, height), Image.BILINEAR)
+        path = os.path.join(workdir, f"image_{width}x{height}.jpg")
+        image.save(path, quality=90)
+        with open(path, "rb") as f:
+            data = f.read()
+        params = {"width": width, "height": height, "bytes": len(data)}
+
+        def cold():
+            image_processor._encode_cache.clear()
+            return vision.process_image(data)
+
+        results.append({"name": "VisionAssistant.process_image", "params": {**params, "cache": "cold"},
+                        **measure(cold, args.min_time, 200)})
+        output_bytes = len(base64.b64decode(vision.process_image(data)))
+        results.append({"name": "VisionAssistant.process_image",
+                        "params": {**params, "cache": "warm", "output_bytes": output_bytes},
+                        **measure(lambda: vision.process_image(data), args.min_time)})
+        results.append({"name": "resize_image_to_base64", "params": params,
+                        **measure(lambda: resize_image_to_base64(path), args.min_time, 200)})
+
+
+def bench_embeddings(results, args, workdir):
+    rng = np.random.default_rng(0)
+    models = offline_instance(EmbeddingModels)
+    query = rng.standard_normal(args.dim, dtype=np.float32)
+    queries = rng.standard_normal((16, args.dim), dtype=np.float32)
+    for size in (QUICK_INDEX_SIZES if args.quick else INDEX_SIZES):
+        index = EmbeddingIndex(os.path.join(workdir, f"index_{size}"), dim=args.dim)
+        for start in range(0, size, 100_000):
+            count = min(100_000, size - start)
+            index.append([f"doc{i}" for i in range(start, start + count)],
+                         rng.standard_normal((count, args.dim), dtype=np.float32))
+        params = {"vectors": size, "dim": args.dim, "top_k": 10}
+        results.append({"name": "EmbeddingModels.compare_embeddings", "params": {**params, "queries": 1},
+                        **measure(lambda: models.compare_embeddings(query, index, top_k=10), args.min_time, 100)})
+        results.append({"name": "EmbeddingModels.compare_embeddings", "params": {**params, "queries": len(queries)},
+                        **measure(lambda: models.compare_embeddings(queries, index, top_k=10), args.min_time, 50)})
+
+
+def bench_audio(results, args, workdir):
+    samplerate = 16000
+    audio = synthetic_utterance(samplerate, 3.0, 30.0, 5.0)
+    path = os.path.join(workdir, "utterance.wav")
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(samplerate)
+        wf.writeframes(audio.tobytes())
+    asr = offline_instance(WhisperASR, vad=EnergyVAD())
+    frames = len(audio) // (samplerate * 30 // 1000)
+    with contextlib.redirect_stdout(io.StringIO()):  # record_audio prints its progress
+        stats = measure(lambda: asr.record_audio(source=WavFileSource(path)), args.min_time, 20)
+    results.append({"name": "WhisperASR.record_audio", "params": {"source": "wav", "seconds": len(audio) / samplerate,
+                                                                  "frames": frames, "vad": "energy"},
+                    **stats, "per_frame_s": stats["median_s"] / frames})
+
+    nemo = offline_instance(NeMoASR, THRESHOLD=500, RATE=44100)
+    long_audio = synthetic_utterance(44100, 2.0, 60.0, 2.0)
+    params = {"seconds": len(long_audio) / 44100, "rate": 44100}
+    results.append({"name": "NeMoASR.normalize", "params": params,
+                    **measure(lambda: nemo.normalize(long_audio), args.min_time, 50)})
+    results.append({"name": "NeMoASR.trim", "params": params,
+                    **measure(lambda: nemo.trim(long_audio), args.min_time, 50)})
+
+
+SUITES = {"routing": bench_routing, "images": bench_images, "embeddings": bench_embeddings, "audio": bench_audio}
+
+
+def compare(results, baseline_path, tolerance):
+    """Print the change of every benchmark's median against a saved run and return the regressions."""
+    with open(baseline_path) as f:
+        baseline = {(r["name"], json.dumps(r["params"], sort_keys=True)): r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        key = (result["name"], json.dumps(result["params"], sort_keys=True))
+        if key not in baseline:
+            continue
+        ratio = result["median_s"] / baseline[key]["median_s"]
+        flag = "REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{result['name']:<36}{json.dumps(result['params'])[:60]:<62}{ratio:>7.2f}x {flag}", file=sys.stderr)
+        if flag:
+            regressions.append(result)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", help="Write the results as JSON to this file (default: stdout).")
+    parser.add_argument("--suite", nargs="+", choices=sorted(SUITES), default=sorted(SUITES))
+    parser.add_argument("--quick", action="store_true", help="Stop the embedding search at 100k vectors.")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension for the search benchmark.")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds to spend timing each case.")
+    parser.add_argument("--baseline", help="Earlier results to compare medians against.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Slowdown counted as a regression.")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="agent-nesh-bench-") as workdir:
+        for name in args.suite:
+            print(f"Running {name}...", file=sys.stderr)
+            SUITES[name](results, args, workdir)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    text = json.dumps(report, indent=1)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
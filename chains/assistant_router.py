@@ -63,46 +63,286 @@
 
 
 
-import re
+import asyncio
 import logging
-from chains.code_assistant import CodeAssistant
-from chains.language_assistant import LanguageAssistant
-from chains.vision_assistant import VisionAssistant
+import time
+from chains.coalescing import SingleFlight
+from chains.query_router import CODE_ROUTE, QueryRouter, SemanticRouteClassifier
+from chains.registry import registry as default_registry
+from chains.response_cache import ResponseCache, normalize_prompt
+from utils import metrics
 
 class AssistantRouter:
-    def __init__(self):
-        self.code_assistant = CodeAssistant()
-        self.language_assistant = LanguageAssistant()
-        self.vision_assistant = VisionAssistant()
+    # Text-only assistants whose answers can be served from the response cache
+    CACHEABLE_ASSISTANTS = ('LanguageAssistant', 'CodeAssistant')
 
-    def route_input(self, user_input='', image_path=None):
+    def __init__(self, registry=None):
+        # Assistants are built lazily by the registry and shared across routers
+        self.registry = registry or default_registry
+        # Ambiguous queries fall back to embedding similarity, which needs the embedding models
+        self.query_router = QueryRouter(SemanticRouteClassifier(lambda: self.registry.get('embedding_models')))
+        self.response_cache = ResponseCache(embedder_fn=lambda: self.registry.get('embedding_models'))
+        # Identical questions arriving while the answer is still being generated share one generation
+        self.single_flight = SingleFlight('AssistantRouter')
+
+    @property
+    def code_assistant(self):
+        return self.registry.get('code_assistant')
+
+    @property
+    def language_assistant(self):
+        return self.registry.get('language_assistant')
+
+    @property
+    def vision_assistant(self):
+        return self.registry.get('vision_assistant')
+
+    @property
+    def retriever(self):
+        return self.registry.get('retriever')
+
+    def route_input(self, user_input='', image=None, session_id=None):
         """
         Route the input to the appropriate assistant based on the content of the user input.
 
         :param user_input: str, The input text from the user.
-        :param image_path: str, Path to an image file if provided.
+        :param image: str, bytes or file-like object, An image path or the uploaded image contents, if provided.
+        :param session_id: str, The conversation the input belongs to.
         :return: tuple, The response from the appropriate assistant and the assistant name.
         """
         try:
-            if image_path:
-                # Process image and route to VisionAssistant
-                image_b64 = self.vision_assistant.process_image(image_path)
-                if image_b64 is None:
-                    raise ValueError("Failed to process image.")
-                input_string = f"{user_input}|{image_b64}"
-                response = self.vision_assistant.invoke(input_string)
-                return response, 'VisionAssistant'
-
-            if self.is_code_related(user_input):
-                response = self.code_assistant.invoke(user_input)
-                return response, 'CodeAssistant'
-            else:
-                response = self.language_assistant.invoke(user_input)
-                return response, 'LanguageAssistant'
+            with metrics.span("request", "route_input", profile=True):
+                assistant, payload, assistant_name = self.select_assistant(user_input, image)
+                if assistant_name not in self.CACHEABLE_ASSISTANTS:
+                    return assistant.invoke(payload, session_id), assistant_name
+                model, context = self._cache_key(assistant, session_id)
+                response = self.response_cache.get(model, payload, context)
+                if response is not None:
+                    assistant.add_to_memory(payload, response, session_id)
+                    return response, assistant_name
+                response = assistant.invoke(payload, session_id, self.retrieve_context(assistant, payload))
+                if isinstance(response, str):
+                    self.response_cache.put(model, payload, response, context)
+                return response, assistant_name
         except Exception as e:
             logging.error(f"Error in AssistantRouter.route_input: {e}")
             return {"content": f"Error: {str(e)}"}, 'Error'
 
+    def route_stream(self, user_input='', image=None, session_id=None):
+        """
+        Route the input like `route_input`, but stream the response tokens as the model produces them.
+
+        :param user_input: str, The input text from the user.
+        :param image: str, bytes or file-like object, An image path or the uploaded image contents, if provided.
+        :param session_id: str, The conversation the input belongs to.
+        :return: tuple, A generator of response tokens and the assistant name.
+        """
+        start = time.perf_counter()
+        try:
+            assistant, payload, assistant_name = self.select_assistant(user_input, image)
+        except Exception as e:
+            logging.error(f"Error in AssistantRouter.route_stream: {e}")
+            metrics.span("request", "route_stream").begin(start).end(e)
+            return iter([f"Error: {str(e)}"]), 'Error'
+        if assistant_name in self.CACHEABLE_ASSISTANTS:
+            tokens = self._cached_stream(assistant, payload, session_id)
+        else:
+            tokens = assistant.stream(payload, session_id)
+        # Runs from the request's arrival until the caller has consumed the stream, so the time spent
+        # rendering tokens counts too; the profiler only starts once the stream is iterated
+        span = metrics.span("request", "route_stream", profile=True)
+        return metrics.timed_stream(self._guard_stream(tokens), span, start), assistant_name
+
+    async def aroute_input(self, user_input='', image=None, session_id=None):
+        """
+        Async counterpart of `route_input`.
+
+        :param user_input: str, The input text from the user.
+        :param image: str, bytes or file-like object, An image path or the uploaded image contents, if provided.
+        :param session_id: str, The conversation the input belongs to.
+        :return: tuple, The response from the appropriate assistant and the assistant name.
+        """
+        try:
+            with metrics.span("request", "aroute_input"):
+                assistant, payload, assistant_name = await asyncio.to_thread(self.select_assistant, user_input, image)
+                if assistant_name not in self.CACHEABLE_ASSISTANTS:
+                    return await assistant.ainvoke(payload, session_id), assistant_name
+                model, context = self._cache_key(assistant, session_id)
+                response = await asyncio.to_thread(self.response_cache.get, model, payload, context)
+                if response is not None:
+                    assistant.add_to_memory(payload, response, session_id)
+                    return response, assistant_name
+                retrieved = await asyncio.to_thread(self.retrieve_context, assistant, payload)
+                response = await assistant.ainvoke(payload, session_id, retrieved)
+                if isinstance(response, str):
+                    self.response_cache.put(model, payload, response, context)
+                return response, assistant_name
+        except Exception as e:
+            logging.error(f"Error in AssistantRouter.aroute_input: {e}")
+            return {"content": f"Error: {str(e)}"}, 'Error'
+
+    async def aroute_stream(self, user_input='', image=None, session_id=None):
+        """
+        Async counterpart of `route_stream`. Image preprocessing runs in a worker thread
+        so it does not block the event loop.
+
+        :param user_input: str, The input text from the user.
+        :param image: str, bytes or file-like object, An image path or the uploaded image contents, if provided.
+        :param session_id: str, The conversation the input belongs to.
+        :return: tuple, An async generator of response tokens and the assistant name.
+        """
+        start = time.perf_counter()
+        try:
+            assistant, payload, assistant_name = await asyncio.to_thread(self.select_assistant, user_input, image)
+        except Exception as e:
+            logging.error(f"Error in AssistantRouter.aroute_stream: {e}")
+            metrics.span("request", "aroute_stream").begin(start).end(e)
+            return self._aguard_stream(None, f"Error: {str(e)}"), 'Error'
+        if assistant_name in self.CACHEABLE_ASSISTANTS:
+            tokens = self._acached_stream(assistant, payload, session_id)
+        else:
+            tokens = assistant.astream(payload, session_id)
+        span = metrics.span("request", "aroute_stream")
+        return metrics.atimed_stream(self._aguard_stream(tokens), span, start), assistant_name
+
+    def select_assistant(self, user_input='', image=None):
+        """
+        Pick the assistant for the input and build the payload it expects.
+
+        :param user_input: str, The input text from the user.
+        :param image: str, bytes or file-like object, An image path or the uploaded image contents, if provided.
+        :return: tuple, The assistant, its input payload and the assistant name.
+        """
+        if image:
+            # Encoded straight from memory; repeated uploads are served from the encoder's cache
+            image_b64 = self.vision_assistant.process_image(image)
+            if image_b64 is None:
+                raise ValueError("Failed to process image.")
+            return self.vision_assistant, f"{user_input}|{image_b64}", 'VisionAssistant'
+
+        with metrics.span("classify", "AssistantRouter"):
+            decision = self.classify(user_input)
+        logging.debug(f"AssistantRouter routed to {decision.route} "
+                      f"(confidence {decision.confidence:.2f}, stage {decision.stage})")
+        if decision.route == CODE_ROUTE:
+            return self.code_assistant, user_input, 'CodeAssistant'
+        return self.language_assistant, user_input, 'LanguageAssistant'
+
+    def retrieve_context(self, assistant, text):
+        """
+        Retrieve documents for a text assistant, packed into its model's context budget.
+
+        :param assistant: The assistant that will answer.
+        :param text: str, The input text from the user.
+        :return: str, The context, or '' if there is no vector store or retrieval failed.
+        """
+        try:
+            with metrics.span("retrieve", "ContextRetriever"):
+                return self.retriever.build_context(text, getattr(assistant.model, 'model', None))
+        except Exception as e:
+            # Answering without documents beats failing the request
+            logging.error(f"Error in AssistantRouter.retrieve_context: {e}")
+            return ''
+
+    def _cache_key(self, assistant, session_id):
+        """
+        Return the model name and what else a cached answer depends on: the history fingerprint
+        and the vector store version, which together with the prompt determine the retrieved context.
+        """
+        context = assistant.memory.fingerprint(session_id)
+        store_version = self.retriever.version
+        if store_version is not None:
+            context = f"{context}|store:{store_version}"
+        return getattr(assistant.model, 'model', type(assistant).__name__), context
+
+    @staticmethod
+    def _flight_key(assistant, model, context, payload):
+        """
+        Requests with the same key get the same answer: same assistant and model, same history
+        fingerprint and store version (`context`), and the same prompt up to case and whitespace.
+        Sessions only share a generation when their histories match, e.g. new sessions.
+        """
+        return type(assistant).__name__, model, context, normalize_prompt(payload)
+
+    def _cached_stream(self, assistant, payload, session_id):
+        """Serve the answer from the response cache, or stream it from the assistant and cache it once complete."""
+        model, context = self._cache_key(assistant, session_id)
+        response = self.response_cache.get(model, payload, context)
+        if response is not None:
+            assistant.add_to_memory(payload, response, session_id)
+            yield response
+            return
+
+        def generate():
+            chunks = []
+            for chunk in assistant.stream(payload, session_id, self.retrieve_context(assistant, payload)):
+                chunks.append(chunk)
+                yield chunk
+            self.response_cache.put(model, payload, ''.join(chunks), context)
+
+        tokens, leader = self.single_flight.stream(self._flight_key(assistant, model, context, payload), generate)
+        chunks = []
+        for chunk in tokens:
+            chunks.append(chunk)
+            yield chunk
+        if not leader:
+            # The generation saved the exchange to the first session's memory only
+            assistant.add_to_memory(payload, ''.join(chunks), session_id)
+
+    async def _acached_stream(self, assistant, payload, session_id):
+        """Async counterpart of `_cached_stream`."""
+        model, context = self._cache_key(assistant, session_id)
+        response = await asyncio.to_thread(self.response_cache.get, model, payload, context)
+        if response is not None:
+            assistant.add_to_memory(payload, response, session_id)
+            yield response
+            return
+
+        async def generate():
+            retrieved = await asyncio.to_thread(self.retrieve_context, assistant, payload)
+            chunks = []
+            async for chunk in assistant.astream(payload, session_id, retrieved):
+                chunks.append(chunk)
+                yield chunk
+            self.response_cache.put(model, payload, ''.join(chunks), context)
+
+        tokens, leader = self.single_flight.astream(self._flight_key(assistant, model, context, payload), generate)
+        chunks = []
+        async for chunk in tokens:
+            chunks.append(chunk)
+            yield chunk
+        if not leader:
+            assistant.add_to_memory(payload, ''.join(chunks), session_id)
+
+    def _guard_stream(self, tokens):
+        """Pass tokens through, turning a mid-stream failure into a trailing error message."""
+        try:
+            yield from tokens
+        except Exception as e:
+            logging.error(f"Error in AssistantRouter.route_stream: {e}")
+            yield f"\n\nError: {str(e)}"
+
+    async def _aguard_stream(self, tokens, error=None):
+        """Async counterpart of `_guard_stream`; yields only `error` when there is no token stream."""
+        if tokens is None:
+            yield error
+            return
+        try:
+            async for token in tokens:
+                yield token
+        except Exception as e:
+            logging.error(f"Error in AssistantRouter.aroute_stream: {e}")
+            yield f"\n\nError: {str(e)}"
+
+    def classify(self, text):
+        """
+        Decide which text assistant should handle the input.
+
+        :param text: str, The input text.
+        :return: RouteDecision, The route ('code' or 'language'), its confidence and the deciding stage.
+        """
+        return self.query_router.classify(text)
+
     def is_code_related(self, text):
         """
         Determine if the text input is related to coding.
@@ -110,18 +350,4 @@ class AssistantRouter:
         :param text: str, The input text.
         :return: bool, True if the text is code related, False otherwise.
         """
-        # Basic keyword-based detection
-        code_keywords = [
-            'function', 'class', 'def', 'import', 'print', 'variable',
-            'loop', 'array', 'list', 'dictionary', 'exception', 'error', 'bug',
-            'code', 'compile', 'execute', 'algorithm', 'data structure', 'java', 'python', 'javascript', 'c++',
-            'c#', 'ruby', 'php', 'html', 'css', 'sql', 'swift', 'kotlin', 'go', 'rust', 'typescript', 'r', 'perl',
-            'scala', 'shell', 'bash', 'powershell', 'objective-c', 'matlab', 'groovy', 'lua', 'dart', 'cobol',
-            'fortran', 'haskell', 'lisp', 'pascal', 'prolog', 'scheme', 'smalltalk', 'verilog', 'vhdl',
-            'assembly', 'coffeescript', 'f#', 'julia', 'racket', 'scratch', 'solidity', 'vba', 'abap', 'apex',
-            'awk', 'clojure', 'd', 'elixir', 'erlang', 'forth', 'hack', 'idris', 'j', 'julia', 'kdb+', 'labview',
-            'logtalk', 'lolcode', 'mumps', 'nim', 'ocaml', 'pl/i', 'postscript', 'powershell', 'rpg', 'sas', 'sml',
-            'tcl', 'turing', 'unicon', 'x10', 'xquery', 'zsh'
-        ]
-        pattern = re.compile(r'\b(?:' + '|'.join(re.escape(word) for word in code_keywords) + r')\b', re.IGNORECASE)
-        return bool(pattern.search(text))
+        return self.classify(text).route == CODE_ROUTE
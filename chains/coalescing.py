@@ -0,0 +1,156 @@
+import asyncio
+import threading
+from utils import metrics
+
+COALESCED_REQUESTS = metrics.metrics.counter("agent_nesh_coalesced_requests_total",
+                                             "Requests served by attaching to an identical in-flight generation.",
+                                             label_names=("component",))
+
+
+class _Flight:
+    """The chunks of one generation so far, shared by every request attached to it."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+        self.changed = None  # asyncio.Event, for flights produced on an event loop
+        self.task = None
+
+
+class SingleFlight:
+    """
+    Single-flight coalescing of identical streamed generations.
+
+    The first request for a key starts the generation; requests for the same key that arrive
+    while it is running attach to it and receive the same token stream, from the first token on,
+    instead of starting a generation of their own. The generation runs on a background thread
+    (or task, for `astream`) and always completes, so a client that disconnects early does not
+    cut the stream short for the others.
+    """
+
+    def __init__(self, component=""):
+        """
+        :param component: str, Label of the coalesced request counter.
+        """
+        self.component = component
+        self.coalesced = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def stream(self, key, generate):
+        """
+        Stream the generation for `key`, starting it with `generate` unless one is already running.
+
+        :param key: hashable, Identifies requests that would produce the same answer.
+        :param generate: callable, Returns the token iterator; only called for the first request.
+        :return: tuple, A generator of tokens and True if this request started the generation.
+        """
+        flight, leader = self._join(key)
+        if leader:
+            threading.Thread(target=self._produce, args=(key, flight, generate), name="single-flight",
+                             daemon=True).start()
+        return self._replay(flight), leader
+
+    def astream(self, key, generate):
+        """
+        Async counterpart of `stream`; `generate` returns an async iterator.
+
+        Only requests on the same event loop are coalesced.
+
+        :return: tuple, An async generator of tokens and True if this request started the generation.
+        """
+        key = (asyncio.get_running_loop(), key)
+        flight, leader = self._join(key)
+        if leader:
+            flight.changed = asyncio.Event()
+            # Held by the flight, since the loop only keeps weak references to tasks
+            flight.task = asyncio.ensure_future(self._aproduce(key, flight, generate))
+        return self._areplay(flight), leader
+
+    def in_flight(self):
+        """Number of generations currently running."""
+        with self._lock:
+            return len(self._flights)
+
+    def _join(self, key):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                COALESCED_REQUESTS.inc(self.component)
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+
+    def _finish(self, key, flight, error=None):
+        # Later requests start a new generation, which may see updated memory or a newer store
+        with self._lock:
+            self._flights.pop(key, None)
+        with flight.condition:
+            flight.error = error
+            flight.done = True
+            flight.condition.notify_all()
+
+    def _produce(self, key, flight, generate):
+        error = None
+        try:
+            for chunk in generate():
+                with flight.condition:
+                    flight.chunks.append(chunk)
+                    flight.condition.notify_all()
+        except Exception as e:
+            error = e
+        finally:
+            self._finish(key, flight, error)
+
+    @staticmethod
+    def _replay(flight):
+        position = 0
+        while True:
+            with flight.condition:
+                while position == len(flight.chunks) and not flight.done:
+                    flight.condition.wait()
+                chunks = flight.chunks[position:]
+                done, error = flight.done, flight.error
+            position += len(chunks)
+            yield from chunks
+            if done and position == len(flight.chunks):
+                if error is not None:
+                    raise error
+                return
+
+    async def _aproduce(self, key, flight, generate):
+        error = None
+        try:
+            async for chunk in generate():
+                flight.chunks.append(chunk)
+                self._notify(flight)
+        except asyncio.CancelledError:
+            error = RuntimeError("The generation was cancelled.")
+            raise
+        except Exception as e:
+            error = e
+        finally:
+            self._finish(key, flight, error)
+            self._notify(flight)
+
+    @staticmethod
+    def _notify(flight):
+        # Wake the waiting requests and give later waits a fresh event
+        changed, flight.changed = flight.changed, asyncio.Event()
+        changed.set()
+
+    @staticmethod
+    async def _areplay(flight):
+        position = 0
+        while True:
+            while position < len(flight.chunks):
+                yield flight.chunks[position]
+                position += 1
+            if flight.done:
+                if flight.error is not None:
+                    raise flight.error
+                return
+            await flight.changed.wait()
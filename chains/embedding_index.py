@@ -0,0 +1,203 @@
+import json
+import os
+import threading
+import numpy as np
+
+
+class EmbeddingIndex:
+    """
+    Append-only embedding store: one contiguous float32 matrix on disk plus a JSONL sidecar.
+
+    Row i of `vectors.f32` belongs to line i of `ids.jsonl`, which holds the row's id and
+    metadata. Appends write to the end of both files in place, and searches read the matrix
+    through a memory map. Writing an id again supersedes its earlier rows, which are then
+    skipped by searches. Removing an id appends a tombstone row, so the files stay append-only.
+    """
+
+    # Rows scored per step, so a search never materializes more than BLOCK_ROWS x queries scores
+    BLOCK_ROWS = 65536
+
+    def __init__(self, directory, dim=None):
+        """
+        :param directory: str, Directory holding the index files; created if missing.
+        :param dim: int, Embedding dimension; taken from the first append if not given.
+        """
+        self.directory = directory
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.ids_path = os.path.join(directory, "ids.jsonl")
+        self.info_path = os.path.join(directory, "index.json")
+        os.makedirs(directory, exist_ok=True)
+        self.dim = dim
+        self.ids = []
+        self.metadata = []
+        self._rows = {}
+        self._live = np.zeros(0, dtype=bool)
+        self._matrix = None
+        self._lock = threading.Lock()
+        if dim is not None and not os.path.exists(self.info_path):
+            self._write_info()
+        self.reload()
+
+    def __len__(self):
+        """Number of live (not superseded or removed) entries."""
+        return len(self._rows)
+
+    def keys(self):
+        """Ids of the live entries."""
+        return list(self._rows)
+
+    def reload(self):
+        """Re-read the sidecar files, e.g. after another process appended to the index."""
+        with self._lock:
+            if os.path.exists(self.info_path):
+                with open(self.info_path) as f:
+                    self.dim = json.load(f)["dim"]
+            elif os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path):
+                # Without the dimension the row count is unknown, and truncating the ids would lose them all
+                raise ValueError(f"{self.vectors_path} has vectors but {self.info_path} is missing; "
+                                 f"open the index with its dimension, EmbeddingIndex(directory, dim=...).")
+            ids, metadata, removed = [], [], []
+            if os.path.exists(self.ids_path):
+                with open(self.ids_path) as f:
+                    for line in f:
+                        if line.strip():
+                            record = json.loads(line)
+                            ids.append(record["id"])
+                            metadata.append(record.get("metadata"))
+                            removed.append(record.get("removed", False))
+            rows = self._stored_rows()
+            # A crash between the two appends can leave one file longer than the other
+            del ids[rows:], metadata[rows:], removed[rows:]
+            self.ids, self.metadata = ids, metadata
+            self._rows = {}
+            for row, (entry_id, is_removed) in enumerate(zip(ids, removed)):
+                if is_removed:
+                    self._rows.pop(entry_id, None)
+                else:
+                    self._rows[entry_id] = row
+            self._live = np.zeros(len(ids), dtype=bool)
+            self._live[list(self._rows.values())] = True
+            self._matrix = None
+
+    def append(self, ids, vectors, metadata=None):
+        """
+        Append embeddings to the end of the index.
+
+        :param ids: list, One id per vector.
+        :param vectors: array-like, Shape (n, dim) or (dim,) for a single vector.
+        :param metadata: list, Optional JSON-serializable metadata per vector.
+        """
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if len(ids) != len(vectors):
+            raise ValueError("Expected one id per vector.")
+        metadata = metadata or [None] * len(ids)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            if not os.path.exists(self.info_path):
+                self._write_info()
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected embeddings of dimension {self.dim}, got {vectors.shape[1]}.")
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(vectors).tobytes())
+            with open(self.ids_path, "a") as f:
+                for entry_id, entry_metadata in zip(ids, metadata):
+                    f.write(json.dumps({"id": entry_id, "metadata": entry_metadata}) + "\n")
+            start = len(self.ids)
+            live = np.concatenate([self._live, np.ones(len(ids), dtype=bool)])
+            for offset, entry_id in enumerate(ids):
+                previous = self._rows.get(entry_id)
+                if previous is not None:
+                    live[previous] = False
+                self._rows[entry_id] = start + offset
+            self.ids.extend(ids)
+            self.metadata.extend(metadata)
+            self._live = live
+            self._matrix = None
+
+    def remove(self, ids):
+        """
+        Remove entries, so searches no longer return them; ids that are not stored are ignored.
+
+        :param ids: list, The ids to remove.
+        """
+        with self._lock:
+            ids = [entry_id for entry_id in dict.fromkeys(ids) if entry_id in self._rows]
+            if not ids:
+                return
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.zeros((len(ids), self.dim), dtype=np.float32).tobytes())
+            with open(self.ids_path, "a") as f:
+                for entry_id in ids:
+                    f.write(json.dumps({"id": entry_id, "metadata": None, "removed": True}) + "\n")
+            live = np.concatenate([self._live, np.zeros(len(ids), dtype=bool)])
+            for entry_id in ids:
+                live[self._rows.pop(entry_id)] = False
+            self.ids.extend(ids)
+            self.metadata.extend([None] * len(ids))
+            self._live = live
+            self._matrix = None
+
+    @property
+    def matrix(self):
+        """All stored rows, superseded ones included, as a read-only memory map."""
+        if self._matrix is None:
+            rows = len(self.ids)
+            if rows == 0:
+                self._matrix = np.zeros((0, self.dim or 0), dtype=np.float32)
+            else:
+                self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._matrix
+
+    def get(self, entry_id):
+        """Return the latest vector stored under `entry_id`."""
+        return np.asarray(self.matrix[self._rows[entry_id]])
+
+    def search(self, queries, k=10):
+        """
+        Find the entries with the highest dot product with each query.
+
+        :param queries: array-like, One query of shape (dim,) or a batch of shape (q, dim).
+        :param k: int, Number of results per query; None returns every entry.
+        :return: list, (id, score) pairs sorted by score, or one such list per query for a batch.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        single = queries.ndim == 1
+        queries = np.atleast_2d(queries)
+        with self._lock:
+            matrix, live, live_count = self.matrix, self._live, len(self._rows)
+        k = live_count if k is None else min(k, live_count)
+        if k == 0:
+            return [] if single else [[] for _ in queries]
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(matrix), self.BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + self.BLOCK_ROWS])
+            scores = queries @ block.T
+            scores[:, ~live[start:start + len(block)]] = -np.inf
+            block_rows = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, block_rows], axis=1)
+            if scores.shape[1] > k:
+                # Partial selection: only the k best of this block and the previous best survive
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores, best_rows = scores, rows
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        results = [[(self.ids[row], float(score)) for row, score in zip(rows, scores)]
+                   for rows, scores in zip(best_rows, best_scores)]
+        return results[0] if single else results
+
+    def _write_info(self):
+        with open(self.info_path, "w") as f:
+            json.dump({"dim": self.dim, "dtype": "float32"}, f)
+
+    def _stored_rows(self):
+        if self.dim is None or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (4 * self.dim)
@@ -1,12 +1,20 @@
 import numpy as np
 from langchain_nvidia_ai_endpoints import NVIDIAEmbeddings
+from chains import http_pool
+from chains.embedding_index import EmbeddingIndex
+from chains.embedding_service import EmbeddingCache, EmbeddingService
+from utils import metrics
+import logging
 import os
+import re
 
 class EmbeddingModels:
     def __init__(self):
         # Initialize Embedding Models
-        self.document_embedder = NVIDIAEmbeddings(model="ai-embed-qa-4", model_type="passage")
-        self.query_embedder = NVIDIAEmbeddings(model="ai-embed-qa-4", model_type="query")
+        self.document_embedder = NVIDIAEmbeddings(model="ai-embed-qa-4", model_type="passage",
+                                                  **http_pool.client_options())
+        self.query_embedder = NVIDIAEmbeddings(model="ai-embed-qa-4", model_type="query",
+                                               **http_pool.client_options())
 
         # Ensure directories exist
         self.DOCS_DIR = os.path.abspath("./uploaded_docs")
@@ -15,28 +23,86 @@ class EmbeddingModels:
             os.makedirs(self.DOCS_DIR)
         if not os.path.exists(self.EMBEDDINGS_DIR):
             os.makedirs(self.EMBEDDINGS_DIR)
+        self.index = EmbeddingIndex(self.EMBEDDINGS_DIR)
+        self.document_service = EmbeddingService(self.document_embedder,
+                                                 cache=EmbeddingCache(os.path.join(self.EMBEDDINGS_DIR, "cache.sqlite")))
+        self._import_npy_files()
 
     def embed_documents(self, documents):
-        """Generates embeddings for a list of documents."""
-        return self.document_embedder.embed_documents(documents)
+        """Generates embeddings for a list of documents, in concurrent batches and through the cache."""
+        return self.document_service.embed_documents(documents)
 
     def embed_query(self, query):
         """Generates an embedding for a single query."""
-        return self.query_embedder.embed_query(query)
+        with metrics.span("embed", "query"):
+            return self.query_embedder.embed_query(query)
 
     def save_embedding(self, file_name, embedding):
-        """Saves an embedding to a file."""
-        embedding_path = os.path.join(self.EMBEDDINGS_DIR, f"{file_name}.npy")
-        np.save(embedding_path, embedding)
+        """
+        Appends an embedding to the index, replacing any earlier embedding saved under the same name.
+        A 2-D embedding is stored as one row per chunk, named 'file_name#i'.
+        """
+        embedding = np.asarray(embedding, dtype=np.float32)
+        if embedding.ndim == 1:
+            ids = [file_name]
+        else:
+            ids = [f"{file_name}#{i}" for i in range(len(embedding))]
+        # Rows of an earlier save that the new ids do not overwrite, e.g. chunks beyond the new count
+        chunk_id = re.compile(re.escape(file_name) + r"#\d+")
+        stale = set(entry_id for entry_id in self.index.keys()
+                    if entry_id == file_name or chunk_id.fullmatch(entry_id)) - set(ids)
+        self.index.remove(sorted(stale))
+        self.index.append(ids, embedding)
 
     def load_embeddings(self):
-        """Loads all stored document embeddings."""
-        embeddings_files = [os.path.join(self.EMBEDDINGS_DIR, f) for f in os.listdir(self.EMBEDDINGS_DIR)]
-        document_embeddings = [(file, np.load(file)) for file in embeddings_files]
-        return document_embeddings
-
-    def compare_embeddings(self, query_embedding, document_embeddings):
-        """Compares a query embedding with stored document embeddings."""
-        similarities = [(file, np.dot(query_embedding, doc_emb.T)) for file, doc_emb in document_embeddings]
-        similarities = sorted(similarities, key=lambda x: x[1], reverse=True)
-        return similarities
+        """Returns the stored document embeddings, picking up rows appended by other processes."""
+        self.index.reload()
+        return self.index
+
+    def compare_embeddings(self, query_embedding, document_embeddings=None, top_k=None):
+        """
+        Compares query embeddings with stored document embeddings.
+
+        :param query_embedding: A single query embedding, or a batch of shape (queries, dim).
+        :param document_embeddings: The index to search (defaults to the stored embeddings), or a
+                                    list of (name, embedding) pairs. As in `save_embedding`, a 2-D
+                                    embedding counts as one row per chunk, named 'name#i'.
+        :param top_k: int, Number of matches to return per query; None returns all of them.
+        :return: list, (name, similarity) pairs sorted by similarity, or one list per query for a batch.
+        """
+        if document_embeddings is None:
+            document_embeddings = self.index
+        if isinstance(document_embeddings, EmbeddingIndex):
+            return document_embeddings.search(query_embedding, k=top_k)
+
+        names, rows = [], []
+        for name, embedding in document_embeddings:
+            embedding = np.asarray(embedding, dtype=np.float32)
+            if embedding.ndim == 1:
+                names.append(name)
+                rows.append(embedding)
+            elif embedding.ndim == 2:
+                names.extend(f"{name}#{i}" for i in range(len(embedding)))
+                rows.extend(embedding)
+            else:
+                raise ValueError(f"Embedding '{name}' must be 1-D or 2-D, got shape {embedding.shape}.")
+        if not names:
+            return []
+        queries = np.asarray(query_embedding, dtype=np.float32)
+        scores = np.atleast_2d(queries) @ np.stack(rows).T
+        k = len(names) if top_k is None else min(top_k, len(names))
+        results = []
+        for row in scores:
+            best = np.argpartition(-row, k - 1)[:k]
+            best = best[np.argsort(-row[best])]
+            results.append([(names[i], float(row[i])) for i in best])
+        return results[0] if queries.ndim == 1 else results
+
+    def _import_npy_files(self):
+        """One-time migration of embeddings saved as individual .npy files by earlier versions."""
+        npy_files = sorted(f for f in os.listdir(self.EMBEDDINGS_DIR) if f.endswith(".npy"))
+        if not npy_files or len(self.index):
+            return
+        for file in npy_files:
+            self.save_embedding(file[:-len(".npy")], np.load(os.path.join(self.EMBEDDINGS_DIR, file)))
+        logging.info(f"Imported {len(npy_files)} .npy embeddings into {self.index.vectors_path}")
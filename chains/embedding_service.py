@@ -0,0 +1,206 @@
+import argparse
+import collections
+import hashlib
+import logging
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from chains import http_pool
+from utils import metrics
+
+
+def content_hash(text):
+    """Hash a chunk's text for use as a cache key."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent embedding cache in SQLite, keyed by (model, model_type, content hash)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS embeddings (model TEXT NOT NULL, "
+                                     "model_type TEXT NOT NULL, sha256 TEXT NOT NULL, vector BLOB NOT NULL, "
+                                     "PRIMARY KEY (model, model_type, sha256))")
+
+    def get_many(self, model, model_type, hashes):
+        """
+        :return: dict, Content hash -> embedding for the hashes that are cached.
+        """
+        found = {}
+        hashes = list(hashes)
+        # Stay below SQLite's limit on bound parameters
+        for start in range(0, len(hashes), 500):
+            part = hashes[start:start + 500]
+            rows = self._connection.execute(
+                f"SELECT sha256, vector FROM embeddings WHERE model = ? AND model_type = ? "
+                f"AND sha256 IN ({','.join('?' * len(part))})", [model, model_type, *part]).fetchall()
+            for sha256, vector in rows:
+                found[sha256] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, model, model_type, items):
+        """
+        :param items: iterable, (content hash, embedding) pairs.
+        """
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)",
+                [(model, model_type, sha256, np.asarray(vector, dtype=np.float32).tobytes()) for sha256, vector in items])
+
+
+class EmbeddingService(Embeddings):
+    """
+    Embeddings wrapper that batches documents, embeds batches concurrently and caches results.
+
+    Identical chunks are embedded once per call, cached chunks are not sent upstream at all,
+    and failed batches are retried with exponential backoff. It implements the LangChain
+    Embeddings interface, so it can be passed anywhere the wrapped embedder was used.
+    """
+
+    def __init__(self, embedder, batch_size=32, max_in_flight=4, max_retries=4, backoff=0.5, cache=None):
+        """
+        :param embedder: Embeddings, The upstream embedder, e.g. NVIDIAEmbeddings.
+        :param batch_size: int, Chunks per upstream request.
+        :param max_in_flight: int, Upper bound on concurrent upstream requests.
+        :param max_retries: int, Retries per batch before giving up.
+        :param backoff: float, Initial retry delay in seconds; doubles on each retry.
+        :param cache: EmbeddingCache, Optional persistent cache.
+        """
+        self.embedder = http_pool.attach(embedder)
+        self.model = getattr(embedder, "model", None) or type(embedder).__name__
+        self.model_type = getattr(embedder, "model_type", None) or ""
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.cache = cache
+        self.last_stats = {}
+
+    @metrics.timed("embed", "documents")
+    def embed_documents(self, texts):
+        """Embeds a list of documents, using the cache and concurrent batches."""
+        start = time.perf_counter()
+        hashes = [content_hash(text) for text in texts]
+        vectors = self.cache.get_many(self.model, self.model_type, set(hashes)) if self.cache else {}
+        cached = sum(1 for sha256 in hashes if sha256 in vectors)
+
+        # Each distinct uncached text is sent once, however often it occurs
+        missing = {}
+        for sha256, text in zip(hashes, texts):
+            if sha256 not in vectors:
+                missing.setdefault(sha256, text)
+        missing = list(missing.items())
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        retries = 0
+        if batches:
+            with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embed") as executor:
+                futures = {executor.submit(self._embed_batch, [text for _, text in batch]): batch for batch in batches}
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    embeddings, batch_retries = future.result()
+                    retries += batch_retries
+                    items = [(sha256, vector) for (sha256, _), vector in zip(batch, embeddings)]
+                    vectors.update(items)
+                    if self.cache:
+                        self.cache.put_many(self.model, self.model_type, items)
+
+        seconds = time.perf_counter() - start
+        self.last_stats = {
+            "chunks": len(texts),
+            "cached": cached,
+            "embedded": len(missing),
+            "batches": len(batches),
+            "retries": retries,
+            "seconds": seconds,
+            "chunks_per_second": len(texts) / seconds if seconds > 0 else float("inf"),
+        }
+        logging.info(f"EmbeddingService embedded {len(texts)} chunks in {seconds:.2f}s "
+                     f"({self.last_stats['chunks_per_second']:.1f} chunks/s, {cached} cached, "
+                     f"{len(missing)} sent in {len(batches)} batches, {retries} retries)")
+        return [vectors[sha256] for sha256 in hashes]
+
+    def embed_query(self, text):
+        """Embeds a single query."""
+        return self.embedder.embed_query(text)
+
+    def _embed_batch(self, texts):
+        """Embed one batch, retrying with exponential backoff and jitter. Returns (embeddings, retries)."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embedder.embed_documents(texts), attempt
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+                logging.warning(f"Embedding batch of {len(texts)} failed ({e}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+
+class CachedQueryEmbedder(Embeddings):
+    """
+    LRU cache in front of a query embedder, so repeated questions skip the embedding round trip.
+
+    Keys are the query text with whitespace collapsed; documents are passed through uncached.
+    """
+
+    def __init__(self, embedder, max_entries=1024):
+        """
+        :param embedder: Embeddings, The upstream embedder with model_type "query".
+        :param max_entries: int, Queries kept in the cache.
+        """
+        self.embedder = embedder
+        self.max_entries = max_entries
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_query(self, text):
+        """Embeds a query, from the cache when it has been seen recently."""
+        key = " ".join(text.split())
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return vector
+            self.misses += 1
+        with metrics.span("embed", "query"):
+            vector = self.embedder.embed_query(text)
+        with self._lock:
+            self._cache[key] = vector
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return vector
+
+    def embed_documents(self, texts):
+        return self.embedder.embed_documents(texts)
+
+
+if __name__ == '__main__':
+    from langchain_nvidia_ai_endpoints import NVIDIAEmbeddings
+
+    parser = argparse.ArgumentParser(description="Measure embedding throughput for a set of text files.")
+    parser.add_argument("files", nargs="+", help="Text files; every paragraph is embedded as one chunk.")
+    parser.add_argument("--model", default="NV-Embed-QA")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--cache", help="Path of an embedding cache to use, e.g. to measure a warm re-run.")
+    args = parser.parse_args()
+
+    chunks = []
+    for path in args.files:
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            chunks.extend(p.strip() for p in f.read().split("\n\n") if p.strip())
+    service = EmbeddingService(NVIDIAEmbeddings(model=args.model, model_type="passage"), batch_size=args.batch_size,
+                               max_in_flight=args.max_in_flight, cache=EmbeddingCache(args.cache) if args.cache else None)
+    service.embed_documents(chunks)
+    for key, value in service.last_stats.items():
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import threading
+import weakref
+import requests
+from requests.adapters import HTTPAdapter
+
+# Upper bound on concurrent upstream connections, shared by every model client in the process
+MAX_CONNECTIONS = int(os.getenv("NVIDIA_MAX_CONNECTIONS", "100"))
+REQUEST_TIMEOUT = float(os.getenv("NVIDIA_REQUEST_TIMEOUT", "60"))
+
+_session = None
+_session_lock = threading.Lock()
+# aiohttp connectors are bound to the event loop that created them, so keep one per loop
+_connectors = weakref.WeakKeyDictionary()
+
+
+def get_session():
+    """
+    Return the process-wide requests session used for synchronous calls.
+
+    The adapter blocks when all pooled connections are busy instead of opening extra ones,
+    so the number of sockets to the endpoint never exceeds MAX_CONNECTIONS.
+
+    :return: requests.Session, The shared session.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_CONNECTIONS, pool_block=True)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+
+def get_async_session():
+    """
+    Return an aiohttp session backed by the shared connector of the running event loop.
+
+    The session does not own the connector, so clients may close it after each request
+    while the pooled keep-alive connections stay open for the next one.
+
+    :return: aiohttp.ClientSession, A session bound to the shared connector.
+    """
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    connector = _connectors.get(loop)
+    if connector is None or connector.closed:
+        connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, limit_per_host=MAX_CONNECTIONS)
+        _connectors[loop] = connector
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=REQUEST_TIMEOUT, sock_read=REQUEST_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, connector_owner=False, timeout=timeout)
+
+
+def client_options():
+    """
+    Keyword arguments for ChatNVIDIA and NVIDIAEmbeddings.
+
+    NVIDIA_BASE_URL points every model client at another OpenAI-compatible endpoint instead of
+    the NVIDIA API catalog, e.g. a self-hosted NIM or the load-test stand-in in benchmarks/fake_nim.py.
+
+    :return: dict, `base_url` if NVIDIA_BASE_URL is set, otherwise empty.
+    """
+    base_url = os.getenv("NVIDIA_BASE_URL")
+    return {"base_url": base_url} if base_url else {}
+
+
+def attach(client):
+    """
+    Route a ChatNVIDIA or NVIDIAEmbeddings instance through the shared connection pool.
+
+    :param client: The LangChain NVIDIA model whose HTTP sessions should be pooled.
+    :return: The same model, for chaining.
+    """
+    sync_client = getattr(client, "_client", None)
+    if sync_client is not None and hasattr(sync_client, "get_session_fn"):
+        sync_client.get_session_fn = get_session
+    async_client = getattr(client, "_async_client", None)
+    if async_client is not None and hasattr(async_client, "get_async_session_fn"):
+        async_client.get_async_session_fn = get_async_session
+    return client
+
+
+async def close():
+    """Close the shared connector of the running event loop, e.g. on server shutdown."""
+    connector = _connectors.pop(asyncio.get_running_loop(), None)
+    if connector is not None:
+        await connector.close()
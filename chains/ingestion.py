@@ -0,0 +1,134 @@
+import hashlib
+import json
+import logging
+import os
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Hash a file's contents without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DocumentIngestor:
+    """
+    Keep a FAISS vector store in sync with a directory of documents.
+
+    A manifest records the content hash of every ingested file and the ids of its chunks.
+    On each sync only new or changed files are parsed and split. Chunks whose text did not
+    change keep their ids and vectors, so only new chunks are embedded, and the chunks of
+    deleted files are removed from the index.
+    """
+
+    def __init__(self, docs_dir, manifest_path, embedder, text_splitter=None):
+        """
+        :param docs_dir: str, Directory with the source documents.
+        :param manifest_path: str, Where the ingestion manifest is stored, next to the vector store.
+        :param embedder: Embeddings, Used to embed new chunks.
+        :param text_splitter: TextSplitter, Splits documents into chunks.
+        """
+        from langchain_text_splitters import CharacterTextSplitter
+
+        self.docs_dir = docs_dir
+        self.manifest_path = manifest_path
+        self.embedder = embedder
+        self.text_splitter = text_splitter or CharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
+
+    def sync(self, vectorstore=None):
+        """
+        Bring the vector store up to date with the documents directory.
+
+        :param vectorstore: FAISS, The store built by earlier syncs, or None to build from scratch.
+        :return: tuple, The updated store (None if there are no documents) and a dict with the
+                 number of added, changed, removed and unchanged files.
+        """
+        manifest = self._load_manifest()
+        if vectorstore is None or not manifest["files"]:
+            # Without both the store and its manifest nothing can be reused safely
+            manifest = {"version": MANIFEST_VERSION, "files": {}}
+            vectorstore = None
+
+        on_disk = {}
+        for root, dirs, files in os.walk(self.docs_dir):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for name in files:
+                if not name.startswith("."):
+                    path = os.path.join(root, name)
+                    on_disk[os.path.relpath(path, self.docs_dir)] = path
+
+        report = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+        to_delete, to_add = [], []
+        for rel_path in sorted(set(manifest["files"]) - set(on_disk)):
+            to_delete.extend(manifest["files"].pop(rel_path)["chunk_ids"])
+            report["removed"] += 1
+
+        for rel_path, path in sorted(on_disk.items()):
+            sha256 = file_sha256(path)
+            entry = manifest["files"].get(rel_path)
+            if entry is not None and entry["sha256"] == sha256:
+                report["unchanged"] += 1
+                continue
+            try:
+                chunks = self._split(rel_path, path)
+            except Exception as e:
+                logging.error(f"Error in DocumentIngestor.sync while loading {rel_path}: {e}")
+                continue
+            old_ids = set(entry["chunk_ids"]) if entry else set()
+            new_ids = [chunk_id for chunk_id, _ in chunks]
+            to_delete.extend(old_ids - set(new_ids))
+            to_add.extend((chunk_id, doc) for chunk_id, doc in chunks if chunk_id not in old_ids)
+            manifest["files"][rel_path] = {"sha256": sha256, "chunk_ids": new_ids}
+            report["changed" if entry else "added"] += 1
+
+        if to_delete and vectorstore is not None:
+            stored = set(vectorstore.index_to_docstore_id.values())
+            stale = [chunk_id for chunk_id in to_delete if chunk_id in stored]
+            if stale:
+                vectorstore.delete(stale)
+        if to_add:
+            ids = [chunk_id for chunk_id, _ in to_add]
+            docs = [doc for _, doc in to_add]
+            if vectorstore is None:
+                from langchain_community.vectorstores import FAISS
+
+                vectorstore = FAISS.from_documents(docs, self.embedder, ids=ids)
+            else:
+                vectorstore.add_documents(docs, ids=ids)
+
+        self._save_manifest(manifest)
+        logging.info(f"DocumentIngestor.sync: {report}, {len(to_add)} chunks embedded, {len(to_delete)} removed")
+        return vectorstore, report
+
+    def _split(self, rel_path, path):
+        """Load and split one file, giving every chunk an id derived from the file and the chunk text."""
+        from langchain_community.document_loaders import UnstructuredFileLoader
+
+        documents = UnstructuredFileLoader(path).load()
+        chunks = []
+        seen = {}
+        for doc in self.text_splitter.split_documents(documents):
+            digest = hashlib.sha256(f"{rel_path}\0{doc.page_content}".encode("utf-8")).hexdigest()
+            # Identical chunks within one file still need distinct ids
+            seen[digest] = seen.get(digest, -1) + 1
+            chunks.append((f"{digest[:32]}-{seen[digest]}", doc))
+        return chunks
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {"version": MANIFEST_VERSION, "files": {}}
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            return {"version": MANIFEST_VERSION, "files": {}}
+        return manifest
+
+    def _save_manifest(self, manifest):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
@@ -1,6 +1,9 @@
-from langchain.chains import ConversationChain
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_nvidia_ai_endpoints import ChatNVIDIA
-from chains.memory import central_memory
+from chains.memory import central_memory, count_tokens
+from chains import http_pool
+from utils import metrics
 from dotenv import load_dotenv
 import logging
 
@@ -8,19 +11,114 @@ load_dotenv()
 
 class LanguageAssistant:
     def __init__(self, model_name="meta/llama3-70b-instruct"):
-        self.model = ChatNVIDIA(model_name=model_name, stream=True)
+        self.model = http_pool.attach(ChatNVIDIA(model=model_name, stream=True, **http_pool.client_options()))
         self.memory = central_memory
-        self.chain = ConversationChain(
-            llm=self.model,
-            memory=self.memory,
-            verbose=True
-        )
+        self.system_prompt = """The following is a friendly conversation between a human and an AI.
+                                The AI is talkative and provides lots of specific details from its context.
+                                If the AI does not know the answer to a question, it truthfully says it does not know."""
+        self.prompt = ChatPromptTemplate.from_messages([
+            ("system", self.system_prompt),
+            MessagesPlaceholder("history", optional=True),
+            ("user", "{input}")
+        ])
+        self.chain = self.prompt | self.model | StrOutputParser()
 
-    def invoke(self, text_input):
+    def invoke(self, text_input, session_id=None, context=None):
         try:
-            if not isinstance(text_input, str) or not text_input.strip():
-                raise ValueError("Input must be a non-empty string.")
-            return self.chain.predict(input=text_input)
+            inputs = self.build_inputs(text_input, session_id, context)
+            with metrics.span("llm", "LanguageAssistant") as span:
+                span.sizes(prompt_tokens=self.prompt_tokens(inputs))
+                response = self.chain.invoke(inputs)
+                span.sizes(completion_tokens=count_tokens(response))
+            self.add_to_memory(text_input, response, session_id)
+            return response
         except Exception as e:
             logging.error(f"Error in LanguageAssistant.invoke: {e}")
             return {"error": str(e)}
+
+    async def ainvoke(self, text_input, session_id=None, context=None):
+        try:
+            inputs = self.build_inputs(text_input, session_id, context)
+            with metrics.span("llm", "LanguageAssistant") as span:
+                span.sizes(prompt_tokens=self.prompt_tokens(inputs))
+                response = await self.chain.ainvoke(inputs)
+                span.sizes(completion_tokens=count_tokens(response))
+            self.add_to_memory(text_input, response, session_id)
+            return response
+        except Exception as e:
+            logging.error(f"Error in LanguageAssistant.ainvoke: {e}")
+            return {"error": str(e)}
+
+    def stream(self, text_input, session_id=None, context=None):
+        """
+        Stream the response token by token and save the exchange to memory once it completes.
+
+        :param text_input: str, The input text from the user.
+        :param session_id: str, The conversation the input belongs to.
+        :param context: str, Retrieved documents to answer from, if any.
+        :return: generator, Yields response tokens as they arrive from the model.
+        """
+        inputs = self.build_inputs(text_input, session_id, context)
+        chunks = []
+        with metrics.span("llm", "LanguageAssistant") as span:
+            span.sizes(prompt_tokens=self.prompt_tokens(inputs))
+            for chunk in self.chain.stream(inputs):
+                span.first_token()
+                chunks.append(chunk)
+                yield chunk
+            response = ''.join(chunks)
+            span.sizes(completion_tokens=count_tokens(response))
+        self.add_to_memory(text_input, response, session_id)
+
+    async def astream(self, text_input, session_id=None, context=None):
+        """
+        Async counterpart of `stream`, yielding tokens without holding a thread for the round trip.
+
+        :param text_input: str, The input text from the user.
+        :param session_id: str, The conversation the input belongs to.
+        :param context: str, Retrieved documents to answer from, if any.
+        :return: async generator, Yields response tokens as they arrive from the model.
+        """
+        inputs = self.build_inputs(text_input, session_id, context)
+        chunks = []
+        with metrics.span("llm", "LanguageAssistant") as span:
+            span.sizes(prompt_tokens=self.prompt_tokens(inputs))
+            async for chunk in self.chain.astream(inputs):
+                span.first_token()
+                chunks.append(chunk)
+                yield chunk
+            response = ''.join(chunks)
+            span.sizes(completion_tokens=count_tokens(response))
+        self.add_to_memory(text_input, response, session_id)
+
+    def build_inputs(self, text_input, session_id=None, context=None):
+        """
+        Build the prompt inputs for the text, including the session's token-budgeted history.
+
+        Retrieved context only goes into this prompt; memory keeps the user's text as typed.
+
+        :param text_input: str, The input text from the user.
+        :param session_id: str, The conversation the input belongs to.
+        :param context: str, Retrieved documents to answer from, if any.
+        :return: dict, The inputs for `self.chain`.
+        """
+        if not isinstance(text_input, str) or not text_input.strip():
+            raise ValueError("Input must be a non-empty string.")
+        if context:
+            text_input = f"Context: {context}\n\nQuestion: {text_input}\n"
+        return {"input": text_input, "history": self.memory.load(session_id)}
+
+    @staticmethod
+    def prompt_tokens(inputs):
+        """Estimate the tokens of a prompt built by `build_inputs`, for the prompt size metric."""
+        return count_tokens(inputs["input"]) + sum(count_tokens(message.content) for message in inputs["history"])
+
+    def add_to_memory(self, text_input, response, session_id=None):
+        """
+        Add the interaction to the session's memory.
+
+        :param text_input: str, The input text from the user.
+        :param response: str, The response from the assistant.
+        :param session_id: str, The conversation the interaction belongs to.
+        """
+        self.memory.save(session_id, text_input, response)
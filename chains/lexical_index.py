@@ -0,0 +1,151 @@
+import collections
+import json
+import math
+import os
+import re
+import numpy as np
+
+LEXICAL_FILE = "lexical.npz"
+
+# Dotted, slashed and dashed names are indexed whole and by their parts: "os.path.join" matches
+# a query for "os.path.join" exactly and one for "join" too
+WORD_PATTERN = re.compile(r"\w+")
+COMPOUND_PATTERN = re.compile(r"\w+(?:[.:/-]\w+)+")
+
+# Query tokens that are almost never paraphrased: identifiers, error names and codes, paths, quoted text
+IDENTIFIER_PATTERN = re.compile(
+    r'"[^"]+"|`[^`]+`|\b\w+(?:[.:/]\w+)+|\b[a-z0-9]+_\w+|\b[a-z]+[A-Z]\w*|\b[A-Z][a-z]+[A-Z]\w*|'
+    r'\b[A-Z]{2,}-?\d+\b|\b0x[0-9a-fA-F]+\b|\b[A-Z]\w*(?:Error|Exception)\b'
+)
+
+
+def tokenize(text):
+    """Split text into lowercase index terms."""
+    text = text.lower()
+    return WORD_PATTERN.findall(text) + COMPOUND_PATTERN.findall(text)
+
+
+def is_keyword_query(query, min_share=0.4):
+    """
+    Return True if a query is mostly identifiers, error names or quoted strings.
+
+    Such queries are answered best by exact term matches, so they can skip the embedding call.
+
+    :param query: str, The user's question.
+    :param min_share: float, Share of the query's words that must be identifier-like.
+    """
+    words = query.split()
+    if not words:
+        return False
+    identifiers = IDENTIFIER_PATTERN.findall(query)
+    if any(token[0] in '"`' for token in identifiers):
+        return True
+    return len(identifiers) / len(words) >= min_share
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Merge ranked id lists: every list contributes 1 / (k + rank) for each id it contains.
+
+    :param rankings: list, Lists of ids, best first.
+    :param k: int, Damping constant; 60 is the usual choice.
+    :return: list, Ids sorted by fused score, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class BM25Index:
+    """
+    In-process BM25 inverted index over the chunks of a vector store.
+
+    Postings are stored per term as contiguous numpy slices with their BM25 weight precomputed,
+    so a query is a handful of vectorized scatter-adds regardless of the corpus size.
+    """
+
+    def __init__(self, doc_ids, vocabulary, offsets, postings, weights):
+        self.doc_ids = doc_ids
+        self.vocabulary = vocabulary  # term -> row in offsets
+        self.offsets = offsets
+        self.postings = postings
+        self.weights = weights
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    @classmethod
+    def build(cls, documents, k1=1.5, b=0.75):
+        """
+        :param documents: iterable, (doc_id, text) pairs.
+        :param k1: float, Term frequency saturation.
+        :param b: float, Document length normalization.
+        :return: BM25Index
+        """
+        doc_ids, term_docs, lengths = [], {}, []
+        for position, (doc_id, text) in enumerate(documents):
+            doc_ids.append(doc_id)
+            terms = tokenize(text)
+            lengths.append(len(terms))
+            for term, count in collections.Counter(terms).items():
+                entry = term_docs.get(term)
+                if entry is None:
+                    entry = term_docs[term] = ([], [])
+                entry[0].append(position)
+                entry[1].append(count)
+
+        lengths = np.asarray(lengths, dtype=np.float32)
+        average_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+        vocabulary, offsets, postings, weights = {}, [0], [], []
+        for term, (positions, tf) in term_docs.items():
+            positions = np.array(positions, dtype=np.int32)
+            tf = np.array(tf, dtype=np.float32)
+            idf = math.log(1 + (len(doc_ids) - len(positions) + 0.5) / (len(positions) + 0.5))
+            norm = k1 * (1 - b + b * lengths[positions] / average_length)
+            vocabulary[term] = len(vocabulary)
+            postings.append(positions)
+            weights.append((idf * tf * (k1 + 1) / (tf + norm)).astype(np.float32))
+            offsets.append(offsets[-1] + len(positions))
+        return cls(doc_ids, vocabulary, np.asarray(offsets, dtype=np.int64),
+                   np.concatenate(postings) if postings else np.zeros(0, dtype=np.int32),
+                   np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32))
+
+    def search(self, query, k=10):
+        """
+        :param query: str, The query text.
+        :param k: int, Number of results.
+        :return: list, (doc_id, score) pairs, best first; only documents containing a query term.
+        """
+        rows = {self.vocabulary[term] for term in tokenize(query) if term in self.vocabulary}
+        if not rows:
+            return []
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for row in rows:
+            start, end = self.offsets[row], self.offsets[row + 1]
+            # A term's postings hold each document once, so plain fancy-index addition is safe
+            scores[self.postings[start:end]] += self.weights[start:end]
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched])]
+        return [(self.doc_ids[i], float(scores[i])) for i in matched]
+
+    def save(self, directory):
+        """Write the index to `directory`/lexical.npz, next to the FAISS index."""
+        np.savez(os.path.join(directory, LEXICAL_FILE), offsets=self.offsets, postings=self.postings,
+                 weights=self.weights,
+                 meta=np.frombuffer(json.dumps({"doc_ids": self.doc_ids, "vocabulary": list(self.vocabulary)})
+                                    .encode("utf-8"), dtype=np.uint8))
+
+    @classmethod
+    def load(cls, directory):
+        """Load an index written by `save`, or return None if the store has none."""
+        path = os.path.join(directory, LEXICAL_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            return cls(meta["doc_ids"], {term: row for row, term in enumerate(meta["vocabulary"])},
+                       data["offsets"], data["postings"], data["weights"])
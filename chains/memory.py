@@ -1,5 +1,232 @@
 # centralized_memory.py
-from langchain.memory import ConversationBufferMemory
+import collections
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+# Token budget for the history sent with every prompt: a rolling summary plus a verbatim window
+HISTORY_TOKENS = 2048
+SUMMARY_TOKENS = 512
+# Sessions untouched for this long are dropped, and at most MAX_SESSIONS are kept in memory
+IDLE_TTL_SECONDS = 3600
+MAX_SESSIONS = 10000
+DEFAULT_SESSION = 'default'
+
+SUMMARY_PROMPT = """Progressively summarize the conversation below, adding onto the previous summary.
+Keep names, facts, code identifiers and decisions; drop pleasantries. Reply with the new summary only.
+
+Previous summary:
+{summary}
+
+New lines of conversation:
+{lines}
+
+New summary:"""
+
+
+def count_tokens(text):
+    """
+    Estimate the number of tokens in a text.
+
+    Uses the common ~4 characters per token heuristic, which is close enough for budgeting
+    and avoids loading a tokenizer on the request path.
+
+    :param text: str, The text to measure.
+    :return: int, The estimated token count.
+    """
+    return (len(text) + 3) // 4 if text else 0
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Keep the end of `text` so that it fits in `max_tokens`."""
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else text[-max_chars:]
+
+
+def extractive_summarizer(summary, turns):
+    """
+    Summarize turns without a model call by keeping the opening of each exchange.
+
+    :param summary: str, The previous summary.
+    :param turns: list, (input, response) pairs to fold into the summary.
+    :return: str, The new summary.
+    """
+    lines = [summary] if summary else []
+    for text_input, response in turns:
+        lines.append(f"User asked: {text_input[:200]} | Assistant answered: {response[:200]}")
+    return "\n".join(lines)
+
+
+def llm_summarizer(summary, turns):
+    """
+    Summarize turns with the language assistant's model, falling back to the extractive summary.
+
+    :param summary: str, The previous summary.
+    :param turns: list, (input, response) pairs to fold into the summary.
+    :return: str, The new summary.
+    """
+    from chains.registry import registry
+
+    lines = "\n".join(f"Human: {text_input}\nAI: {response}" for text_input, response in turns)
+    try:
+        model = registry.get('language_assistant').model
+        return model.invoke(SUMMARY_PROMPT.format(summary=summary or "(none)", lines=lines)).content
+    except Exception as e:
+        logging.error(f"Error in llm_summarizer: {e}")
+        return extractive_summarizer(summary, turns)
+
+
+class SessionMemory:
+    """Conversation state of a single session."""
+
+    def __init__(self):
+        self.summary = ""
+        self.turns = collections.deque()  # (input, response, tokens), oldest first
+        self.window_tokens = 0
+        self.pending = []  # turns that left the window and wait to be folded into the summary
+        self.compacting = False
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class SessionMemoryStore:
+    """
+    Conversation memory keyed by session id with a hard token budget per prompt.
+
+    Recent turns are kept verbatim while they fit in the window. Older turns are folded
+    into a rolling summary by a background worker, so summarization never delays a reply.
+    Turns waiting to be summarized are left out of the prompt, which keeps the prompt size
+    bounded at all times.
+    """
+
+    def __init__(self, max_tokens=HISTORY_TOKENS, summary_tokens=SUMMARY_TOKENS, idle_ttl=IDLE_TTL_SECONDS,
+                 max_sessions=MAX_SESSIONS, summarizer=extractive_summarizer):
+        self.summary_tokens = summary_tokens
+        self.window_budget = max_tokens - summary_tokens
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.summarizer = summarizer
+        self._sessions = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summarizer")
+
+    def load(self, session_id=None):
+        """
+        Return the history to send with the next prompt of a session.
+
+        :param session_id: str, The session id; None uses a shared default session.
+        :return: list, The summary as a system message followed by the recent turns.
+        """
+        session = self._session(session_id)
+        with session.lock:
+            messages = [SystemMessage(content=f"Summary of the earlier conversation: {session.summary}")] \
+                if session.summary else []
+            for text_input, response, _ in session.turns:
+                messages.append(HumanMessage(content=text_input))
+                messages.append(AIMessage(content=response))
+        return messages
+
+    def save(self, session_id, text_input, response):
+        """
+        Record one exchange of a session, moving turns that no longer fit into the summary queue.
+
+        :param session_id: str, The session id; None uses a shared default session.
+        :param text_input: str, The input text from the user.
+        :param response: str, The response from the assistant.
+        """
+        session = self._session(session_id)
+        with session.lock:
+            tokens = count_tokens(text_input) + count_tokens(response)
+            session.turns.append((text_input, response, tokens))
+            session.window_tokens += tokens
+            while session.turns and session.window_tokens > self.window_budget:
+                old_input, old_response, old_tokens = session.turns.popleft()
+                session.window_tokens -= old_tokens
+                session.pending.append((old_input, old_response))
+            if session.pending and not session.compacting:
+                session.compacting = True
+                self._executor.submit(self._compact, session)
+
+    def fingerprint(self, session_id=None):
+        """
+        Hash the history that would be sent with the session's next prompt.
+
+        Two sessions with the same fingerprint would send the model identical context.
+
+        :param session_id: str, The session id; None uses a shared default session.
+        :return: str, A hex digest, or '' when the session has no history.
+        """
+        session = self._sessions.get(session_id or DEFAULT_SESSION)
+        if session is None:
+            return ''
+        with session.lock:
+            if not session.summary and not session.turns:
+                return ''
+            digest = hashlib.sha1(session.summary.encode('utf-8'))
+            for text_input, response, _ in session.turns:
+                digest.update(b'\0' + text_input.encode('utf-8') + b'\0' + response.encode('utf-8'))
+        return digest.hexdigest()
+
+    def has_history(self, session_id=None):
+        """Return True if the session has any remembered turns."""
+        session = self._sessions.get(session_id or DEFAULT_SESSION)
+        return session is not None and bool(session.summary or session.turns or session.pending)
+
+    def clear(self, session_id=None):
+        """Forget a session."""
+        with self._lock:
+            self._sessions.pop(session_id or DEFAULT_SESSION, None)
+
+    def evict_idle(self):
+        """Drop sessions that have been idle for longer than `idle_ttl`."""
+        cutoff = time.monotonic() - self.idle_ttl
+        with self._lock:
+            # Sessions are kept in least-recently-used order, so idle ones are at the front
+            while self._sessions:
+                session_id, session = next(iter(self._sessions.items()))
+                if session.last_used >= cutoff:
+                    break
+                del self._sessions[session_id]
+            self._last_sweep = time.monotonic()
+
+    def _session(self, session_id):
+        session_id = session_id or DEFAULT_SESSION
+        now = time.monotonic()
+        if now - self._last_sweep > 60:
+            self.evict_idle()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = SessionMemory()
+                if len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = now
+        return session
+
+    def _compact(self, session):
+        """Fold the session's pending turns into its summary, off the request path."""
+        while True:
+            with session.lock:
+                turns = list(session.pending)
+                summary = session.summary
+            try:
+                new_summary = self.summarizer(summary, turns)
+            except Exception as e:
+                logging.error(f"Error in SessionMemoryStore._compact: {e}")
+                new_summary = extractive_summarizer(summary, turns)
+            with session.lock:
+                session.summary = truncate_to_tokens(new_summary, self.summary_tokens)
+                del session.pending[:len(turns)]
+                if not session.pending:
+                    session.compacting = False
+                    return
+
 
 # Centralized memory instance
-central_memory = ConversationBufferMemory(return_messages=True)
+central_memory = SessionMemoryStore(summarizer=llm_summarizer)
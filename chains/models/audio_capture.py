@@ -0,0 +1,215 @@
+import wave
+from abc import ABC, abstractmethod
+import numpy as np
+
+
+class AudioSource(ABC):
+    """
+    A mono int16 audio stream read in fixed-size frames.
+
+    Sources are context managers; `read` returns fewer samples than requested, or none,
+    once the stream has ended. Returned arrays must not be reused by the source, as
+    consumers may keep them.
+    """
+
+    def __init__(self, samplerate):
+        self.samplerate = samplerate
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    @abstractmethod
+    def read(self, frames):
+        """
+        :param frames: int, Number of samples to read.
+        :return: numpy.ndarray, Up to `frames` int16 samples.
+        """
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class MicrophoneSource(AudioSource):
+    """The default input device, read through sounddevice."""
+
+    def __init__(self, samplerate=16000, device=None):
+        super().__init__(samplerate)
+        self.device = device
+        self._stream = None
+
+    def start(self):
+        import sounddevice as sd
+
+        self._stream = sd.InputStream(samplerate=self.samplerate, channels=1, dtype=np.int16, device=self.device)
+        self._stream.start()
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+    def read(self, frames):
+        audio, _ = self._stream.read(frames)
+        return audio[:, 0]
+
+
+class WavFileSource(AudioSource):
+    """A 16-bit PCM WAV file; only the first channel of multi-channel files is used."""
+
+    def __init__(self, path):
+        self.path = path
+        self._wav = None
+        with wave.open(path, "rb") as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError(f"{path} is not 16-bit PCM.")
+            super().__init__(wav.getframerate())
+            self.channels = wav.getnchannels()
+
+    def start(self):
+        self._wav = wave.open(self.path, "rb")
+
+    def stop(self):
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+
+    def read(self, frames):
+        audio = np.frombuffer(self._wav.readframes(frames), dtype="<i2")
+        return audio[::self.channels] if self.channels > 1 else audio
+
+
+class ArraySource(AudioSource):
+    """An in-memory buffer, for tests and benchmarks."""
+
+    def __init__(self, audio, samplerate=16000):
+        super().__init__(samplerate)
+        self.audio = np.asarray(audio, dtype=np.int16)
+        self._position = 0
+
+    def start(self):
+        self._position = 0
+
+    def read(self, frames):
+        audio = self.audio[self._position:self._position + frames]
+        self._position += len(audio)
+        return audio
+
+
+class EnergyVAD:
+    """
+    Voice activity detection by RMS energy threshold.
+
+    A dependency-free stand-in for webrtcvad with the same `is_speech(frame, sample_rate)`
+    interface; frames may be int16 bytes or arrays.
+    """
+
+    def __init__(self, threshold=500):
+        self.threshold = threshold
+
+    def is_speech(self, frame, sample_rate=None):
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            frame = np.frombuffer(frame, dtype=np.int16)
+        if len(frame) == 0:
+            return False
+        samples = frame.astype(np.float32)
+        return float(np.sqrt(np.dot(samples, samples) / len(samples))) > self.threshold
+
+
+def webrtc_vad(mode=2):
+    """Return a webrtcvad.Vad with the given aggressiveness (0-3)."""
+    import webrtcvad
+
+    vad = webrtcvad.Vad()
+    vad.set_mode(mode)
+    return vad
+
+
+class VADCapture:
+    """
+    Capture one utterance from an AudioSource, gated by a VAD.
+
+    Recent frames live in a preallocated ring buffer with running voiced counts, so the
+    per-frame cost is one VAD call and a row copy regardless of the padding length. Capture
+    starts when more than `trigger_ratio` of the padding window is voiced, and stops when more
+    than `trigger_ratio` of it is unvoiced or the source ends.
+    """
+
+    def __init__(self, source, vad=None, padding_duration_ms=2000, chunk_duration_ms=30, trigger_ratio=0.9,
+                 max_duration_s=None):
+        """
+        :param source: AudioSource, Where the audio comes from.
+        :param vad: object, Anything with `is_speech(frame_bytes, sample_rate)`; webrtcvad if None.
+        :param padding_duration_ms: int, Length of the window the VAD decisions are smoothed over.
+        :param chunk_duration_ms: int, Frame length; webrtcvad supports 10, 20 and 30 ms.
+        :param trigger_ratio: float, Fraction of the window that must agree to start or stop.
+        :param max_duration_s: float, Optional cap on the captured utterance length.
+        """
+        self.source = source
+        self.vad = vad if vad is not None else webrtc_vad()
+        self.chunk_size = int(source.samplerate * chunk_duration_ms / 1000)
+        self.num_padding_chunks = max(1, int(padding_duration_ms / chunk_duration_ms))
+        self.threshold = trigger_ratio * self.num_padding_chunks
+        self.max_chunks = int(max_duration_s * 1000 / chunk_duration_ms) if max_duration_s else None
+        self._ring = np.zeros((self.num_padding_chunks, self.chunk_size), dtype=np.int16)
+
+    def frames(self):
+        """
+        Yield the voiced audio as it is captured: the buffered lead-in once the VAD triggers,
+        then every following frame until the end of speech.
+
+        :return: generator, 1-D int16 numpy arrays.
+        """
+        ring, size, chunk_size = self._ring, self.num_padding_chunks, self.chunk_size
+        speech = [False] * size
+        head = count = voiced = 0
+        triggered = False
+        remaining = self.max_chunks or -1
+        is_speech_fn, samplerate, threshold = self.vad.is_speech, self.source.samplerate, self.threshold
+
+        with self.source:
+            read = self.source.read
+            while remaining:
+                chunk = read(chunk_size)
+                if len(chunk) < chunk_size:
+                    break
+                is_speech = bool(is_speech_fn(chunk.tobytes(), samplerate))
+
+                # Overwrite the oldest frame, keeping the voiced count in step
+                if count == size:
+                    voiced -= speech[head]
+                else:
+                    count += 1
+                ring[head] = chunk
+                speech[head] = is_speech
+                voiced += is_speech
+                head = head + 1 if head + 1 < size else 0
+
+                if triggered:
+                    yield chunk
+                    remaining -= 1
+                    if count - voiced > threshold:
+                        break
+                elif voiced > threshold:
+                    triggered = True
+                    # Oldest first: the slots from head onwards, then the ones before it
+                    yield np.concatenate([ring[head:count], ring[:head]]).reshape(-1) if count == size \
+                        else ring[:count].reshape(-1).copy()
+                    remaining = max(remaining - count, 0) if remaining > 0 else remaining
+                    head = count = voiced = 0
+
+    def record(self):
+        """
+        Capture one utterance into a single array.
+
+        :return: numpy.ndarray, int16 samples; empty if the VAD never triggered.
+        """
+        chunks = list(self.frames())
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int16)
@@ -0,0 +1,111 @@
+import math
+import wave
+import numpy as np
+
+# Peak level normalize() scales recordings to, half of the int16 range
+NORMALIZE_PEAK = 16384
+
+
+def as_int16(snd_data):
+    """View int16 samples (numpy array, array('h') or bytes) as a numpy array without copying."""
+    if isinstance(snd_data, (bytes, bytearray, memoryview)):
+        return np.frombuffer(snd_data, dtype=np.int16)
+    return np.asarray(snd_data, dtype=np.int16)
+
+
+def is_silent(snd_data, threshold):
+    """Returns 'True' if below the 'silent' threshold"""
+    snd_data = as_int16(snd_data)
+    return len(snd_data) == 0 or int(snd_data.max()) < threshold
+
+
+def normalize(snd_data, maximum=NORMALIZE_PEAK):
+    """
+    Scale samples so the loudest one reaches `maximum`.
+
+    Matches the original per-sample loop exactly: the scaled values are truncated towards zero.
+
+    :param snd_data: array-like, int16 samples.
+    :param maximum: int, Target peak amplitude.
+    :return: numpy.ndarray, Normalized int16 samples; silence is returned unchanged.
+    """
+    snd_data = as_int16(snd_data)
+    # Widen before abs(): abs(-32768) does not fit in int16
+    peak = int(np.abs(snd_data.astype(np.int32)).max()) if len(snd_data) else 0
+    if peak == 0:
+        return snd_data.copy()
+    multiplier = float(maximum) / peak
+    return (snd_data * multiplier).astype(np.int16)
+
+
+def trim(snd_data, threshold):
+    """
+    Trim the blank spots at the start and end: everything before the first and after the last
+    sample whose magnitude exceeds `threshold`.
+
+    :return: numpy.ndarray, A view of the loud part of `snd_data`; empty if nothing is loud.
+    """
+    snd_data = as_int16(snd_data)
+    loud = np.flatnonzero(np.abs(snd_data.astype(np.int32)) > threshold)
+    if len(loud) == 0:
+        return snd_data[:0]
+    return snd_data[loud[0]:loud[-1] + 1]
+
+
+def add_silence(snd_data, seconds, rate):
+    """Add silence to the start and end of 'snd_data' of length 'seconds' (float)"""
+    padding = int(seconds * rate)
+    return np.pad(as_int16(snd_data), (padding, padding))
+
+
+def write_wav(path, snd_data, rate, sample_width=2):
+    """
+    Write mono int16 samples to a WAV file straight from the array's buffer.
+
+    :param path: str or file-like object, Destination.
+    :param snd_data: array-like, int16 samples.
+    :param rate: int, Sample rate in Hz.
+    :param sample_width: int, Bytes per sample.
+    """
+    # Little-endian is WAV's byte order; this is a no-op (no copy) on little-endian machines
+    snd_data = np.ascontiguousarray(as_int16(snd_data), dtype='<i2')
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(sample_width)
+        wf.setframerate(rate)
+        wf.writeframes(memoryview(snd_data).cast('B'))
+
+
+def read_wav(source):
+    """
+    Read a 16-bit PCM WAV file, keeping only the first channel.
+
+    :param source: str or file-like object, e.g. an uploaded file in memory.
+    :return: tuple, The int16 samples as a numpy array and the sample rate in Hz.
+    """
+    with wave.open(source, 'rb') as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError("Only 16-bit PCM WAV audio is supported.")
+        channels = wf.getnchannels()
+        snd_data = np.frombuffer(wf.readframes(wf.getnframes()), dtype='<i2')
+        return (snd_data[::channels] if channels > 1 else snd_data), wf.getframerate()
+
+
+def to_float32(snd_data):
+    """Convert int16 samples to float32 in [-1, 1]."""
+    return as_int16(snd_data).astype(np.float32) / 32768.0
+
+
+def resample(audio, orig_rate, target_rate):
+    """
+    Resample with a polyphase filter, e.g. 44.1 kHz microphone audio to a model's 16 kHz.
+
+    :param audio: numpy.ndarray, float32 samples.
+    :return: numpy.ndarray, float32 samples at `target_rate`.
+    """
+    if orig_rate == target_rate:
+        return audio
+    from scipy.signal import resample_poly
+
+    divisor = math.gcd(orig_rate, target_rate)
+    return resample_poly(audio, target_rate // divisor, orig_rate // divisor).astype(np.float32)
@@ -0,0 +1,190 @@
+"""
+Transcribe a backlog of recorded audio files with a pool of worker processes.
+
+Every worker loads the ASR model once and then transcribes files one at a time. Results are
+appended to a JSONL file as they finish, so an interrupted run can be restarted and will skip
+the files that are already transcribed.
+
+    python -m chains.models.batch_transcribe recordings/ --backend whisper nemo --workers 4
+    python -m chains.models.batch_transcribe manifest.jsonl --output transcripts.jsonl
+"""
+import argparse
+import json
+import logging
+import os
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.mp3', '.m4a', '.ogg', '.webm')
+DEFAULT_MODELS = {'whisper': 'base', 'nemo': 'stt_en_conformer_ctc_xlarge'}
+
+# The model loaded by this worker process, set by _init_worker
+_worker = {}
+
+
+def find_audio_files(source):
+    """
+    List the audio files to transcribe.
+
+    :param source: str, A directory (searched recursively), a manifest with one path per line,
+                   or a JSONL manifest whose records have an "audio_filepath" (NeMo style) or "path".
+    :return: list, Audio file paths; relative manifest entries are resolved against the manifest's directory.
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, dirs, files in os.walk(source):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            paths.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(AUDIO_EXTENSIONS))
+        return paths
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                record = json.loads(line)
+                line = record.get('audio_filepath') or record['path']
+            paths.append(line if os.path.isabs(line) else os.path.join(base_dir, line))
+    return paths
+
+
+def load_done(output_path):
+    """Return the (backend, path) pairs already transcribed successfully in `output_path`."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interrupted run
+            if 'text' in record:
+                done.add((record['backend'], record['path']))
+    return done
+
+
+def _end_partial_line(path):
+    """Terminate a record cut short by an interrupted run, so appended records start on a new line."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, 'rb+') as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def audio_duration(path):
+    """Length of an audio file in seconds, or None if it cannot be determined without decoding."""
+    try:
+        with wave.open(path, 'rb') as wav:
+            return wav.getnframes() / wav.getframerate()
+    except (wave.Error, EOFError):
+        pass
+    try:
+        import soundfile
+        return soundfile.info(path).duration
+    except Exception:
+        return None
+
+
+def _init_worker(backend, model_name, threads):
+    """Load the model once per worker process."""
+    try:
+        import torch
+        # Keep workers x threads within the machine's cores
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    if backend == 'whisper':
+        from chains.models.whisper_asr import WhisperASR
+        _worker['asr'] = WhisperASR(model_name=model_name)
+    else:
+        from chains.models.nemo_asr import NeMoASR
+        _worker['asr'] = NeMoASR(model_name=model_name)
+    _worker['backend'] = backend
+
+
+def _transcribe(path):
+    """Transcribe one file in a worker. Returns (text, audio seconds)."""
+    asr = _worker['asr']
+    if _worker['backend'] == 'whisper':
+        import whisper
+        from chains.models.whisper_asr import WHISPER_SAMPLE_RATE
+
+        # Decode once and reuse the samples for both the duration and the transcription
+        audio = whisper.load_audio(path)
+        return asr.transcribe_array(audio)["text"].strip(), len(audio) / WHISPER_SAMPLE_RATE
+    transcription = asr.transcribe_audio(path)
+    return getattr(transcription, 'text', transcription), audio_duration(path)
+
+
+def transcribe_batch(paths, backend, output_path, model_name=None, workers=None):
+    """
+    Transcribe `paths` with one backend, appending one JSON record per file to `output_path`.
+
+    :param paths: list, Audio file paths.
+    :param backend: str, 'whisper' or 'nemo'.
+    :param output_path: str, JSONL file; files already transcribed in it are skipped.
+    :param model_name: str, Model to load; the backend's default if None.
+    :param workers: int, Worker processes; one per CPU core if None.
+    :return: dict, Counts and throughput of this run.
+    """
+    model_name = model_name or DEFAULT_MODELS[backend]
+    done = load_done(output_path)
+    todo = [path for path in paths if (backend, path) not in done]
+    workers = min(workers or os.cpu_count() or 1, len(todo)) or 1
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    stats = {'backend': backend, 'model': model_name, 'files': len(todo), 'skipped': len(paths) - len(todo),
+             'failed': 0, 'audio_seconds': 0.0, 'wall_seconds': 0.0}
+    if not todo:
+        return stats
+
+    start = time.perf_counter()
+    _end_partial_line(output_path)
+    with open(output_path, 'a') as out, ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                              initargs=(backend, model_name, threads)) as executor:
+        futures = {executor.submit(_transcribe, path): path for path in todo}
+        for future in as_completed(futures):
+            path = futures[future]
+            record = {'path': path, 'backend': backend, 'model': model_name}
+            try:
+                text, seconds = future.result()
+                record.update(text=text, audio_seconds=seconds)
+                stats['audio_seconds'] += seconds or 0.0
+            except Exception as e:
+                logging.error(f"Error in transcribe_batch for {path}: {e}")
+                record['error'] = str(e)
+                stats['failed'] += 1
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+    stats['wall_seconds'] = time.perf_counter() - start
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("source", help="Directory of audio files or a manifest.")
+    parser.add_argument("--backend", nargs="+", choices=sorted(DEFAULT_MODELS), default=["whisper"])
+    parser.add_argument("--model", help="Model name, when a single backend is used.")
+    parser.add_argument("--workers", type=int, help="Worker processes per backend (default: CPU cores).")
+    parser.add_argument("--output", default="transcripts.jsonl")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    paths = find_audio_files(args.source)
+    print(f"{'backend':<10}{'files':>7}{'skipped':>9}{'failed':>8}{'audio s':>10}{'wall s':>9}{'audio s/s':>11}")
+    for backend in args.backend:
+        stats = transcribe_batch(paths, backend, args.output, args.model if len(args.backend) == 1 else None,
+                                 args.workers)
+        speed = stats['audio_seconds'] / stats['wall_seconds'] if stats['wall_seconds'] else 0.0
+        print(f"{backend:<10}{stats['files']:>7}{stats['skipped']:>9}{stats['failed']:>8}"
+              f"{stats['audio_seconds']:>10.1f}{stats['wall_seconds']:>9.1f}{speed:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,109 +1,112 @@
-import nemo
-from nemo.collections.asr.models import EncDecCTCModelBPE
-import os
-from sys import byteorder
-from array import array
-from struct import pack
-import pyaudio
-import wave
+import numpy as np
+from chains.models import audio_dsp
+from utils import metrics
+
+# NeMo's English CTC models are trained on 16 kHz audio
+MODEL_RATE = 16000
+
 
 class NeMoASR:
     def __init__(self, model_name="stt_en_conformer_ctc_xlarge"):
+        from nemo.collections.asr.models import EncDecCTCModelBPE
+
         self.asr_model = EncDecCTCModelBPE.from_pretrained(model_name=model_name)
         self.THRESHOLD = 500
         self.CHUNK_SIZE = 1024
-        self.FORMAT = pyaudio.paInt16
+        self.SAMPLE_WIDTH = 2  # 16-bit samples
         self.RATE = 44100
         self.SILENT_CHUNKS = int(3 * self.RATE / self.CHUNK_SIZE)  # Number of chunks of silence for 3 seconds
 
     def is_silent(self, snd_data):
         """Returns 'True' if below the 'silent' threshold"""
-        return max(snd_data) < self.THRESHOLD
+        return audio_dsp.is_silent(snd_data, self.THRESHOLD)
 
     def normalize(self, snd_data):
         """Average the volume out"""
-        MAXIMUM = 16384
-        multiplier = float(MAXIMUM) / max(abs(i) for i in snd_data)
-        return array('h', [int(i * multiplier) for i in snd_data])
+        return audio_dsp.normalize(snd_data)
 
     def trim(self, snd_data):
         """Trim the blank spots at the start and end"""
-        def _trim(snd_data):
-            snd_started = False
-            trimmed_data = array('h')
-            for i in snd_data:
-                if not snd_started and abs(i) > self.THRESHOLD:
-                    snd_started = True
-                    trimmed_data.append(i)
-                elif snd_started:
-                    trimmed_data.append(i)
-            return trimmed_data
-
-        snd_data = _trim(snd_data)
-        snd_data.reverse()
-        snd_data = _trim(snd_data)
-        snd_data.reverse()
-        return snd_data
+        return audio_dsp.trim(snd_data, self.THRESHOLD)
 
     def add_silence(self, snd_data, seconds):
         """Add silence to the start and end of 'snd_data' of length 'seconds' (float)"""
-        silence = [0] * int(seconds * self.RATE)
-        return array('h', silence) + snd_data + array('h', silence)
+        return audio_dsp.add_silence(snd_data, seconds, self.RATE)
 
+    @metrics.timed("asr_record", "NeMoASR")
     def record(self):
         """
-        Record audio from the microphone and return the data as an array of signed shorts.
+        Record audio from the microphone and return the data as an int16 numpy array.
         Normalizes the audio, trims silence from the start and end, and pads with 0.5 seconds of silence.
         """
+        import pyaudio
+
         p = pyaudio.PyAudio()
-        stream = p.open(format=self.FORMAT, channels=1, rate=self.RATE, input=True, frames_per_buffer=self.CHUNK_SIZE)
+        stream = p.open(format=pyaudio.paInt16, channels=1, rate=self.RATE, input=True,
+                        frames_per_buffer=self.CHUNK_SIZE)
 
         num_silent = 0
         snd_started = False
-        recorded_data = array('h')
-
-        while True:
-            snd_data = array('h', stream.read(self.CHUNK_SIZE, exception_on_overflow=False))
-            if byteorder == 'big':
-                snd_data.byteswap()
-            recorded_data.extend(snd_data)
-
-            if self.is_silent(snd_data):
-                if snd_started:
-                    num_silent += 1
-            else:
-                snd_started = True
-                num_silent = 0
-
-            if snd_started and num_silent > self.SILENT_CHUNKS:
-                break
+        chunks = []
+
+        try:
+            while True:
+                # PyAudio delivers native-endian int16; '=i2' reads it without a byteswap loop
+                snd_data = np.frombuffer(stream.read(self.CHUNK_SIZE, exception_on_overflow=False), dtype='=i2')
+                chunks.append(snd_data)
+
+                if self.is_silent(snd_data):
+                    if snd_started:
+                        num_silent += 1
+                else:
+                    snd_started = True
+                    num_silent = 0
 
-        sample_width = p.get_sample_size(self.FORMAT)
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
+                if snd_started and num_silent > self.SILENT_CHUNKS:
+                    break
+        finally:
+            stream.stop_stream()
+            stream.close()
+            p.terminate()
 
+        recorded_data = np.concatenate(chunks).astype(np.int16)
         recorded_data = self.normalize(recorded_data)
         recorded_data = self.trim(recorded_data)
         recorded_data = self.add_silence(recorded_data, 0.5)
-        return sample_width, recorded_data
+        return self.SAMPLE_WIDTH, recorded_data
 
     def record_to_file(self, path):
         """Records from the microphone and outputs the resulting data to 'path'"""
         sample_width, data = self.record()
-        data = pack('<' + ('h' * len(data)), *data)
-
-        with wave.open(path, 'wb') as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(sample_width)
-            wf.setframerate(self.RATE)
-            wf.writeframes(data)
+        audio_dsp.write_wav(path, data, self.RATE, sample_width)
 
+    @metrics.timed("asr_transcribe", "NeMoASR")
     def transcribe_audio(self, file_path):
         """Transcribe the given audio file using the ASR model"""
         transcriptions = self.asr_model.transcribe(paths2audio_files=[file_path])
         return transcriptions[0]
 
+    @metrics.timed("asr_transcribe", "NeMoASR")
+    def transcribe_array(self, snd_data, rate=None):
+        """
+        Transcribe int16 samples in memory, without a temporary WAV file.
+
+        Needs a NeMo version whose `transcribe` accepts numpy arrays (1.23 or later).
+
+        :param snd_data: array-like, int16 samples, e.g. from `record`.
+        :param rate: int, Sample rate of `snd_data`; defaults to the recording rate.
+        :return: str, The transcription.
+        """
+        audio = audio_dsp.resample(audio_dsp.to_float32(snd_data), rate or self.RATE, MODEL_RATE)
+        transcription = self.asr_model.transcribe([audio], batch_size=1)[0]
+        # Newer NeMo versions return Hypothesis objects instead of strings
+        return getattr(transcription, 'text', transcription)
+
+    def record_and_transcribe(self):
+        """Record from the microphone and transcribe the recording in memory."""
+        _, data = self.record()
+        return self.transcribe_array(data)
+
 if __name__ == '__main__':
     asr_recorder = NeMoASR()
     print("Please speak a word into the microphone.")
@@ -78,73 +78,255 @@
 
 
 
-import whisper
-import sounddevice as sd
 import numpy as np
-import scipy.io.wavfile as wavfile
-import webrtcvad
-import collections
+import queue
+import threading
+from chains.models import audio_dsp
+from chains.models.audio_capture import MicrophoneSource, VADCapture, webrtc_vad
+from utils import metrics
 
-class WhisperASR:
-    def __init__(self, model_name="base"):
-        self.model = whisper.load_model(model_name)
-        self.vad = webrtcvad.Vad()
-        self.vad.set_mode(2)  # Set aggressiveness mode (0-3)
-
-    def record_audio(self, samplerate=16000, padding_duration_ms=2000, chunk_duration_ms=30):
-        chunk_size = int(samplerate * chunk_duration_ms / 1000)
-        num_padding_chunks = int(padding_duration_ms / chunk_duration_ms)
-        ring_buffer = collections.deque(maxlen=num_padding_chunks)
-        triggered = False
-        voiced_frames = []
+# Whisper models consume 16 kHz mono float32 audio and decode at most 30 s per window
+WHISPER_SAMPLE_RATE = 16000
+WHISPER_WINDOW_SECONDS = 30
+
+
+def to_float32(audio):
+    """Convert int16 PCM to the float32 [-1, 1] range Whisper expects; float input is passed through."""
+    audio = np.asarray(audio)
+    if audio.dtype == np.int16:
+        return audio.astype(np.float32) / 32768.0
+    return audio.astype(np.float32, copy=False)
+
+
+def _background_chunks(chunks):
+    """
+    Pull chunks from `chunks` on a background thread and yield everything that has arrived.
 
+    Capture keeps running while the consumer is busy decoding, and the consumer gets one
+    concatenated buffer per iteration instead of falling further behind chunk by chunk.
+    """
+    pending = queue.Queue()
+    done = object()
+
+    def produce():
         try:
-            stream = sd.InputStream(samplerate=samplerate, channels=1, dtype=np.int16)
-            stream.start()
-            print("Recording...")
+            for chunk in chunks:
+                pending.put(chunk)
+        except Exception as e:
+            pending.put(e)
+        pending.put(done)
+
+    threading.Thread(target=produce, name="audio-capture", daemon=True).start()
+    finished = False
+    while not finished:
+        batch = [pending.get()]
+        while not pending.empty():
+            batch.append(pending.get_nowait())
+        if batch[-1] is done:
+            batch.pop()
+            finished = True
+        for item in batch:
+            if isinstance(item, Exception):
+                raise item
+        if batch:
+            yield np.concatenate(batch)
+
+
+def quantize_linear_layers(model):
+    """
+    Apply dynamic int8 quantization to every linear layer of a Whisper model, for CPU inference.
+
+    Whisper uses its own nn.Linear subclass, which quantize_dynamic skips because it matches
+    module types exactly, so those layers are first swapped for plain nn.Linear sharing the weights.
+
+    :param model: whisper.model.Whisper, A model loaded on the CPU.
+    :return: The quantized model.
+    """
+    import torch
+
+    for module in list(model.modules()):
+        for name, child in module.named_children():
+            if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+                linear = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                linear.weight = child.weight
+                linear.bias = child.bias
+                setattr(module, name, linear)
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class WhisperASR:
+    def __init__(self, model_name="base", vad=None, device=None, quantize=False, threads=None, greedy=False):
+        """
+        :param model_name: str, Whisper model size, e.g. "base".
+        :param vad: object, VAD for recording; webrtcvad if None.
+        :param device: str, "cpu" or "cuda"; CUDA when available if None, or CPU when quantizing.
+        :param quantize: bool, Quantize the linear layers to int8 (CPU only).
+        :param threads: int, Intra-op threads for torch on the CPU; torch's default if None.
+        :param greedy: bool, Decode greedily at temperature 0 without the temperature fallback.
+        """
+        import torch
+        import whisper
+
+        if threads:
+            torch.set_num_threads(threads)
+        if quantize and device is None:
+            device = "cpu"
+        self.model = whisper.load_model(model_name, device=device)
+        on_cpu = self.model.device.type == "cpu"
+        if quantize:
+            if not on_cpu:
+                raise ValueError("int8 quantization is only supported for CPU inference.")
+            self.model = quantize_linear_layers(self.model)
+        # Options passed to every transcribe call. On CPU fp16 is emulated and only triggers a warning.
+        self.decode_options = {"fp16": not on_cpu}
+        if greedy:
+            self.decode_options.update(temperature=0.0, beam_size=None, best_of=None)
+        # webrtcvad is created on first recording, so file-only use (e.g. batch jobs) does not need it
+        self.vad = vad
 
-            while True:
-                audio_chunk, _ = stream.read(chunk_size)
-                audio_chunk = audio_chunk[:, 0].tobytes()
-                is_speech = self.vad.is_speech(audio_chunk, samplerate)
-
-                if not triggered:
-                    ring_buffer.append((audio_chunk, is_speech))
-                    num_voiced = len([f for f, speech in ring_buffer if speech])
-                    if num_voiced > 0.9 * ring_buffer.maxlen:
-                        triggered = True
-                        voiced_frames.extend([f for f, s in ring_buffer])
-                        ring_buffer.clear()
-                else:
-                    voiced_frames.append(audio_chunk)
-                    ring_buffer.append((audio_chunk, is_speech))
-                    num_unvoiced = len([f for f, speech in ring_buffer if not speech])
-                    if num_unvoiced > 0.9 * ring_buffer.maxlen:
-                        break
+    @metrics.timed("asr_record", "WhisperASR")
+    def record_audio(self, samplerate=16000, padding_duration_ms=2000, chunk_duration_ms=30, source=None):
+        chunks = list(self.record_audio_stream(samplerate, padding_duration_ms, chunk_duration_ms, source))
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int16)
 
+    def record_audio_stream(self, samplerate=16000, padding_duration_ms=2000, chunk_duration_ms=30, source=None):
+        """
+        Record and yield voiced audio as it is captured.
+
+        Nothing is yielded until the VAD triggers; then the buffered lead-in is yielded followed by
+        every new chunk, and the generator returns as soon as the VAD detects the end of speech.
+
+        :param samplerate: int, Microphone sample rate in Hz; webrtcvad supports 8000, 16000, 32000 and 48000.
+        :param padding_duration_ms: int, Length of the window the VAD decisions are smoothed over.
+        :param chunk_duration_ms: int, Frame length: 10, 20 or 30 ms.
+        :param source: AudioSource, Where to read audio from; the microphone if None.
+        :return: generator, 1-D int16 numpy arrays.
+        """
+        if self.vad is None:
+            self.vad = webrtc_vad(mode=2)  # Aggressiveness mode (0-3)
+        capture = VADCapture(source or MicrophoneSource(samplerate), self.vad, padding_duration_ms, chunk_duration_ms)
+        try:
+            print("Recording...")
+            yield from capture.frames()
         except Exception as e:
             print(f"An error occurred while recording audio: {e}")
         finally:
-            stream.stop()
-            stream.close()
             print("Recording complete.")
 
-        audio_data = b''.join(voiced_frames)
-        audio_np = np.frombuffer(audio_data, dtype=np.int16)
-        return audio_np
-
     def save_wav(self, file_path, audio, samplerate):
+        import scipy.io.wavfile as wavfile
+
         wavfile.write(file_path, samplerate, audio)
 
+    @metrics.timed("asr_transcribe", "WhisperASR")
     def transcribe_audio(self, file_path):
         print("Transcribing...")
-        result = self.model.transcribe(file_path)
+        result = self.model.transcribe(file_path, **self.decode_options)
         return result["text"]
 
-    def run(self, duration=5, samplerate=16000, file_path="recorded_audio.wav"):
-        audio = self.record_audio(samplerate=samplerate)
-        self.save_wav(file_path, audio, samplerate)
-        text = self.transcribe_audio(file_path)
+    @metrics.timed("asr_transcribe", "WhisperASR")
+    def transcribe_array(self, audio, samplerate=WHISPER_SAMPLE_RATE, **options):
+        """
+        Transcribe an in-memory int16 or float32 buffer without going through a file.
+
+        :param audio: numpy.ndarray, Mono audio samples.
+        :param samplerate: int, Sample rate of `audio`; other rates than 16 kHz are resampled for Whisper.
+        :param options: Extra keyword arguments for `whisper.transcribe`.
+        :return: dict, Whisper's result with "text" and timestamped "segments".
+        """
+        audio = audio_dsp.resample(to_float32(audio), samplerate, WHISPER_SAMPLE_RATE)
+        return self.model.transcribe(audio, **{**self.decode_options, **options})
+
+    def stream_transcribe(self, chunks, samplerate=WHISPER_SAMPLE_RATE, step_seconds=1.0, overlap_seconds=1.0):
+        """
+        Transcribe audio while it is still arriving, yielding the transcript so far after every step.
+
+        The audio after the last committed segment is decoded again each time `step_seconds` of
+        new audio has arrived, so every window overlaps the previous one. Segments that end more
+        than `overlap_seconds` before the end of the audio are committed and not decoded again;
+        the rest of the text is provisional and may change in the next partial.
+
+        :param chunks: iterable, int16 or float32 numpy arrays, e.g. from `record_audio_stream`.
+        :param samplerate: int, Sample rate of the chunks, e.g. 8, 16, 32 or 48 kHz from the microphone.
+        :param step_seconds: float, New audio needed before the next partial decode.
+        :param overlap_seconds: float, Trailing audio that is never committed before the input ends.
+        :return: generator, The full transcript so far; the last value is the final transcript.
+        """
+        # Audio is buffered at its own rate and each window is resampled as a whole when it is decoded,
+        # which avoids the filter edges that resampling every small chunk would leave at chunk boundaries
+        step = int(step_seconds * samplerate)
+        max_window = WHISPER_WINDOW_SECONDS * samplerate
+        committed = []
+        pending = np.zeros(0, dtype=np.float32)  # audio after the last committed segment
+        new_samples = 0
+        text = ""
+
+        for chunk in chunks:
+            pending = np.concatenate([pending, to_float32(chunk)])
+            new_samples += len(chunk)
+            if new_samples < step:
+                continue
+            new_samples = 0
+            segments = self._decode_window(audio_dsp.resample(pending, samplerate, WHISPER_SAMPLE_RATE), committed)
+            # Commit segments that end well before the live edge, or everything but the last
+            # segment once the window approaches the model's 30 s limit
+            horizon = (len(pending) - overlap_seconds * samplerate) / samplerate
+            if len(pending) > max_window - step:
+                horizon = segments[-1]["start"] if segments else len(pending) / samplerate
+            cut = 0.0
+            while segments and segments[0]["end"] <= horizon:
+                segment = segments.pop(0)
+                committed.append(segment["text"].strip())
+                cut = segment["end"]
+            if cut:
+                pending = pending[int(cut * samplerate):]
+            elif len(pending) > max_window:
+                pending = pending[-max_window:]
+            text = " ".join(committed + [segment["text"].strip() for segment in segments]).strip()
+            yield text
+
+        if len(pending):
+            segments = self._decode_window(audio_dsp.resample(pending, samplerate, WHISPER_SAMPLE_RATE), committed)
+            committed.extend(segment["text"].strip() for segment in segments)
+        final_text = " ".join(committed).strip()
+        if final_text != text or not committed:
+            yield final_text
+
+    @metrics.timed("asr_decode_window", "WhisperASR")
+    def _decode_window(self, audio, committed):
+        # The committed text conditions the decoder so words are not split differently across windows
+        prompt = " ".join(committed)[-200:] or None
+        result = self.model.transcribe(audio, initial_prompt=prompt, condition_on_previous_text=False,
+                                       **self.decode_options)
+        return [segment for segment in result["segments"] if segment["text"].strip()]
+
+    def run_stream(self, samplerate=16000, file_path=None, source=None):
+        """
+        Record until the speaker stops and yield partial transcripts along the way.
+
+        :param samplerate: int, Recording sample rate.
+        :param file_path: str, Where to save the recording as WAV; nothing is written if None.
+        :param source: AudioSource, Where to read audio from; the microphone if None.
+        :return: generator, The transcript so far; the last value is the final transcript.
+        """
+        recorded = []
+        if source is not None:
+            samplerate = source.samplerate
+
+        def capture():
+            for chunk in self.record_audio_stream(samplerate=samplerate, source=source):
+                if file_path:
+                    recorded.append(chunk)
+                yield chunk
+
+        yield from self.stream_transcribe(_background_chunks(capture()), samplerate)
+        if file_path and recorded:
+            self.save_wav(file_path, np.concatenate(recorded), samplerate)
+
+    def run(self, duration=5, samplerate=16000, file_path=None, source=None):
+        text = ""
+        for text in self.run_stream(samplerate=samplerate, file_path=file_path, source=source):
+            pass
         print("Transcription:")
         print(text)
         return text
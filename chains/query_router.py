@@ -0,0 +1,207 @@
+import collections
+import logging
+import math
+import re
+import threading
+import numpy as np
+
+RouteDecision = collections.namedtuple('RouteDecision', ['route', 'confidence', 'stage'])
+
+CODE_ROUTE = 'code'
+LANGUAGE_ROUTE = 'language'
+
+# Terms that almost only appear in programming questions
+STRONG_KEYWORDS = [
+    'code', 'coding', 'programming', 'debug', 'debugging', 'compile', 'compiler', 'algorithm', 'data structure',
+    'function call', 'stack trace', 'traceback', 'exception', 'regex', 'api', 'json', 'refactor', 'unit test',
+    'python', 'javascript', 'typescript', 'java', 'c++', 'c#', 'php', 'html', 'css', 'sql', 'kotlin', 'golang',
+    'perl', 'scala', 'bash', 'powershell', 'objective-c', 'matlab', 'groovy', 'lua', 'cobol', 'fortran', 'haskell',
+    'lisp', 'prolog', 'smalltalk', 'verilog', 'vhdl', 'coffeescript', 'f#', 'solidity', 'vba', 'abap', 'awk',
+    'clojure', 'elixir', 'erlang', 'idris', 'kdb+', 'labview', 'logtalk', 'lolcode', 'mumps', 'ocaml', 'pl/i',
+    'postscript', 'tcl', 'unicon', 'x10', 'xquery', 'zsh',
+    # Languages whose names are also ordinary words only count together with a programming word
+    'r code', 'r script', 'r language', 'in r', 'go code', 'in go', 'go language', 'rust code', 'in rust',
+    'swift code', 'in swift', 'ruby code', 'in ruby', 'ruby on rails', 'dart code', 'julia code', 'scheme code',
+    'racket code', 'assembly code', 'assembly language', 'shell script', 'd language', 'j language',
+]
+
+# Terms that suggest code but are common in ordinary prose; on their own they are not enough
+WEAK_KEYWORDS = [
+    'function', 'class', 'def', 'import', 'print', 'variable', 'loop', 'array', 'list', 'dictionary', 'error',
+    'bug', 'execute', 'script', 'rust', 'swift', 'ruby', 'dart', 'julia', 'scheme', 'racket', 'shell', 'pascal',
+    'assembly', 'scratch', 'hack', 'forth', 'apex', 'nim', 'rpg', 'sas', 'sml', 'turing', 'library', 'install',
+]
+
+STRONG_WEIGHT = 1.0
+WEAK_WEIGHT = 0.4
+
+# Syntax that only shows up when code is pasted into the message. A trailing semicolon alone is
+# common in prose lists, so it only counts after a call, in an assignment or on consecutive lines.
+CODE_SYNTAX = re.compile(
+    r'```|#include\b|\bdef \w+\(|\bfunction \w*\(|=>|::|\w+\(\)|[{}]\s*$|</?\w+>|'
+    r'\w\([^()\n]*\)\s*;\s*$|^\s*[\w.\[\]]+\s*[-+*/]?=[^=\n]*;\s*$|;[ \t]*\n[^\n]*;\s*$|'
+    r'\b[a-z]+_[a-z_]+\b|\b[a-z]{2,}[A-Z][a-z]+\w*|\b[A-Z]\w*(?:Error|Exception)\b|'
+    r'^\s*(?:import \w+|from [\w.]+ import|(?:const|let|var) \w+ =)',
+    re.MULTILINE
+)
+
+# Tokens keep the punctuation that is part of language names (c++, c#, kdb+, objective-c, pl/i)
+TOKEN_PATTERN = re.compile(r'[a-z0-9_][a-z0-9_+#]*(?:[-/][a-z0-9_+#]+)*')
+
+ROUTE_PROTOTYPES = {
+    CODE_ROUTE: [
+        "How do I fix this error in my program?",
+        "Write a function that sorts a list of numbers.",
+        "Explain what this piece of code does.",
+        "What is the time complexity of this algorithm?",
+        "How do I connect to a database from my application?",
+        "Why does my loop never terminate?",
+    ],
+    LANGUAGE_ROUTE: [
+        "What is the capital of France?",
+        "Summarize the history of the Roman Empire.",
+        "Give me a recipe for a quick dinner.",
+        "Write a short poem about the ocean.",
+        "What are some tips for a job interview?",
+        "Explain how photosynthesis works.",
+    ],
+}
+
+
+def build_keyword_trie(weighted_keywords):
+    """
+    Build a token-level trie over keyword phrases.
+
+    :param weighted_keywords: dict, Keyword phrase -> weight.
+    :return: dict, Nested dicts keyed by token; the weight of a complete phrase is stored under None.
+    """
+    trie = {}
+    for keyword, weight in weighted_keywords.items():
+        node = trie
+        for token in TOKEN_PATTERN.findall(keyword):
+            node = node.setdefault(token, {})
+        node[None] = max(weight, node.get(None, 0.0))
+    return trie
+
+
+class SemanticRouteClassifier:
+    """
+    Classify a query by embedding similarity to a few example queries per route.
+
+    The example embeddings are computed once, on the first ambiguous query, and reused.
+    """
+
+    def __init__(self, embedder_fn, prototypes=ROUTE_PROTOTYPES):
+        """
+        :param embedder_fn: callable, Returns an object with `embed_query` and `embed_documents`.
+        :param prototypes: dict, Route -> list of example queries.
+        """
+        self.embedder_fn = embedder_fn
+        self.prototypes = prototypes
+        self._routes = None
+        self._vectors = None
+        self._lock = threading.Lock()
+
+    def classify(self, text):
+        """
+        :param text: str, The input text.
+        :return: dict, Route -> similarity to its closest example.
+        """
+        routes, vectors = self._prototype_vectors()
+        query = np.asarray(self.embedder_fn().embed_query(text), dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        similarities = vectors @ query
+        scores = {}
+        for route, similarity in zip(routes, similarities):
+            scores[route] = max(scores.get(route, -1.0), float(similarity))
+        return scores
+
+    def _prototype_vectors(self):
+        if self._vectors is None:
+            with self._lock:
+                if self._vectors is None:
+                    routes = [route for route, examples in self.prototypes.items() for _ in examples]
+                    texts = [example for examples in self.prototypes.values() for example in examples]
+                    vectors = np.asarray(self.embedder_fn().embed_documents(texts), dtype=np.float32)
+                    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                    self._routes, self._vectors = routes, vectors
+        return self._routes, self._vectors
+
+
+class QueryRouter:
+    """
+    Decide whether a query goes to the code or the language assistant.
+
+    Stage one scans the query once with a keyword trie and the code-syntax pattern, both
+    compiled at import time. Clear cases are decided there. Queries with only weak hints are
+    passed to the semantic classifier when one is configured.
+    """
+
+    trie = build_keyword_trie({**{k: WEAK_WEIGHT for k in WEAK_KEYWORDS}, **{k: STRONG_WEIGHT for k in STRONG_KEYWORDS}})
+
+    def __init__(self, semantic=None, code_threshold=1.0, semantic_margin=0.02):
+        """
+        :param semantic: SemanticRouteClassifier, Fallback for ambiguous queries, or None to disable it.
+        :param code_threshold: float, Keyword score at which a query is treated as code without the fallback.
+        :param semantic_margin: float, How much closer to the code examples a query must be to route it as code.
+        """
+        self.semantic = semantic
+        self.code_threshold = code_threshold
+        self.semantic_margin = semantic_margin
+
+    def keyword_score(self, text):
+        """
+        Score how strongly the text looks like a programming question.
+
+        :param text: str, The input text.
+        :return: float, The sum of the weights of distinct keyword and syntax hits.
+        """
+        score = STRONG_WEIGHT if CODE_SYNTAX.search(text) else 0.0
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        matched = {}
+        start = 0
+        while start < len(tokens):
+            # Follow the trie as far as the tokens allow and keep the longest complete phrase,
+            # so 'in r' is one strong hit rather than a stray 'r'
+            node, end, weight = self.trie, None, 0.0
+            for position in range(start, len(tokens)):
+                node = node.get(tokens[position])
+                if node is None:
+                    break
+                if None in node:
+                    end, weight = position, node[None]
+            if end is None:
+                start += 1
+                continue
+            matched[' '.join(tokens[start:end + 1])] = weight
+            start = end + 1
+        return score + sum(matched.values())
+
+    def classify(self, text):
+        """
+        Route the text and report how confident the decision is.
+
+        :param text: str, The input text.
+        :return: RouteDecision, The route, a confidence in [0.5, 1] and the stage that decided.
+        """
+        score = self.keyword_score(text)
+        if score >= self.code_threshold:
+            return RouteDecision(CODE_ROUTE, self._confidence(score), 'keywords')
+        if score == 0.0:
+            return RouteDecision(LANGUAGE_ROUTE, 0.9, 'keywords')
+        if self.semantic is not None:
+            try:
+                scores = self.semantic.classify(text)
+                margin = scores[CODE_ROUTE] - scores[LANGUAGE_ROUTE]
+                route = CODE_ROUTE if margin > self.semantic_margin else LANGUAGE_ROUTE
+                confidence = 1.0 / (1.0 + math.exp(-abs(margin) * 20))
+                return RouteDecision(route, confidence, 'semantic')
+            except Exception as e:
+                logging.error(f"Error in QueryRouter.classify semantic fallback: {e}")
+        # Without the fallback, a single weak hint is not enough to pay for the code model
+        if score >= 2 * WEAK_WEIGHT:
+            return RouteDecision(CODE_ROUTE, 0.6, 'keywords')
+        return RouteDecision(LANGUAGE_ROUTE, 0.6, 'keywords')
+
+    def _confidence(self, score):
+        return min(0.99, 0.75 + 0.1 * (score - self.code_threshold))
@@ -0,0 +1,139 @@
+import collections
+import logging
+import os
+import threading
+import time
+
+# Imported once per process, so this marks the cold start of the app
+PROCESS_START = time.perf_counter()
+
+
+class ModelRegistry:
+    """
+    Process-wide home for the assistants and ASR models.
+
+    Each model is built by its factory on first use and then shared by every session and
+    every Streamlit rerun. Factories import their heavy dependencies themselves, so nothing
+    is loaded until a model is actually requested.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._locks = collections.defaultdict(threading.Lock)
+        self.build_times = {}
+        self.script_runs = collections.deque(maxlen=100)
+
+    def register(self, name, factory):
+        """
+        Register a zero-argument factory for a model.
+
+        :param name: str, The name the model is looked up by.
+        :param factory: callable, Builds the model when it is first requested.
+        """
+        self._factories[name] = factory
+
+    def get(self, name):
+        """
+        Return the shared instance of a model, building it on first use.
+
+        :param name: str, The registered model name.
+        :return: The model instance.
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        if name not in self._factories:
+            raise KeyError(f"No model registered under '{name}'.")
+        # One lock per model so a slow Whisper load does not block the chat assistants
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is None:
+                start = time.perf_counter()
+                instance = self._factories[name]()
+                self.build_times[name] = time.perf_counter() - start
+                logging.info(f"ModelRegistry built '{name}' in {self.build_times[name]:.2f}s")
+                self._instances[name] = instance
+        return instance
+
+    def is_loaded(self, name):
+        """Return True if the model has already been built."""
+        return name in self._instances
+
+    def record_script_run(self, seconds):
+        """
+        Record how long one execution of the app script took.
+
+        The first run in a process is the cold start; later ones are reruns.
+
+        :param seconds: float, Wall time of the script run.
+        """
+        kind = "rerun" if self.script_runs else "cold start"
+        self.script_runs.append(seconds)
+        logging.info(f"App script {kind} took {seconds:.3f}s "
+                     f"({time.perf_counter() - PROCESS_START:.1f}s since process start)")
+
+
+def _router():
+    from chains.assistant_router import AssistantRouter
+    return AssistantRouter(registry)
+
+
+def _code_assistant():
+    from chains.code_assistant import CodeAssistant
+    return CodeAssistant()
+
+
+def _language_assistant():
+    from chains.language_assistant import LanguageAssistant
+    return LanguageAssistant()
+
+
+def _vision_assistant():
+    from chains.vision_assistant import VisionAssistant
+    return VisionAssistant()
+
+
+def _embedding_models():
+    from chains.embedding_models import EmbeddingModels
+    return EmbeddingModels()
+
+
+def _whisper_asr():
+    from chains.models.whisper_asr import WhisperASR
+    # CPU-only nodes: WHISPER_QUANTIZE=1 WHISPER_GREEDY=1 WHISPER_THREADS=<cores>
+    return WhisperASR(model_name=os.getenv("WHISPER_MODEL", "base"),
+                      quantize=os.getenv("WHISPER_QUANTIZE") == "1",
+                      threads=int(os.getenv("WHISPER_THREADS", "0")) or None,
+                      greedy=os.getenv("WHISPER_GREEDY") == "1")
+
+
+def _retriever():
+    from chains.retrieval import ContextRetriever
+    # The store written by the ingestion pipeline; retrieval is skipped until one exists
+    return ContextRetriever(os.getenv("VECTORSTORE_DIR", "vectorstore"))
+
+
+def _tts():
+    from utils.tts import default_worker
+    return default_worker()
+
+
+registry = ModelRegistry()
+registry.register('router', _router)
+registry.register('code_assistant', _code_assistant)
+registry.register('language_assistant', _language_assistant)
+registry.register('vision_assistant', _vision_assistant)
+registry.register('embedding_models', _embedding_models)
+registry.register('retriever', _retriever)
+registry.register('whisper_asr', _whisper_asr)
+registry.register('tts', _tts)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    for model_name in ['router', 'language_assistant', 'code_assistant', 'vision_assistant', 'whisper_asr']:
+        registry.get(model_name)
+    for model_name, seconds in registry.build_times.items():
+        print(f"{model_name}: {seconds:.2f}s")
+    print(f"Total since process start: {time.perf_counter() - PROCESS_START:.2f}s")
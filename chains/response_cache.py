@@ -0,0 +1,169 @@
+import collections
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from utils import metrics
+
+CacheEntry = collections.namedtuple('CacheEntry', ['model', 'context', 'response', 'expires'])
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_prompt(prompt):
+    """Lowercase, collapse whitespace and drop trailing punctuation so trivially different prompts match."""
+    return _WHITESPACE.sub(' ', prompt).strip().rstrip('?!.').strip().lower()
+
+
+class ResponseCache:
+    """
+    LRU/TTL cache of assistant responses.
+
+    Lookups first try an exact match on (model, context, normalized prompt). If that fails, the
+    prompt embedding is compared with the cached prompts of the same model and context, and the
+    closest one is returned if it clears `similarity_threshold`. Cached prompts are embedded in
+    a background thread, so storing a response never delays the reply.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, similarity_threshold=0.95, embedder_fn=None):
+        """
+        :param max_entries: int, Size cap; the least recently used entry is evicted beyond it.
+        :param ttl: float, Seconds an entry stays valid.
+        :param similarity_threshold: float, Minimum cosine similarity for a semantic hit, or None to disable.
+        :param embedder_fn: callable, Returns an object with `embed_query`; needed for semantic hits.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.embedder_fn = embedder_fn
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._vectors = {}
+        self._query_vectors = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache")
+
+    @property
+    def semantic_enabled(self):
+        return self.embedder_fn is not None and self.similarity_threshold is not None
+
+    @metrics.timed("cache_lookup", "ResponseCache")
+    def get(self, model, prompt, context=''):
+        """
+        Look up a cached response.
+
+        :param model: str, The model that would answer the prompt.
+        :param prompt: str, The user prompt.
+        :param context: str, Fingerprint of anything else the answer depends on, e.g. the conversation so far.
+        :return: str, The cached response, or None on a miss.
+        """
+        key = (model, context, normalize_prompt(prompt))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.response
+            if entry is not None:
+                self._remove(key)
+            candidates = [k for k in self._vectors if k[0] == model and k[1] == context] \
+                if self.semantic_enabled else []
+        if candidates:
+            response = self._semantic_get(key, candidates, now)
+            if response is not None:
+                return response
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, model, prompt, response, context=''):
+        """
+        Store a response. Empty responses are not stored, so one blank completion is not served
+        to every identical prompt until it expires.
+
+        :param model: str, The model that answered the prompt.
+        :param prompt: str, The user prompt.
+        :param response: str, The response to cache.
+        :param context: str, Fingerprint of anything else the answer depends on.
+        """
+        if not response or not response.strip():
+            return
+        key = (model, context, normalize_prompt(prompt))
+        with self._lock:
+            self._entries[key] = CacheEntry(model, context, response, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            vector = self._query_vectors.pop(key[2], None)
+            if vector is not None:
+                self._vectors[key] = vector
+        if vector is None and self.semantic_enabled:
+            self._executor.submit(self._embed_entry, key)
+
+    def stats(self):
+        """Return the hit and miss counters and the current size."""
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                'hits': self.hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+            self._query_vectors.clear()
+
+    def _semantic_get(self, key, candidates, now):
+        try:
+            query = self._embed(key[2])
+        except Exception as e:
+            logging.error(f"Error in ResponseCache semantic lookup: {e}")
+            return None
+        with self._lock:
+            # Keep the query vector so `put` can reuse it after a miss
+            self._query_vectors[key[2]] = query
+            while len(self._query_vectors) > 256:
+                self._query_vectors.popitem(last=False)
+            candidates = [k for k in candidates if k in self._vectors]
+            if not candidates:
+                return None
+            similarities = np.stack([self._vectors[k] for k in candidates]) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+            match = candidates[best]
+            entry = self._entries[match]
+            if entry.expires <= now:
+                self._remove(match)
+                return None
+            self._entries.move_to_end(match)
+            self.semantic_hits += 1
+            return entry.response
+
+    def _embed(self, normalized_prompt):
+        vector = np.asarray(self.embedder_fn().embed_query(normalized_prompt), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _embed_entry(self, key):
+        try:
+            vector = self._embed(key[2])
+        except Exception as e:
+            logging.error(f"Error in ResponseCache embedding: {e}")
+            return
+        with self._lock:
+            if key in self._entries:
+                self._vectors[key] = vector
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        self._vectors.pop(key, None)
@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import re
+import threading
+import numpy as np
+from chains.embedding_service import CachedQueryEmbedder
+from chains.lexical_index import is_keyword_query, reciprocal_rank_fusion
+from chains.memory import count_tokens
+from chains.vectorstore_io import MANIFEST_FILE, load_lexical_index, load_vectorstore
+
+# Tokens of retrieved context allowed per target model. Llama 3 70B has room for generous
+# context; Granite 34B Code needs most of its window for code in the prompt and the answer.
+CONTEXT_TOKEN_BUDGETS = {
+    "meta/llama3-70b-instruct": 3000,
+    "ibm/granite-34b-code-instruct": 1200,
+}
+DEFAULT_CONTEXT_TOKENS = 1500
+DEFAULT_QUERY_EMBEDDING_MODEL = "NV-Embed-QA"
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def shingles(text, size=3):
+    """Return the set of word n-grams of a text, used to detect overlapping chunks."""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def overlap(a, b):
+    """Share of the smaller shingle set that also occurs in the other one."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+class ContextRetriever:
+    """
+    Retrieval stage for the text assistants.
+
+    Fetches `fetch_k` candidate chunks from the vector store saved under `directory`, drops
+    chunks that mostly repeat a better-ranked one (split overlap, duplicated documents), and
+    packs the best remaining chunks into the token budget of the target model. The store is
+    memory-mapped and reloaded when a new version is saved, e.g. after ingestion.
+
+    Candidates come from the FAISS index and the store's BM25 index, merged by reciprocal rank
+    fusion. Queries made up mostly of identifiers or error names are served from BM25 alone,
+    without an embedding call, and query embeddings are cached.
+    """
+
+    def __init__(self, directory, fetch_k=20, token_budgets=None, default_budget=DEFAULT_CONTEXT_TOKENS,
+                 max_overlap=0.5, embedder=None, hybrid=True):
+        """
+        :param directory: str, Directory written by `save_vectorstore`.
+        :param fetch_k: int, Candidates fetched from the store before deduplication and packing.
+        :param token_budgets: dict, Context token budget per model name; CONTEXT_TOKEN_BUDGETS if None.
+        :param default_budget: int, Budget for models without an entry.
+        :param max_overlap: float, Chunks sharing more than this share of their word trigrams with a
+                            selected chunk are dropped.
+        :param embedder: Embeddings, Query embedder; built from the store's manifest if None.
+        :param hybrid: bool, Combine dense results with the BM25 index.
+        """
+        self.directory = directory
+        self.fetch_k = fetch_k
+        self.token_budgets = dict(CONTEXT_TOKEN_BUDGETS if token_budgets is None else token_budgets)
+        self.default_budget = default_budget
+        self.max_overlap = max_overlap
+        self.embedder = CachedQueryEmbedder(embedder) if embedder is not None else None
+        self.hybrid = hybrid
+        self.lexical_only_queries = 0
+        self._vectorstore = None
+        self._lexical = None
+        self._loaded_mtime = None
+        self._lock = threading.Lock()
+
+    def budget_for(self, model_name):
+        """Return the context token budget for a model."""
+        return self.token_budgets.get(model_name, self.default_budget)
+
+    @property
+    def version(self):
+        """Identifies the saved store, so answers cached for one version are not served for another."""
+        try:
+            return os.path.getmtime(os.path.join(self.directory, MANIFEST_FILE))
+        except OSError:
+            return None
+
+    @property
+    def vectorstore(self):
+        """The current vector store, or None if none has been saved yet."""
+        return self._snapshot()[0]
+
+    def _snapshot(self):
+        """Return the current vector store and its BM25 index, (re)loading them if the store changed."""
+        manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+        try:
+            mtime = os.path.getmtime(manifest_path)
+        except OSError:
+            return None, None
+        if mtime != self._loaded_mtime:
+            with self._lock:
+                if mtime != self._loaded_mtime:
+                    vectorstore = load_vectorstore(self.directory, self._query_embedder(manifest_path), mmap=True)
+                    lexical = load_lexical_index(self.directory) if self.hybrid else None
+                    self._vectorstore, self._lexical = vectorstore, lexical
+                    self._loaded_mtime = mtime
+        return self._vectorstore, self._lexical
+
+    def search(self, query):
+        """
+        Rank candidate chunk ids for a query.
+
+        :param query: str, The user's question.
+        :return: list, Up to `fetch_k` docstore ids, best first.
+        """
+        vectorstore, lexical = self._snapshot()
+        if vectorstore is None:
+            return []
+        lexical_ids = [doc_id for doc_id, _ in lexical.search(query, self.fetch_k)] if lexical is not None else []
+        if lexical_ids and is_keyword_query(query):
+            self.lexical_only_queries += 1
+            return lexical_ids
+
+        vector = np.asarray([self.embedder.embed_query(query)], dtype=np.float32)
+        if getattr(vectorstore, "_normalize_L2", False):
+            import faiss
+            faiss.normalize_L2(vector)
+        _, positions = vectorstore.index.search(vector, self.fetch_k)
+        # FAISS pads with -1 when the index has fewer than fetch_k vectors
+        dense_ids = [vectorstore.index_to_docstore_id[p] for p in positions[0] if p != -1]
+        if not lexical_ids:
+            return dense_ids
+        return reciprocal_rank_fusion([dense_ids, lexical_ids])[:self.fetch_k]
+
+    def retrieve(self, query, model_name=None):
+        """
+        Return the chunks to send with a query, best first, within the model's budget.
+
+        :param query: str, The user's question.
+        :param model_name: str, The model the context is for.
+        :return: list, LangChain Documents.
+        """
+        from langchain_core.documents import Document
+
+        vectorstore = self.vectorstore
+        if vectorstore is None or not query.strip():
+            return []
+        candidates = [doc for doc in (vectorstore.docstore.search(doc_id) for doc_id in self.search(query))
+                      if isinstance(doc, Document)]
+        budget = self.budget_for(model_name)
+
+        selected, selected_shingles = [], []
+        used = 0
+        for doc in candidates:
+            doc_shingles = shingles(doc.page_content)
+            if any(overlap(doc_shingles, other) > self.max_overlap for other in selected_shingles):
+                continue
+            tokens = count_tokens(doc.page_content) + 2  # plus the separator
+            if used + tokens > budget:
+                if selected:
+                    continue  # a shorter chunk further down may still fit
+                # The best chunk alone exceeds the budget: keep as much of it as fits
+                doc = Document(page_content=doc.page_content[:budget * 4], metadata=doc.metadata)
+                tokens = budget
+            selected.append(doc)
+            selected_shingles.append(doc_shingles)
+            used += tokens
+        logging.debug(f"ContextRetriever packed {len(selected)} of {len(candidates)} chunks "
+                      f"into {used}/{budget} tokens for {model_name}")
+        return selected
+
+    def build_context(self, query, model_name=None):
+        """
+        Retrieve and format the context for a query.
+
+        :param query: str, The user's question.
+        :param model_name: str, The model the context is for.
+        :return: str, The packed chunks, or '' if no vector store has been saved.
+        """
+        docs = self.retrieve(query, model_name)
+        return "\n\n".join(doc.page_content for doc in docs)
+
+    def _query_embedder(self, manifest_path):
+        if self.embedder is None:
+            from langchain_nvidia_ai_endpoints import NVIDIAEmbeddings
+            from chains import http_pool
+
+            with open(manifest_path) as f:
+                model = json.load(f).get("embedding_model") or DEFAULT_QUERY_EMBEDDING_MODEL
+            # Queries must be embedded by the model that embedded the stored chunks
+            embedder = NVIDIAEmbeddings(model=model, model_type="query", **http_pool.client_options())
+            self.embedder = CachedQueryEmbedder(http_pool.attach(embedder))
+        return self.embedder
@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import pickle
+import shutil
+import sqlite3
+import threading
+from chains.lexical_index import BM25Index
+
+FORMAT_NAME = "agent-nesh-faiss"
+FORMAT_VERSION = 1
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.sqlite"
+MANIFEST_FILE = "manifest.json"
+
+
+class SqliteDocstore:
+    """
+    Read-only LangChain docstore backed by the SQLite file of a saved vector store.
+
+    Documents are read on demand, so loading a store does not pull every chunk into RAM,
+    and the file's pages are shared by all processes through the OS page cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def search(self, search):
+        """Return the Document stored under the id, or a message string if there is none."""
+        from langchain_core.documents import Document
+
+        with self._lock:
+            row = self._connection.execute("SELECT content, metadata FROM docs WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+    def close(self):
+        self._connection.close()
+
+
+def save_vectorstore(vectorstore, directory, embedding_model=None):
+    """
+    Save a LangChain FAISS store as a raw FAISS index, a SQLite docstore, a BM25 index and a JSON manifest.
+
+    The files are written to a temporary directory that then replaces `directory`, so readers
+    never see a half-written store.
+
+    :param vectorstore: FAISS, The store to save.
+    :param directory: str, Target directory.
+    :param embedding_model: str, Name of the embedding model, recorded in the manifest.
+    """
+    import faiss
+
+    tmp_dir = directory.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    faiss.write_index(vectorstore.index, os.path.join(tmp_dir, INDEX_FILE))
+
+    connection = sqlite3.connect(os.path.join(tmp_dir, DOCSTORE_FILE))
+    with connection:
+        connection.execute("CREATE TABLE docs (id TEXT PRIMARY KEY, position INTEGER NOT NULL, "
+                           "content TEXT NOT NULL, metadata TEXT NOT NULL)")
+        rows = []
+        for position, doc_id in sorted(vectorstore.index_to_docstore_id.items()):
+            doc = vectorstore.docstore.search(doc_id)
+            rows.append((doc_id, position, doc.page_content, json.dumps(doc.metadata)))
+        connection.executemany("INSERT INTO docs VALUES (?, ?, ?, ?)", rows)
+    connection.close()
+    BM25Index.build((doc_id, content) for doc_id, _, content, _ in rows).save(tmp_dir)
+
+    manifest = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "count": vectorstore.index.ntotal,
+        "dim": vectorstore.index.d,
+        "index_type": type(vectorstore.index).__name__,
+        "distance_strategy": str(getattr(vectorstore.distance_strategy, "value", vectorstore.distance_strategy)),
+        "normalize_L2": bool(getattr(vectorstore, "_normalize_L2", False)),
+        "embedding_model": embedding_model,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=1)
+
+    old_dir = directory.rstrip("/\\") + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(directory):
+        os.replace(directory, old_dir)
+    os.replace(tmp_dir, directory)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def load_vectorstore(directory, embedder, mmap=True):
+    """
+    Load a store saved by `save_vectorstore`.
+
+    With `mmap=True` the FAISS index is memory-mapped read-only and documents are read from
+    SQLite on demand, so load time does not grow with the corpus and memory is shared across
+    processes. Use `mmap=False` for a store that will be modified, e.g. by DocumentIngestor.
+
+    :param directory: str, Directory written by `save_vectorstore`.
+    :param embedder: Embeddings, Used to embed queries (it is not stored on disk).
+    :param mmap: bool, Memory-map the index and read documents lazily.
+    :return: FAISS, The loaded store.
+    """
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    from langchain_community.vectorstores.utils import DistanceStrategy
+
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_NAME or manifest.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported vector store format in {directory}: {manifest.get('format')} "
+                         f"v{manifest.get('version')}")
+
+    index_path = os.path.join(directory, INDEX_FILE)
+    docstore_path = os.path.join(directory, DOCSTORE_FILE)
+    index = None
+    if mmap:
+        # IO_FLAG_MMAP only maps inverted lists; flat indexes need IO_FLAG_MMAP_IFC or their codes are copied to RAM
+        flat = manifest.get("index_type", "").startswith("IndexFlat")
+        flag = faiss.IO_FLAG_MMAP_IFC if flat else faiss.IO_FLAG_MMAP
+        try:
+            index = faiss.read_index(index_path, flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            logging.warning(f"Could not memory-map {index_path}, reading it into memory instead: {e}")
+    if index is None:
+        index = faiss.read_index(index_path)
+
+    connection = sqlite3.connect(f"file:{docstore_path}?mode=ro", uri=True)
+    try:
+        if mmap:
+            rows = connection.execute("SELECT position, id FROM docs").fetchall()
+            index_to_docstore_id = {position: doc_id for position, doc_id in rows}
+            docstore = SqliteDocstore(docstore_path)
+        else:
+            from langchain_core.documents import Document
+
+            rows = connection.execute("SELECT position, id, content, metadata FROM docs").fetchall()
+            index_to_docstore_id = {position: doc_id for position, doc_id, _, _ in rows}
+            docstore = InMemoryDocstore({doc_id: Document(page_content=content, metadata=json.loads(metadata))
+                                         for _, doc_id, content, metadata in rows})
+    finally:
+        connection.close()
+
+    return FAISS(embedding_function=embedder, index=index, docstore=docstore,
+                 index_to_docstore_id=index_to_docstore_id, normalize_L2=manifest["normalize_L2"],
+                 distance_strategy=DistanceStrategy(manifest["distance_strategy"]))
+
+
+def load_lexical_index(directory):
+    """
+    Load the BM25 index saved with a vector store.
+
+    Stores saved before the index existed get one built from their docstore; it is kept in
+    memory only, and written the next time the store is saved.
+
+    :param directory: str, Directory written by `save_vectorstore`.
+    :return: BM25Index
+    """
+    index = BM25Index.load(directory)
+    if index is None:
+        connection = sqlite3.connect(f"file:{os.path.join(directory, DOCSTORE_FILE)}?mode=ro", uri=True)
+        try:
+            index = BM25Index.build(connection.execute("SELECT id, content FROM docs ORDER BY position"))
+        finally:
+            connection.close()
+    return index
+
+
+def migrate_pickle(pickle_path, directory, embedding_model=None):
+    """
+    Convert a vector store pickled by earlier versions into the native format, once.
+
+    Only unpickle files you created yourself: unpickling can run arbitrary code.
+
+    :param pickle_path: str, Path of the legacy `vectorstore.pkl`.
+    :param directory: str, Where to write the native store.
+    :param embedding_model: str, Name of the embedding model, recorded in the manifest.
+    :return: bool, True if a migration happened.
+    """
+    if os.path.exists(os.path.join(directory, MANIFEST_FILE)) or not os.path.exists(pickle_path):
+        return False
+    with open(pickle_path, "rb") as f:
+        vectorstore = pickle.load(f)
+    save_vectorstore(vectorstore, directory, embedding_model)
+    logging.info(f"Migrated {pickle_path} to {directory}")
+    return True
@@ -2,18 +2,24 @@ from langchain_nvidia_ai_endpoints import ChatNVIDIA
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage
 from langchain_core.output_parsers import StrOutputParser
-from chains.memory import central_memory
-from PIL import Image, ImageOps
-import base64
-import io
+from chains.memory import central_memory, count_tokens
+from chains import http_pool
+from utils import metrics
+from utils.image_processor import IMAGE_MIME_TYPES, encode_image
 from dotenv import load_dotenv
 import logging
 
 load_dotenv()
 
 class VisionAssistant:
-    def __init__(self, model_name="microsoft/phi-3-vision-128k-instruct"):
-        self.chat_model = ChatNVIDIA(model=model_name)
+    def __init__(self, model_name="microsoft/phi-3-vision-128k-instruct", image_format="JPEG", image_quality=85):
+        # Lossy encoding keeps the uploaded payload far smaller than PNG at the model's input size
+        self.image_format = image_format.upper()
+        if self.image_format not in IMAGE_MIME_TYPES:
+            raise ValueError(f"Unsupported image format '{image_format}'; "
+                             f"expected one of {', '.join(IMAGE_MIME_TYPES)}.")
+        self.chat_model = http_pool.attach(ChatNVIDIA(model=model_name, **http_pool.client_options()))
+        self.image_quality = image_quality
         self.system_prompt = """You are an AI vision assistant specialized in analyzing,
                                 describing and answering questions about images. You are accurately
                                 able to describe the contents of an image, including objects, actions,
@@ -37,52 +43,105 @@ class VisionAssistant:
     #         logging.error(f"Error in VisionAssistant.process_image: {e}")
     #         return None
 
-    def process_image(self, image_path, desired_size=256):
+    def process_image(self, image, desired_size=256):
         try:
-            # Open the input image
-            with Image.open(image_path) as img:
-                # Convert the image to PNG format
-                buffered = io.BytesIO()
-                img.save(buffered, format="PNG")
-                buffered.seek(0)
-                image = Image.open(buffered)
-
-                # Resize the image
-                image.thumbnail((desired_size, desired_size), Image.Resampling.LANCZOS)
-                image = ImageOps.pad(image, (desired_size, desired_size), color="white")
-
-                # Save the processed image to a buffer
-                buffered = io.BytesIO()
-                image.save(buffered, format="PNG")
-
-                # Encode the image in base64
-                return base64.b64encode(buffered.getvalue()).decode('utf-8')
+            # Single decode -> downscale -> encode pass, cached by image content and settings.
+            # Accepts a path, raw bytes or a buffer such as a Streamlit upload, so nothing is written to disk.
+            with metrics.span("image_encode", "VisionAssistant"):
+                return encode_image(image, desired_size, self.image_format, self.image_quality)
         except Exception as e:
             logging.error(f"Error in VisionAssistant.process_image: {e}")
             return None
 
-    def invoke(self, input_string):
+    def invoke(self, input_string, session_id=None):
         try:
-            if '|' not in input_string:
-                raise ValueError("Input must be in the format 'text|base64_image'.")
-            text_input, image_b64 = input_string.split('|', 1)
-            input_message = [
-                {"type": "text", "text": text_input},
-                {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image_b64}"}}
-            ]
-            result = self.chat_model.invoke([HumanMessage(content=input_message)])
-            self.add_to_memory(text_input, result.content)  # Save the interaction to memory
+            text_input, message = self.build_message(input_string)
+            with metrics.span("llm", "VisionAssistant") as span:
+                span.sizes(prompt_tokens=count_tokens(text_input))
+                result = self.chat_model.invoke([message])
+                span.sizes(completion_tokens=count_tokens(result.content))
+            self.add_to_memory(text_input, result.content, session_id)  # Save the interaction to memory
             return result.content
         except Exception as e:
             logging.error(f"Error in VisionAssistant.invoke: {e}")
             return {"error": str(e)}
 
-    def add_to_memory(self, text_input, response):
+    async def ainvoke(self, input_string, session_id=None):
+        try:
+            text_input, message = self.build_message(input_string)
+            with metrics.span("llm", "VisionAssistant") as span:
+                span.sizes(prompt_tokens=count_tokens(text_input))
+                result = await self.chat_model.ainvoke([message])
+                span.sizes(completion_tokens=count_tokens(result.content))
+            self.add_to_memory(text_input, result.content, session_id)  # Save the interaction to memory
+            return result.content
+        except Exception as e:
+            logging.error(f"Error in VisionAssistant.ainvoke: {e}")
+            return {"error": str(e)}
+
+    def stream(self, input_string, session_id=None):
+        """
+        Stream the response token by token and save the exchange to memory once it completes.
+
+        :param input_string: str, The input in the format 'text|base64_image'.
+        :param session_id: str, The conversation the input belongs to.
+        :return: generator, Yields response tokens as they arrive from the model.
+        """
+        text_input, message = self.build_message(input_string)
+        chunks = []
+        with metrics.span("llm", "VisionAssistant") as span:
+            span.sizes(prompt_tokens=count_tokens(text_input))
+            for chunk in self.chat_model.stream([message]):
+                span.first_token()
+                chunks.append(chunk.content)
+                yield chunk.content
+            response = ''.join(chunks)
+            span.sizes(completion_tokens=count_tokens(response))
+        self.add_to_memory(text_input, response, session_id)
+
+    async def astream(self, input_string, session_id=None):
+        """
+        Async counterpart of `stream`, yielding tokens without holding a thread for the round trip.
+
+        :param input_string: str, The input in the format 'text|base64_image'.
+        :param session_id: str, The conversation the input belongs to.
+        :return: async generator, Yields response tokens as they arrive from the model.
+        """
+        text_input, message = self.build_message(input_string)
+        chunks = []
+        with metrics.span("llm", "VisionAssistant") as span:
+            span.sizes(prompt_tokens=count_tokens(text_input))
+            async for chunk in self.chat_model.astream([message]):
+                span.first_token()
+                chunks.append(chunk.content)
+                yield chunk.content
+            response = ''.join(chunks)
+            span.sizes(completion_tokens=count_tokens(response))
+        self.add_to_memory(text_input, response, session_id)
+
+    def build_message(self, input_string):
+        """
+        Split a 'text|base64_image' input into the text and the multimodal message sent to the model.
+
+        :param input_string: str, The input in the format 'text|base64_image'.
+        :return: tuple, The text input and the HumanMessage to send.
+        """
+        if '|' not in input_string:
+            raise ValueError("Input must be in the format 'text|base64_image'.")
+        text_input, image_b64 = input_string.split('|', 1)
+        input_message = [
+            {"type": "text", "text": text_input},
+            {"type": "image_url", "image_url": {"url": f"data:{IMAGE_MIME_TYPES[self.image_format]};base64,{image_b64}"}}
+        ]
+        return text_input, HumanMessage(content=input_message)
+
+    def add_to_memory(self, text_input, response, session_id=None):
         """
-        Add the interaction to the memory.
+        Add the interaction to the session's memory.
 
         :param text_input: str, The input text from the user.
         :param response: str, The response from the assistant.
+        :param session_id: str, The conversation the interaction belongs to.
         """
-        self.memory.save_context({'input': text_input}, {'response': response})
+        self.memory.save(session_id, text_input, response)
 
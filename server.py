@@ -0,0 +1,213 @@
+"""
+Headless HTTP server for the assistant router, for services that call the assistant without the UI.
+
+Routes:
+    POST /v1/chat        JSON {"message", "session_id"?, "stream"?}
+    POST /v1/vision      multipart form with "image" (file), "message", "session_id"? and "stream"?
+    POST /v1/transcribe  multipart form with "audio" (16-bit PCM WAV file), or the WAV file as the body
+    GET  /healthz        liveness
+    GET  /metrics        per-stage latency histograms in the Prometheus text format
+
+Chat and vision stream server-sent events by default: a `start` event with the assistant and
+session id, a `data` event per token and a final `done` event. With "stream": false they return
+one JSON object instead. Requests without a session id get a new one, returned in the response
+and the X-Session-Id header; sending it back continues the conversation with the same memory.
+
+The server shares the model registry with the Streamlit app, so models are built once per process.
+SIGINT and SIGTERM stop accepting connections, let in-flight requests finish for up to
+--shutdown-timeout seconds and close the pooled upstream connections.
+
+    python server.py --port 8080
+    curl -N localhost:8080/v1/chat -d '{"message": "Write a binary search in Python"}'
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from chains import http_pool
+from chains.models import audio_dsp
+from chains.models.whisper_asr import WHISPER_SAMPLE_RATE
+from chains.registry import registry as default_registry
+from utils import metrics
+
+MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+SESSION_HEADER = "X-Session-Id"
+
+ROUTER_KEY = web.AppKey("router", object)
+REGISTRY_KEY = web.AppKey("registry", object)
+ASR_LOCK_KEY = web.AppKey("asr_lock", asyncio.Semaphore)
+
+
+def _flag(value, default=True):
+    """Parse a boolean form field or JSON value."""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ("0", "false", "no", "off", "")
+
+
+def _sse(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+async def _respond(request, message, image=None, session_id=None, stream=True):
+    """Route a message (and image) through the router and answer with SSE or JSON."""
+    router = request.app[ROUTER_KEY]
+    session_id = session_id or str(uuid.uuid4())
+    headers = {SESSION_HEADER: session_id}
+
+    if not stream:
+        response, assistant_name = await router.aroute_input(message, image, session_id)
+        if not isinstance(response, str):
+            # Routers and assistants report failures as dicts instead of raising
+            error = response.get("error") or response.get("content") if isinstance(response, dict) else response
+            return web.json_response({"error": error, "assistant": assistant_name, "session_id": session_id},
+                                     status=502, headers=headers)
+        return web.json_response({"response": response, "assistant": assistant_name, "session_id": session_id},
+                                 headers=headers)
+
+    tokens, assistant_name = await router.aroute_stream(message, image, session_id)
+    response = web.StreamResponse(headers={**headers, "Content-Type": "text/event-stream",
+                                           "Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    await response.prepare(request)
+    try:
+        await response.write(_sse({"assistant": assistant_name, "session_id": session_id}, "start"))
+        async for token in tokens:
+            await response.write(_sse({"token": token}))
+        await response.write(_sse({"assistant": assistant_name, "session_id": session_id}, "done"))
+        await response.write_eof()
+    except ConnectionResetError:
+        logging.info(f"Client of session {session_id} disconnected mid-stream")
+    finally:
+        # Detaches this request only: a coalesced generation keeps running for the other requests sharing it
+        await tokens.aclose()
+    return response
+
+
+async def chat(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="Expected a JSON body.")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text="Expected a JSON object.")
+    message = body.get("message")
+    if not isinstance(message, str) or not message.strip():
+        raise web.HTTPBadRequest(text="'message' must be a non-empty string.")
+    return await _respond(request, message, None, body.get("session_id"), _flag(body.get("stream")))
+
+
+async def _read_form(request):
+    """Read a multipart form into a dict of field name to str, or to bytes for file fields."""
+    if not request.content_type.startswith("multipart/"):
+        raise web.HTTPBadRequest(text="Expected a multipart/form-data body.")
+    fields = {}
+    reader = await request.multipart()
+    async for part in reader:
+        if part.filename is not None:
+            fields[part.name] = bytes(await part.read())
+        else:
+            fields[part.name] = await part.text()
+    return fields
+
+
+async def vision(request):
+    fields = await _read_form(request)
+    image = fields.get("image")
+    if not isinstance(image, bytes) or not image:
+        raise web.HTTPBadRequest(text="Missing the 'image' file.")
+    message = fields.get("message") or "Describe this image."
+    return await _respond(request, message, image, fields.get("session_id"), _flag(fields.get("stream")))
+
+
+async def transcribe(request):
+    if request.content_type.startswith("multipart/"):
+        audio = (await _read_form(request)).get("audio")
+    else:
+        audio = await request.read()
+    if not isinstance(audio, bytes) or not audio:
+        raise web.HTTPBadRequest(text="Missing the 'audio' WAV file.")
+    try:
+        snd_data, rate = audio_dsp.read_wav(io.BytesIO(audio))
+    except Exception as e:
+        raise web.HTTPBadRequest(text=f"Could not read the audio as WAV: {e}")
+    audio = audio_dsp.resample(audio_dsp.to_float32(snd_data), rate, WHISPER_SAMPLE_RATE)
+
+    def run():
+        # Whisper is only loaded by the first transcription request
+        asr = request.app[REGISTRY_KEY].get('whisper_asr')
+        return asr.transcribe_array(audio, WHISPER_SAMPLE_RATE)
+
+    # One model instance decodes one file at a time; concurrent calls would only contend for the same cores
+    async with request.app[ASR_LOCK_KEY]:
+        try:
+            result = await asyncio.to_thread(run)
+        except Exception as e:
+            logging.error(f"Error in server.transcribe: {e}")
+            return web.json_response({"error": str(e)}, status=500)
+    return web.json_response({"text": result["text"].strip(), "duration": len(audio) / WHISPER_SAMPLE_RATE})
+
+
+async def healthz(request):
+    return web.json_response({"status": "ok"})
+
+
+async def metrics_endpoint(request):
+    return web.Response(body=metrics.metrics.render().encode("utf-8"),
+                        headers={"Content-Type": metrics.CONTENT_TYPE})
+
+
+def create_app(registry=None, threads=64, asr_concurrency=1):
+    """
+    Build the aiohttp application.
+
+    :param registry: ModelRegistry, Where the router and models come from; the app's shared registry if None.
+    :param threads: int, Worker threads for blocking work such as routing, image encoding and retrieval.
+    :param asr_concurrency: int, Transcriptions allowed to run at the same time.
+    :return: web.Application
+    """
+    registry = registry or default_registry
+    app = web.Application(client_max_size=MAX_UPLOAD_BYTES)
+    app[REGISTRY_KEY] = registry
+    app[ASR_LOCK_KEY] = asyncio.Semaphore(asr_concurrency)
+
+    async def startup(app):
+        # asyncio.to_thread uses the default executor, which is too small for many concurrent requests
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(threads, thread_name_prefix="server"))
+        app[ROUTER_KEY] = await asyncio.to_thread(registry.get, 'router')
+
+    async def cleanup(app):
+        await http_pool.close()
+
+    app.on_startup.append(startup)
+    app.on_cleanup.append(cleanup)
+    app.router.add_post("/v1/chat", chat)
+    app.router.add_post("/v1/vision", vision)
+    app.router.add_post("/v1/transcribe", transcribe)
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/metrics", metrics_endpoint)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--threads", type=int, default=64, help="Worker threads for blocking work.")
+    parser.add_argument("--asr-concurrency", type=int, default=1, help="Transcriptions run at the same time.")
+    parser.add_argument("--shutdown-timeout", type=float, default=30.0,
+                        help="Seconds in-flight requests get to finish on shutdown.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    web.run_app(create_app(threads=args.threads, asr_concurrency=args.asr_concurrency), host=args.host,
+                port=args.port, shutdown_timeout=args.shutdown_timeout, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,6 @@
 import os
 import streamlit as st
-import pickle
 from langchain.memory import ConversationBufferMemory
-from langchain.document_loaders import DirectoryLoader
-from langchain.vectorstores import FAISS
 from langchain.text_splitter import CharacterTextSplitter
 from langchain_core.messages import HumanMessage
 from dotenv import load_dotenv
@@ -12,6 +9,10 @@ from chains.language_assistant import LanguageAssistant
 from chains.code_assistant import CodeAssistant
 from chains.vision_assistant import VisionAssistant
 from chains.models.whisper_asr import WhisperASR
+from chains.embedding_service import EmbeddingCache, EmbeddingService
+from chains.ingestion import DocumentIngestor
+from chains.vectorstore_io import load_vectorstore, migrate_pickle, save_vectorstore, MANIFEST_FILE
+from utils.image_processor import IMAGE_MIME_TYPES
 
 # Load environment variables
 load_dotenv()
@@ -71,29 +72,36 @@ with st.sidebar:
     use_existing_vector_store = st.radio("Use existing vector store if available", ["Yes", "No"], horizontal=True)
 
 # Function to load and process documents
-def load_and_process_documents(docs_dir, vector_store_path):
-    raw_documents = DirectoryLoader(docs_dir).load()
-    if raw_documents:
-        text_splitter = CharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
-        documents = text_splitter.split_documents(raw_documents)
-        vectorstore = FAISS.from_documents(documents, document_embedder)
-        with open(vector_store_path, "wb") as f:
-            pickle.dump(vectorstore, f)
-        return vectorstore
-    else:
-        return None
+def load_and_process_documents(docs_dir, vector_store_path, vectorstore=None):
+    # Only new or changed files are parsed and embedded; chunks of deleted files are dropped
+    ingestor = DocumentIngestor(docs_dir, f"{vector_store_path}.manifest.json", document_embedder,
+                                CharacterTextSplitter(chunk_size=2000, chunk_overlap=200))
+    vectorstore, report = ingestor.sync(vectorstore)
+    if vectorstore is not None and (report["added"] or report["changed"] or report["removed"]):
+        save_vectorstore(vectorstore, vector_store_path, embedding_model=document_embedder.model)
+    return vectorstore
 
 # Initialize embedding models
-document_embedder = NVIDIAEmbeddings(model="NV-Embed-QA", model_type="passage")
+# Chunks are embedded in concurrent batches, and unchanged chunks come from the on-disk cache
+document_embedder = EmbeddingService(NVIDIAEmbeddings(model="NV-Embed-QA", model_type="passage"),
+                                     cache=EmbeddingCache("../embedding_cache.sqlite"))
 query_embedder = NVIDIAEmbeddings(model="NV-Embed-QA", model_type="query")
 
 # Vector database store
-vector_store_path = "../vectorstore.pkl"
+vector_store_path = "../vectorstore"
+legacy_vector_store_path = "../vectorstore.pkl"
 vectorstore = None
 
-if use_existing_vector_store == "Yes" and os.path.exists(vector_store_path):
-    with open(vector_store_path, "rb") as f:
-        vectorstore = pickle.load(f)
+# One-time conversion of the old pickled store, keeping its ingestion manifest
+if migrate_pickle(legacy_vector_store_path, vector_store_path, embedding_model=document_embedder.model):
+    if os.path.exists(f"{legacy_vector_store_path}.manifest.json"):
+        os.replace(f"{legacy_vector_store_path}.manifest.json", f"{vector_store_path}.manifest.json")
+
+if use_existing_vector_store == "Yes" and os.path.exists(os.path.join(vector_store_path, MANIFEST_FILE)):
+    # This page also updates the store, so load it into memory rather than memory-mapped
+    vectorstore = load_vectorstore(vector_store_path, document_embedder, mmap=False)
+    with st.spinner("Indexing new documents..."):
+        vectorstore = load_and_process_documents(DOCS_DIR, vector_store_path, vectorstore)
     st.sidebar.success("Existing vector store loaded successfully.")
 else:
     with st.spinner("Processing documents..."):
@@ -176,7 +184,7 @@ if user_input or uploaded_image:
         augmented_user_input = f"Image and question: {user_input}" if user_input else "Analyze this image"
         input_message = [
             {"type": "text", "text": augmented_user_input},
-            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image_b64}"}}
+            {"type": "image_url", "image_url": {"url": f"data:{IMAGE_MIME_TYPES[assistant.image_format]};base64,{image_b64}"}}
         ]
 
         with chat_container:
@@ -0,0 +1,12 @@
+import pytest
+from benchmarks import fake_nim
+
+
+@pytest.fixture
+def nim(monkeypatch):
+    """A FakeNIM that every model client built during the test talks to."""
+    fake = fake_nim.FakeNIM(ttft=0.05, tokens_per_second=200, reply_tokens=20, jitter=0, embedding_latency=0, seed=0)
+    base_url, stop = fake_nim.serve_in_thread(fake)
+    monkeypatch.setenv("NVIDIA_BASE_URL", base_url)
+    yield fake
+    stop()
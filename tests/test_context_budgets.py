@@ -0,0 +1,33 @@
+import pytest
+from chains.assistant_router import AssistantRouter
+from chains.code_assistant import CodeAssistant
+from chains.language_assistant import LanguageAssistant
+from chains.registry import ModelRegistry
+from chains.retrieval import ContextRetriever
+
+
+class RecordingRetriever(ContextRetriever):
+    """Records the model name the router asks for context with, instead of searching a store."""
+
+    def __init__(self):
+        super().__init__("unused")
+        self.budgets = []
+
+    def build_context(self, query, model_name=None):
+        self.budgets.append(self.budget_for(model_name))
+        return ""
+
+
+@pytest.mark.parametrize("assistant_cls, model_name, budget", [
+    (CodeAssistant, "ibm/granite-34b-code-instruct", 1200),
+    (LanguageAssistant, "meta/llama3-70b-instruct", 3000),
+])
+def test_each_assistant_gets_its_models_budget(nim, assistant_cls, model_name, budget):
+    assistant = assistant_cls()
+    assert assistant.model.model == model_name
+
+    retriever = RecordingRetriever()
+    registry = ModelRegistry()
+    registry.register('retriever', lambda: retriever)
+    AssistantRouter(registry).retrieve_context(assistant, "How do I sort a list?")
+    assert retriever.budgets == [budget]
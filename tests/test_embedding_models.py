@@ -0,0 +1,75 @@
+import os
+import numpy as np
+import pytest
+from chains.embedding_index import EmbeddingIndex
+from chains.embedding_models import EmbeddingModels
+
+
+def offline_models(directory, dim=4):
+    """EmbeddingModels without the API clients, which comparing and saving embeddings do not use."""
+    models = EmbeddingModels.__new__(EmbeddingModels)
+    models.index = EmbeddingIndex(str(directory), dim=dim)
+    return models
+
+
+def test_compare_embeddings_accepts_per_file_chunk_embeddings(tmp_path):
+    models = offline_models(tmp_path)
+    chunks = np.eye(4, dtype=np.float32)[:3]
+    pairs = [("single", np.array([0, 0, 0, 1], dtype=np.float32)), ("chunked", chunks)]
+    query = np.array([0, 1, 0, 0], dtype=np.float32)
+
+    results = models.compare_embeddings(query, pairs)
+    assert results[0] == ("chunked#1", 1.0)
+    assert sorted(name for name, _ in results) == ["chunked#0", "chunked#1", "chunked#2", "single"]
+
+    # Same answer as searching the index the embeddings were saved to
+    for name, embedding in pairs:
+        models.save_embedding(name, embedding)
+    assert models.compare_embeddings(query, top_k=1) == results[:1]
+
+
+def test_compare_embeddings_rejects_higher_dimensional_embeddings(tmp_path):
+    with pytest.raises(ValueError, match="must be 1-D or 2-D"):
+        offline_models(tmp_path).compare_embeddings(np.ones(4), [("cube", np.ones((2, 2, 4)))])
+
+
+@pytest.mark.parametrize("dim", [4, None])
+def test_saved_embeddings_survive_reopening_the_index(tmp_path, dim):
+    models = offline_models(tmp_path, dim)
+    models.save_embedding("a", np.array([1, 0, 0, 0], dtype=np.float32))
+    models.save_embedding("b", np.array([0, 1, 0, 0], dtype=np.float32))
+
+    reopened = offline_models(tmp_path, dim=None)
+    assert len(reopened.index) == 2
+    assert reopened.compare_embeddings(np.array([0, 1, 0, 0], dtype=np.float32), top_k=1) == [("b", 1.0)]
+
+    # New rows get ids after the reopened ones, so every id keeps pointing at its own vector
+    reopened.save_embedding("c", np.array([0, 0, 1, 0], dtype=np.float32))
+    assert reopened.compare_embeddings(np.array([0, 0, 1, 0], dtype=np.float32), top_k=1) == [("c", 1.0)]
+    assert reopened.index.get("a").tolist() == [1, 0, 0, 0]
+
+
+def test_index_without_its_dimension_is_not_truncated(tmp_path):
+    index = EmbeddingIndex(str(tmp_path), dim=4)
+    index.append(["a"], np.ones(4))
+    os.remove(index.info_path)
+    with pytest.raises(ValueError, match="index.json is missing"):
+        EmbeddingIndex(str(tmp_path))
+    assert len(EmbeddingIndex(str(tmp_path), dim=4)) == 1
+
+
+def test_saving_again_replaces_every_earlier_row_of_the_name(tmp_path):
+    models = offline_models(tmp_path)
+    models.save_embedding("doc", np.eye(4, dtype=np.float32)[:3])
+    models.save_embedding("doc#notes", np.eye(4, dtype=np.float32)[3])
+    models.save_embedding("doc", np.eye(4, dtype=np.float32)[:2])
+    assert sorted(models.index.keys()) == ["doc#0", "doc#1", "doc#notes"]
+
+    models.save_embedding("doc", np.ones(4, dtype=np.float32))
+    names = [name for name, _ in models.compare_embeddings(np.ones(4, dtype=np.float32))]
+    assert sorted(names) == ["doc", "doc#notes"]
+
+    # Removals are stored too, so a fresh index sees the same entries
+    reopened = offline_models(tmp_path, dim=None)
+    assert sorted(name for name, _ in reopened.compare_embeddings(np.ones(4, dtype=np.float32))) == ["doc", "doc#notes"]
+    assert reopened.index.get("doc").tolist() == [1, 1, 1, 1]
@@ -0,0 +1,54 @@
+import sys
+import pytest
+from chains.assistant_router import AssistantRouter
+from chains.code_assistant import CodeAssistant
+from chains.registry import ModelRegistry
+from chains.response_cache import ResponseCache
+from chains.retrieval import ContextRetriever
+from utils import metrics
+
+
+@pytest.fixture
+def profile_every_request(monkeypatch):
+    # Every request is profiled, and no profile is slow enough to be written
+    monkeypatch.setattr(metrics.profile_sampler, "sample_rate", 1.0)
+    monkeypatch.setattr(metrics.profile_sampler, "slow_seconds", float("inf"))
+    metrics.metrics.clear()
+    yield
+    sys.setprofile(None)
+
+
+def requests_timed(component):
+    """Number of request spans recorded for `component`; the last value of a series is its sum."""
+    return sum(metrics.STAGE_SECONDS._series.get(("request", component), [0])[:-1])
+
+
+def test_timed_stream_starts_its_span_when_iterated(profile_every_request):
+    stream = metrics.timed_stream(iter(["a", "b"]), metrics.span("request", "test", profile=True))
+    assert sys.getprofile() is None
+    del stream
+    assert sys.getprofile() is None
+    assert requests_timed("test") == 0
+
+    assert list(metrics.timed_stream(iter(["a", "b"]), metrics.span("request", "test", profile=True))) == ["a", "b"]
+    assert sys.getprofile() is None
+    assert requests_timed("test") == 1
+
+
+def test_unconsumed_route_stream_leaves_no_profiler_running(nim, tmp_path, profile_every_request):
+    registry = ModelRegistry()
+    registry.register('code_assistant', CodeAssistant)
+    registry.register('retriever', lambda: ContextRetriever(str(tmp_path / "no-store")))
+    router = AssistantRouter(registry)
+    router.response_cache = ResponseCache(max_entries=0, similarity_threshold=None)
+
+    tokens, assistant_name = router.route_stream("Write a Python function that reverses a list")
+    assert assistant_name == 'CodeAssistant'
+    assert sys.getprofile() is None
+    del tokens
+    assert sys.getprofile() is None
+
+    tokens, _ = router.route_stream("Write a Python function that reverses a list")
+    assert "".join(tokens)
+    assert sys.getprofile() is None
+    assert requests_timed("route_stream") == 1
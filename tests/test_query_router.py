@@ -0,0 +1,23 @@
+import pytest
+from chains.query_router import CODE_ROUTE, LANGUAGE_ROUTE, QueryRouter
+
+
+@pytest.mark.parametrize("text", [
+    "I have three things to buy: milk; eggs; bread;",
+    "The meeting is at noon; bring snacks;",
+    "Call mom (tonight);",
+])
+def test_prose_ending_in_a_semicolon_is_not_code(text):
+    assert QueryRouter().classify(text).route == LANGUAGE_ROUTE
+
+
+@pytest.mark.parametrize("text", [
+    "x = foo + 1;",
+    "total += price;",
+    "it fails at\nconsole.log(total);",
+    "int a;\nint b;",
+    "if (ready) {",
+])
+def test_statements_ending_in_a_semicolon_are_code(text):
+    decision = QueryRouter().classify(text)
+    assert (decision.route, decision.stage) == (CODE_ROUTE, 'keywords')
@@ -0,0 +1,13 @@
+import pytest
+from chains.response_cache import ResponseCache
+
+
+@pytest.mark.parametrize("response", ["", "  \n"])
+def test_empty_responses_are_not_cached(response):
+    cache = ResponseCache(similarity_threshold=None)
+    cache.put("model", "What is a monad?", response)
+    assert cache.get("model", "What is a monad?") is None
+    assert cache.stats()["entries"] == 0
+
+    cache.put("model", "What is a monad?", "A monoid in the category of endofunctors.")
+    assert cache.get("model", "what is a monad?") == "A monoid in the category of endofunctors."
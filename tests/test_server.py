@@ -0,0 +1,102 @@
+import asyncio
+import json
+from aiohttp.test_utils import TestClient, TestServer
+from chains.assistant_router import AssistantRouter
+from chains.code_assistant import CodeAssistant
+from chains.language_assistant import LanguageAssistant
+from chains.registry import ModelRegistry
+from chains.response_cache import ResponseCache
+from chains.retrieval import ContextRetriever
+from server import ROUTER_KEY, create_app
+
+
+class RecordingRouter(AssistantRouter):
+    """Records the sessions whose response stream was closed before its end, in order."""
+
+    def __init__(self, registry):
+        super().__init__(registry)
+        self.abandoned = []
+
+    async def aroute_stream(self, user_input='', image=None, session_id=None):
+        tokens, assistant_name = await super().aroute_stream(user_input, image, session_id)
+
+        async def watched():
+            finished = False
+            try:
+                async for token in tokens:
+                    yield token
+                finished = True
+            finally:
+                if not finished:
+                    self.abandoned.append(session_id)
+        return watched(), assistant_name
+
+
+def offline_registry(directory):
+    """Text assistants against the FakeNIM, without retrieval or the response cache."""
+    registry = ModelRegistry()
+
+    def router():
+        router = RecordingRouter(registry)
+        router.response_cache = ResponseCache(max_entries=0, similarity_threshold=None)
+        return router
+
+    registry.register('router', router)
+    registry.register('code_assistant', CodeAssistant)
+    registry.register('language_assistant', LanguageAssistant)
+    registry.register('retriever', lambda: ContextRetriever(str(directory / "no-store")))
+    return registry
+
+
+async def read_event(response):
+    """Read one server-sent event as (event name, data)."""
+    lines = (await response.content.readuntil(b"\n\n")).decode("utf-8").strip().splitlines()
+    event = lines[0][len("event: "):] if lines[0].startswith("event: ") else None
+    return event, json.loads(lines[-1][len("data: "):])
+
+
+def run_with_client(test, registry=None):
+    """Run `test(client)` against a fresh server app."""
+    async def main():
+        async with TestClient(TestServer(create_app(registry))) as client:
+            return await test(client)
+    return asyncio.run(main())
+
+
+def test_chat_rejects_bodies_that_are_not_objects():
+    async def test(client):
+        statuses = []
+        for body in (b"[1, 2]", b'"hello"', b"3", b"null", b"not json"):
+            response = await client.post("/v1/chat", data=body, headers={"Content-Type": "application/json"})
+            statuses.append(response.status)
+        response = await client.post("/v1/chat", json={"message": ""})
+        statuses.append(response.status)
+        return statuses
+
+    assert run_with_client(test) == [400] * 6
+
+
+def test_leader_disconnect_does_not_cut_off_coalesced_followers(nim, tmp_path):
+    nim.tokens_per_second = 20  # long enough for the follower to attach before the leader leaves
+    message = {"message": "Write a Python function that reverses a list"}
+
+    async def test(client):
+        leader = await client.post("/v1/chat", json={**message, "session_id": "leader"})
+        assert (await read_event(leader))[0] == "start"
+        await read_event(leader)  # the first token: the generation is running
+        follower = await client.post("/v1/chat", json={**message, "session_id": "follower"})
+        assert (await read_event(follower))[0] == "start"
+        tokens = [(await read_event(follower))[1]["token"]]
+        leader.close()
+
+        while True:
+            event, data = await read_event(follower)
+            if event == "done":
+                return tokens, list(client.server.app[ROUTER_KEY].abandoned)
+            tokens.append(data["token"])
+
+    tokens, abandoned = run_with_client(test, offline_registry(tmp_path))
+    # The leader's stream was closed while the follower was still receiving the shared generation
+    assert abandoned == ["leader"]
+    assert len([token for token in tokens if token]) == nim.reply_tokens
+    assert nim.requests == 1
@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+import textwrap
+import faiss
+import numpy as np
+import pytest
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from chains.vectorstore_io import load_vectorstore, save_vectorstore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIM = 1024
+
+
+def build_store(directory, count, index=None):
+    index = index or faiss.IndexFlatL2(DIM)
+    vectors = np.random.default_rng(0).standard_normal((count, DIM), dtype=np.float32)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    ids = [f"doc{i}" for i in range(count)]
+    docstore = InMemoryDocstore({doc_id: Document(page_content=f"chunk {doc_id}") for doc_id in ids})
+    save_vectorstore(FAISS(embedding_function=None, index=index, docstore=docstore,
+                           index_to_docstore_id=dict(enumerate(ids))), directory)
+    return vectors
+
+
+def rss_growth(directory, warmup_directory):
+    """Resident memory added by `load_vectorstore`, in bytes, measured in a fresh interpreter."""
+    script = textwrap.dedent(f"""
+        import os
+        from chains.vectorstore_io import load_vectorstore
+
+        def rss():
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+        # Loading a tiny store first keeps imports and one-time setup out of the measurement
+        load_vectorstore({warmup_directory!r}, None, mmap=True)
+        before = rss()
+        store = load_vectorstore({directory!r}, None, mmap=True)
+        print(rss() - before)
+    """)
+    output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=True, capture_output=True, text=True)
+    return int(output.stdout.split()[-1])
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="needs /proc to read the resident set size")
+def test_mmap_load_of_flat_index_keeps_rss_flat(tmp_path):
+    directory = str(tmp_path / "store")
+    count = 20_000
+    build_store(directory, count)
+    build_store(str(tmp_path / "warmup"), 10)
+    index_bytes = count * DIM * 4
+    # The index codes are mapped, not copied: only the position -> id map is read into memory
+    assert rss_growth(directory, str(tmp_path / "warmup")) < index_bytes / 10
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_load_flat_and_ivf_indexes(tmp_path, mmap):
+    for name, index in [("flat", None), ("ivf", faiss.IndexIVFFlat(faiss.IndexFlatL2(DIM), DIM, 8))]:
+        directory = str(tmp_path / name)
+        vectors = build_store(directory, 1_000, index)
+        store = load_vectorstore(directory, None, mmap=mmap)
+        assert store.index.ntotal == 1_000
+        if name == "ivf":
+            store.index.nprobe = 8
+        _, positions = store.index.search(vectors[:5], 1)
+        assert positions[:, 0].tolist() == list(range(5))
+        assert store.docstore.search("doc3").page_content == "chunk doc3"
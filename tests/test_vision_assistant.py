@@ -0,0 +1,15 @@
+import pytest
+from chains.vision_assistant import VisionAssistant
+
+
+@pytest.mark.parametrize("image_format", ["JPG", "jpeg2000", "gif", ""])
+def test_unsupported_image_format_is_rejected_up_front(image_format):
+    with pytest.raises(ValueError, match="Unsupported image format"):
+        VisionAssistant(image_format=image_format)
+
+
+@pytest.mark.parametrize("image_format, mime_type", [("jpeg", "image/jpeg"), ("WEBP", "image/webp"),
+                                                     ("png", "image/png")])
+def test_message_is_labelled_with_the_encoded_format(nim, image_format, mime_type):
+    _, message = VisionAssistant(image_format=image_format).build_message("What is this?|abcd")
+    assert message.content[1]["image_url"]["url"] == f"data:{mime_type};base64,abcd"
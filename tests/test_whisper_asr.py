@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from chains.models.whisper_asr import WHISPER_SAMPLE_RATE, WhisperASR
+
+
+class FakeWhisper:
+    """Stands in for a Whisper model: one segment per window, recording the audio it was given."""
+
+    def __init__(self):
+        self.windows = []
+
+    def transcribe(self, audio, **options):
+        self.windows.append(audio)
+        seconds = len(audio) / WHISPER_SAMPLE_RATE
+        return {"text": "word", "segments": [{"start": 0.0, "end": seconds, "text": f"{seconds:.1f}s"}]}
+
+
+def offline_asr():
+    asr = WhisperASR.__new__(WhisperASR)
+    asr.model = FakeWhisper()
+    asr.decode_options = {"fp16": False}
+    asr.vad = None
+    return asr
+
+
+def tone(samplerate, seconds):
+    t = np.arange(int(samplerate * seconds)) / samplerate
+    return (np.sin(2 * np.pi * 440 * t) * 10000).astype(np.int16)
+
+
+@pytest.mark.parametrize("samplerate", [8000, 16000, 32000, 44100, 48000])
+def test_transcribe_array_resamples_to_16k(samplerate):
+    asr = offline_asr()
+    asr.transcribe_array(tone(samplerate, 2.0), samplerate)
+    window, = asr.model.windows
+    assert window.dtype == np.float32
+    assert len(window) == 2 * WHISPER_SAMPLE_RATE
+
+
+@pytest.mark.parametrize("samplerate", [8000, 16000, 32000, 48000])
+def test_stream_transcribe_resamples_each_window(samplerate):
+    asr = offline_asr()
+    audio = tone(samplerate, 3.0)
+    frame = samplerate * 30 // 1000
+    chunks = [audio[i:i + frame] for i in range(0, len(audio), frame)]
+    partials = list(asr.stream_transcribe(chunks, samplerate, step_seconds=1.0, overlap_seconds=0.5))
+    # The fake transcribes each window as its length in seconds at 16 kHz
+    committed = sum(float(text.rstrip("s")) for text in partials[-1].split())
+    assert committed == pytest.approx(3.0, abs=0.05)
+    assert all(window.dtype == np.float32 for window in asr.model.windows)
@@ -1,6 +1,86 @@
 from PIL import Image
+import collections
+import hashlib
 import io
 import base64
+import threading
+
+IMAGE_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+# Encoded results keyed by (content hash, size, format, quality), most recently used last
+_ENCODE_CACHE_SIZE = 64
+_encode_cache = collections.OrderedDict()
+_encode_cache_lock = threading.Lock()
+
+
+def read_image_bytes(source):
+    """
+    Return the raw bytes of an image given as a path, bytes or a binary file-like object.
+
+    :param source: str, bytes or file-like object.
+    :return: bytes, The encoded image file contents.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read()
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    position = source.tell() if hasattr(source, "tell") else None
+    data = source.read()
+    if position is not None:
+        source.seek(position)
+    return data
+
+
+def encode_image(source, size=256, image_format="JPEG", quality=85, pad_color="white"):
+    """
+    Decode, downscale to fit a size x size square, pad and encode an image in a single pass.
+
+    JPEGs are decoded at reduced resolution when they are much larger than the target, and the
+    result is cached by content hash and settings, so follow-up questions about the same image
+    skip the work entirely.
+
+    :param source: str, bytes or file-like object holding the image.
+    :param size: int, Width and height of the padded output.
+    :param image_format: str, Output format: 'JPEG', 'WEBP' or 'PNG'.
+    :param quality: int, Quality for the lossy formats.
+    :param pad_color: str, Color of the padding around the downscaled image.
+    :return: str, Base64 encoded image.
+    """
+    data = read_image_bytes(source)
+    image_format = image_format.upper()
+    key = (hashlib.sha256(data).hexdigest(), size, image_format, quality, pad_color)
+    with _encode_cache_lock:
+        if key in _encode_cache:
+            _encode_cache.move_to_end(key)
+            return _encode_cache[key]
+
+    with Image.open(io.BytesIO(data)) as img:
+        # Lets the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding
+        img.draft("RGB", (size, size))
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            img = img.convert("RGBA")
+            canvas = Image.new("RGB", (size, size), pad_color)
+            canvas.paste(img, ((size - img.width) // 2, (size - img.height) // 2), img)
+        else:
+            canvas = Image.new("RGB", (size, size), pad_color)
+            canvas.paste(img.convert("RGB"), ((size - img.width) // 2, (size - img.height) // 2))
+
+    buffer = io.BytesIO()
+    if image_format == "PNG":
+        canvas.save(buffer, format="PNG")
+    else:
+        canvas.save(buffer, format=image_format, quality=quality)
+    encoded = base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+    with _encode_cache_lock:
+        _encode_cache[key] = encoded
+        while len(_encode_cache) > _ENCODE_CACHE_SIZE:
+            _encode_cache.popitem(last=False)
+    return encoded
 
 
 def resize_image_to_base64(image_path, max_height=750):
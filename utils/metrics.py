@@ -0,0 +1,375 @@
+import bisect
+import cProfile
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds, from a cache hit to a long generation
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Size buckets in tokens
+SIZE_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Cumulative histogram with labels, rendered in the Prometheus text format."""
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        """
+        Record one value.
+
+        :param value: float, The observation, e.g. seconds or tokens.
+        :param label_values: str, One value per label name, in order.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values):
+                cumulative += count
+                labels = _format_labels(self.label_names, label_values, [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {values[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    """Monotonic counter with labels, rendered in the Prometheus text format."""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class MetricsRegistry:
+    """The metrics of the process, exported together."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, label_names=()):
+        """Return the histogram registered under `name`, creating it on first use."""
+        return self._get_or_create(name, lambda: Histogram(name, help_text, buckets, label_names))
+
+    def counter(self, name, help_text, label_names=()):
+        """Return the counter registered under `name`, creating it on first use."""
+        return self._get_or_create(name, lambda: Counter(name, help_text, label_names))
+
+    def render(self):
+        """
+        Export every metric.
+
+        :return: str, The metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+    def clear(self):
+        """Reset all values, e.g. between benchmark runs."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+    def _get_or_create(self, name, factory):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            return metric
+
+
+metrics = MetricsRegistry()
+STAGE_SECONDS = metrics.histogram("agent_nesh_stage_seconds", "Time spent in each request stage.",
+                                  label_names=("stage", "component"))
+FIRST_TOKEN_SECONDS = metrics.histogram("agent_nesh_first_token_seconds",
+                                        "Time from the start of a streamed stage to its first token.",
+                                        label_names=("stage", "component"))
+STAGE_ERRORS = metrics.counter("agent_nesh_stage_errors_total", "Stages that ended with an exception.",
+                               label_names=("stage", "component"))
+PROMPT_TOKENS = metrics.histogram("agent_nesh_prompt_tokens", "Estimated prompt size, including history and context.",
+                                  SIZE_BUCKETS, label_names=("component",))
+COMPLETION_TOKENS = metrics.histogram("agent_nesh_completion_tokens", "Estimated completion size.",
+                                      SIZE_BUCKETS, label_names=("component",))
+PROFILES_SAVED = metrics.counter("agent_nesh_profiles_saved_total", "Slow requests whose profile was saved.",
+                                 label_names=("stage",))
+
+
+class ProfileSampler:
+    """
+    Opt-in cProfile hook for individual slow requests.
+
+    A random `sample_rate` share of the requests that ask for profiling runs under cProfile.
+    The profile is written to `directory` only when the request took at least `slow_seconds`,
+    so the output is limited to the requests worth looking at. Profiling only works for
+    synchronous entry points, since a profiler sees everything its thread runs.
+    """
+
+    def __init__(self, sample_rate=0.0, slow_seconds=1.0, directory="profiles"):
+        """
+        :param sample_rate: float, Share of requests to profile, from 0 (off) to 1.
+        :param slow_seconds: float, Minimum duration for a profile to be kept.
+        :param directory: str, Where profiles are written, as `<stage>-<timestamp>-<ns>.prof`.
+        """
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.directory = directory
+
+    def start(self):
+        """Return a running profiler if this request is sampled, otherwise None."""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Only one profiler can be active at a time, e.g. when requests overlap
+            return None
+        return profiler
+
+    def finish(self, profiler, stage, seconds):
+        profiler.disable()
+        if seconds < self.slow_seconds:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{stage}-{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}.prof"
+        path = os.path.join(self.directory, name)
+        profiler.dump_stats(path)
+        PROFILES_SAVED.inc(stage)
+        logging.info(f"Saved profile of a {seconds:.2f}s {stage} request to {path}")
+
+
+profile_sampler = ProfileSampler(float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+                                 float(os.getenv("PROFILE_SLOW_SECONDS", "1.0")),
+                                 os.getenv("PROFILE_DIR", "profiles"))
+
+
+class Span:
+    """
+    Times one stage of a request as a context manager.
+
+    The duration goes to `agent_nesh_stage_seconds`, and an exception leaving the block counts
+    in `agent_nesh_stage_errors_total`. Streaming stages call `first_token` when the first
+    token arrives, and model calls report their prompt and completion sizes with `sizes`.
+    """
+
+    __slots__ = ("stage", "component", "profile", "start", "_profiler", "_first_token")
+
+    def __init__(self, stage, component="", profile=False):
+        """
+        :param stage: str, The stage, e.g. "route", "llm" or "embed".
+        :param component: str, What ran the stage, e.g. the assistant's class name.
+        :param profile: bool, Let the profile sampler profile this span; for top-level synchronous requests.
+        """
+        self.stage = stage
+        self.component = component
+        self.profile = profile
+        self.start = None
+        self._profiler = None
+        self._first_token = False
+
+    def __enter__(self):
+        if self.profile:
+            self._profiler = profile_sampler.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(seconds, self.stage, self.component)
+        if exc_type is not None and issubclass(exc_type, Exception):
+            STAGE_ERRORS.inc(self.stage, self.component)
+        if self._profiler is not None:
+            profile_sampler.finish(self._profiler, self.stage, seconds)
+        return False
+
+    def begin(self, start=None):
+        """
+        Start the span without a `with` block, e.g. when it ends inside a generator.
+
+        :param start: float, `time.perf_counter()` value to count from, e.g. when the request arrived; now if None.
+        """
+        self.__enter__()
+        if start is not None:
+            self.start = start
+        return self
+
+    def end(self, error=None):
+        """End a span started with `begin`, counting it as failed if `error` is given."""
+        self.__exit__(type(error) if error is not None else None, error, None)
+
+    def first_token(self):
+        """Record the time to the first token; later calls are ignored."""
+        if not self._first_token:
+            self._first_token = True
+            FIRST_TOKEN_SECONDS.observe(time.perf_counter() - self.start, self.stage, self.component)
+
+    def sizes(self, prompt_tokens=None, completion_tokens=None):
+        """
+        Record the estimated prompt and/or completion size of a model call.
+
+        :param prompt_tokens: int, Tokens sent, including history and retrieved context.
+        :param completion_tokens: int, Tokens generated.
+        """
+        if prompt_tokens is not None:
+            PROMPT_TOKENS.observe(prompt_tokens, self.component)
+        if completion_tokens is not None:
+            COMPLETION_TOKENS.observe(completion_tokens, self.component)
+
+
+def span(stage, component="", profile=False):
+    """Shorthand for `Span(stage, component, profile)`."""
+    return Span(stage, component, profile)
+
+
+def timed(stage, component=""):
+    """Decorator that records every call of a function as a span."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with Span(stage, component):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_stream(tokens, span, start=None):
+    """
+    Pass a token stream through, timing it as `span` and recording its first token.
+
+    The span begins when the stream is first iterated and ends when it is exhausted, fails or is
+    closed, so a stream that is never consumed does not leave a span, or its profiler, running.
+
+    :param tokens: iterable, The token stream.
+    :param span: Span, Not started yet.
+    :param start: float, `time.perf_counter()` value the span counts from, so work done before the
+                  stream was created, such as routing, counts too; now if None.
+    :return: generator, The tokens, unchanged.
+    """
+    span.begin(start)
+    error = None
+    try:
+        for token in tokens:
+            if token:
+                span.first_token()
+            yield token
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        span.end(error)
+
+
+async def atimed_stream(tokens, span, start=None):
+    """Async counterpart of `timed_stream`."""
+    span.begin(start)
+    error = None
+    try:
+        async for token in tokens:
+            if token:
+                span.first_token()
+            yield token
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        span.end(error)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """
+    Serve /metrics for Prometheus on a background thread.
+
+    Safe to call on every Streamlit rerun: a port already being served is not opened again.
+
+    :param port: int, The port to listen on.
+    :param host: str, The interface to bind.
+    :return: ThreadingHTTPServer, The running server.
+    """
+    with _servers_lock:
+        server = _servers.get(port)
+        if server is None:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+            _servers[port] = server
+            logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return server
@@ -1,16 +1,251 @@
-import pyttsx3
-import time
+import io
+import logging
+import os
+import queue
+import re
+import tempfile
+import threading
+from concurrent.futures import Future
 
+# Words whose trailing period does not end a sentence
+ABBREVIATIONS = {'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'vs', 'etc', 'e.g', 'i.e', 'approx', 'no', 'fig'}
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*(?=\s)|\n\s*\n')
+MARKDOWN = re.compile(r'`+|\*+|_{2,}|^#+\s*|^\s*[-*]\s+|\[([^\]]*)\]\([^)]*\)', re.MULTILINE)
+CODE_FENCE = "```"
 
-def text_to_speech(text, chunk_size=100):
-    engine = pyttsx3.init()
-    engine.setProperty('rate', 150)  # Speed percent (can go over 100)
-    engine.setProperty('volume', 0.9)  # Volume 0-1
 
-    # Split the text into chunks
-    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+class SentenceSplitter:
+    """
+    Split streamed text into sentences as soon as each one is complete.
 
-    for chunk in chunks:
-        engine.say(chunk)
-        engine.runAndWait()
-        time.sleep(0.1)  # Short pause between chunks
+    Tokens are fed in as they arrive; a sentence is released once it is followed by
+    whitespace, so no word is ever cut in half. Fenced code blocks are skipped, since
+    reading code aloud is not useful, and markdown markers are stripped.
+    """
+
+    def __init__(self, min_chars=20):
+        """
+        :param min_chars: int, Shorter fragments are joined with the next sentence, so "Yes." or
+                          "1." are not synthesized on their own.
+        """
+        self.min_chars = min_chars
+        self.buffer = ""
+        self.in_code = False
+
+    def feed(self, text):
+        """
+        Add streamed text.
+
+        :param text: str, The next token or chunk of the reply.
+        :return: list, The sentences completed by this text.
+        """
+        self.buffer += text
+        sentences = []
+        while True:
+            fence = self.buffer.find(CODE_FENCE)
+            if self.in_code:
+                if fence < 0:
+                    # Keep a possible partial fence; the rest of the code is dropped
+                    self.buffer = self.buffer[-2:]
+                    return self._clean(sentences)
+                self.buffer = self.buffer[fence + len(CODE_FENCE):]
+                self.in_code = False
+                continue
+            if fence >= 0:
+                before, rest = self._split(self.buffer[:fence])
+                sentences.extend(before + [rest])
+                self.buffer = self.buffer[fence + len(CODE_FENCE):]
+                self.in_code = True
+                continue
+            complete, self.buffer = self._split(self.buffer)
+            sentences.extend(complete)
+            return self._clean(sentences)
+
+    def flush(self):
+        """Return whatever is left at the end of the stream."""
+        text, self.buffer = ("" if self.in_code else self.buffer), ""
+        self.in_code = False
+        sentences, rest = self._split(text)
+        return self._clean(sentences + [rest])
+
+    def _split(self, text):
+        """Return the complete sentences in `text` and the incomplete rest."""
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(text):
+            end = match.end()
+            candidate = text[start:end]
+            words = candidate.rstrip('.!?"\')]').split()
+            last_word = words[-1].lower() if words else ""
+            # Abbreviations, initials and acronyms such as "U.S." do not end a sentence
+            if match.group().startswith('.') and (last_word in ABBREVIATIONS or len(last_word) == 1 or '.' in last_word):
+                continue
+            if len(candidate.strip()) < self.min_chars:
+                continue
+            sentences.append(candidate)
+            start = end
+        return sentences, text[start:]
+
+    @staticmethod
+    def _clean(sentences):
+        return [cleaned for cleaned in (clean_for_speech(sentence) for sentence in sentences) if cleaned]
+
+
+def clean_for_speech(text):
+    """Strip markdown markers and collapse whitespace."""
+    return " ".join(MARKDOWN.sub(lambda m: m.group(1) or " ", text).split())
+
+
+class TTSWorker:
+    """
+    Text-to-speech on a background thread with one long-lived pyttsx3 engine.
+
+    Requests are queued and return a Future immediately, so callers never wait for synthesis.
+    `pipe` wraps a token stream: tokens pass through unchanged while each finished sentence is
+    queued, so speech starts after the first sentence while the model is still generating.
+    """
+
+    def __init__(self, rate=150, volume=0.9, voice=None):
+        """
+        :param rate: int, Speaking rate in words per minute.
+        :param volume: float, Volume from 0 to 1.
+        :param voice: str, Optional pyttsx3 voice id.
+        """
+        self.rate = rate
+        self.volume = volume
+        self.voice = voice
+        self._queue = queue.Queue()
+        # pyttsx3 engines must be used from the thread that created them
+        self._thread = threading.Thread(target=self._run, name="tts", daemon=True)
+        self._thread.start()
+
+    def say(self, text):
+        """
+        Queue text to be spoken aloud.
+
+        :return: Future, Resolves to None once the text has been spoken.
+        """
+        return self._submit(text, None)
+
+    def render(self, text, path=None):
+        """
+        Queue text to be synthesized to audio instead of played.
+
+        :param text: str, The text to synthesize.
+        :param path: str, Output file; if None the audio is returned in memory.
+        :return: Future, Resolves to `path`, or to an io.BytesIO with the audio when no path is given.
+        """
+        return self._submit(text, path or io.BytesIO())
+
+    def pipe(self, tokens, render=False, results=None):
+        """
+        Pass a token stream through while synthesizing it sentence by sentence.
+
+        :param tokens: iterable, Streamed text chunks, e.g. from `AssistantRouter.route_stream`.
+        :param render: bool, Render each sentence to an in-memory buffer instead of speaking it.
+        :param results: list, If given, the Future of every queued sentence is appended to it.
+        :return: generator, The tokens, unchanged.
+        """
+        splitter = SentenceSplitter()
+        submit = (lambda sentence: self.render(sentence)) if render else self.say
+        for token in tokens:
+            for sentence in splitter.feed(token):
+                future = submit(sentence)
+                if results is not None:
+                    results.append(future)
+            yield token
+        for sentence in splitter.flush():
+            future = submit(sentence)
+            if results is not None:
+                results.append(future)
+
+    def close(self, wait=True):
+        """Stop the worker after the queued requests are done."""
+        self._queue.put(None)
+        if wait:
+            self._thread.join()
+
+    def _submit(self, text, output):
+        future = Future()
+        self._queue.put((text, output, future))
+        return future
+
+    def _run(self):
+        engine = None
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            text, output, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if engine is None:
+                    engine = self._init_engine()
+                future.set_result(self._synthesize(engine, text, output))
+            except Exception as e:
+                logging.error(f"Error in TTSWorker._run: {e}")
+                future.set_exception(e)
+
+    def _init_engine(self):
+        import pyttsx3
+
+        engine = pyttsx3.init()
+        engine.setProperty('rate', self.rate)
+        engine.setProperty('volume', self.volume)
+        if self.voice:
+            engine.setProperty('voice', self.voice)
+        return engine
+
+    def _synthesize(self, engine, text, output):
+        if output is None:
+            engine.say(text)
+            engine.runAndWait()
+            return None
+        if isinstance(output, str):
+            engine.save_to_file(text, output)
+            engine.runAndWait()
+            return output
+        # pyttsx3 can only render to a file, so render to a temporary one and read it back
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            engine.save_to_file(text, path)
+            engine.runAndWait()
+            with open(path, "rb") as f:
+                output.write(f.read())
+            output.seek(0)
+            return output
+        finally:
+            os.remove(path)
+
+
+_default_worker = None
+_default_worker_lock = threading.Lock()
+
+
+def default_worker():
+    """The process-wide TTSWorker, created on first use."""
+    global _default_worker
+    with _default_worker_lock:
+        if _default_worker is None:
+            _default_worker = TTSWorker()
+        return _default_worker
+
+
+def text_to_speech(text, chunk_size=100, wait=True):
+    """
+    Speak text sentence by sentence on the shared TTS worker.
+
+    :param text: str, The text to speak.
+    :param chunk_size: int, Unused; sentences are spoken whole. Kept for existing callers.
+    :param wait: bool, Block until everything has been spoken, as this function always did.
+    :return: list, A Future per sentence.
+    """
+    worker = default_worker()
+    splitter = SentenceSplitter()
+    futures = [worker.say(sentence) for sentence in splitter.feed(text) + splitter.flush()]
+    if wait:
+        for future in futures:
+            future.result()
+    return futures